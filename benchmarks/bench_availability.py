@@ -0,0 +1,118 @@
+"""
+Benchmark the interval availability engine against the original 15-minute scan.
+
+Usage:
+    python benchmarks/bench_availability.py --employees 100 --days 60
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.values import minute_of_day
+from src.services.intervals import merge_intervals, subtract_intervals, slot_start_minutes
+from src.services.availability_bitmap import np, find_slots_bitmap
+
+def scan_slots(window, booked, duration_minutes, granularity_minutes=15):
+    """The original AvailabilityService loop: test every candidate against every booking"""
+    start_time, end_time = window
+    slots = []
+    current_time = start_time
+    while current_time + timedelta(minutes=duration_minutes) <= end_time:
+        slot_end = current_time + timedelta(minutes=duration_minutes)
+        slot_available = True
+        for booking_start, booking_end in booked:
+            if current_time < booking_end and slot_end > booking_start:
+                slot_available = False
+                break
+        if slot_available:
+            slots.append({
+                'start_time': current_time,
+                'end_time': slot_end,
+                'duration_minutes': duration_minutes
+            })
+        current_time += timedelta(minutes=granularity_minutes)
+    return slots
+
+def interval_slots(window, booked, duration_minutes, granularity_minutes=15):
+    """The interval engine on minute offsets, as AvailabilityService runs it"""
+    day = window[0].replace(hour=0, minute=0)
+    minutes = lambda interval: (minute_of_day(interval[0]), minute_of_day(interval[1]))
+    gaps = subtract_intervals(minutes(window), merge_intervals(minutes(b) for b in booked))
+    return [{
+        'start_time': day + timedelta(minutes=start),
+        'end_time': day + timedelta(minutes=start + duration_minutes),
+        'duration_minutes': duration_minutes
+    } for start in slot_start_minutes(gaps, duration_minutes, granularity_minutes, minute_of_day(window[0]))]
+
+def generate_schedules(employees, days, density, seed):
+    """Build (window, bookings) pairs for every employee-day with dense bookings"""
+    rng = random.Random(seed)
+    first_day = datetime(2024, 1, 1)
+    schedules = []
+    for _ in range(employees):
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            window = (day.replace(hour=8), day.replace(hour=20))
+            bookings = []
+            current = window[0]
+            while current < window[1]:
+                length = timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+                if rng.random() < density:
+                    bookings.append((current, current + length))
+                current += length + timedelta(minutes=rng.choice([0, 0, 5, 15]))
+            rng.shuffle(bookings)
+            schedules.append((window, bookings))
+    return schedules
+
+def run(label, func, schedules, duration):
+    start = time.perf_counter()
+    results = [func(window, bookings, duration) for window, bookings in schedules]
+    elapsed = time.perf_counter() - start
+    slot_count = sum(len(slots) for slots in results)
+    print(f"{label:<10} {elapsed:8.3f}s  {len(schedules) / elapsed:10.0f} schedules/s  {slot_count} slots")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark availability slot generation')
+    parser.add_argument('--employees', type=int, default=100, help='Number of employees')
+    parser.add_argument('--days', type=int, default=60, help='Number of days per employee')
+    parser.add_argument('--density', type=float, default=0.8, help='Fraction of the day that is booked')
+    parser.add_argument('--duration', type=int, default=30, help='Service duration in minutes')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    schedules = generate_schedules(args.employees, args.days, args.density, args.seed)
+    bookings = sum(len(b) for _, b in schedules)
+    print(f"{len(schedules)} employee-days, {bookings} bookings, {args.duration} minute service")
+
+    scan_results = run('scan', scan_slots, schedules, args.duration)
+    interval_results = run('interval', interval_slots, schedules, args.duration)
+
+    if scan_results != interval_results:
+        print("ERROR: interval engine results differ from the scan")
+        sys.exit(1)
+
+    if np is not None:
+        rows = [{'employee_id': index, 'start': window[0], 'end': window[1], 'booked': bookings}
+                for index, (window, bookings) in enumerate(schedules)]
+        start = time.perf_counter()
+        bitmap_slots = find_slots_bitmap(rows, args.duration)
+        elapsed = time.perf_counter() - start
+        print(f"{'bitmap':<10} {elapsed:8.3f}s  {len(schedules) / elapsed:10.0f} schedules/s  {len(bitmap_slots)} slots")
+        expected = sorted(
+            (dict(slot, employee_id=index) for index, slots in enumerate(interval_results) for slot in slots),
+            key=lambda slot: (slot['start_time'], slot['employee_id'])
+        )
+        if bitmap_slots != expected:
+            print("ERROR: bitmap engine results differ from the scan")
+            sys.exit(1)
+    print("Results identical")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure allocations and peak memory of availability queries, comparing the
+compact SlotColumns results with the slot dicts built at the API edge.
+
+Usage:
+    python benchmarks/bench_memory.py --employees 200 --days 7
+"""
+import argparse
+import pickle
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.core.models import Base
+from src.scripts.generate_data import Scale, generate
+from src.services.availability import AvailabilityService
+
+FIRST_DAY = date(2024, 6, 3)
+
+def measure(label, func):
+    """Run func under tracemalloc and report time, allocations, peak and retained memory"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:8.1f} ms  peak {peak / 1024:9.0f} KiB  "
+          f"retained {current / 1024:9.0f} KiB  {blocks:8d} live blocks")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure availability query memory')
+    parser.add_argument('--employees', type=int, default=200, help='Number of employees')
+    parser.add_argument('--days', type=int, default=7, help='Days in the queried range')
+    parser.add_argument('--density', type=float, default=0.5, help='Fraction of each shift that is booked')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    counts = generate(engine, Scale(
+        employees=args.employees, customers=1000, days=args.days, density=args.density,
+        first_day=FIRST_DAY, seed=args.seed
+    ))
+    session = sessionmaker(bind=engine)()
+    last_day = FIRST_DAY + timedelta(days=args.days - 1)
+    print(f"{args.employees} employees, {args.days} days, {counts['bookings']} bookings")
+
+    availability = AvailabilityService(session)
+    # Warm the schedule index and service durations so only the query is measured
+    availability.get_slot_columns_range(FIRST_DAY, FIRST_DAY, 1)
+
+    columns = measure('range query (columns)', lambda: availability.get_slot_columns_range(FIRST_DAY, last_day, 1))
+    slots = measure('range query (dicts)', lambda: availability.get_available_slots_range(FIRST_DAY, last_day, 1))
+    measure('single day (columns)', lambda: availability.get_slot_columns(FIRST_DAY, 1))
+    print(f"{len(slots)} slots; pickled size {len(pickle.dumps(columns)) / 1024:.0f} KiB as columns, "
+          f"{len(pickle.dumps(slots)) / 1024:.0f} KiB as dicts")
+
+if __name__ == "__main__":
+    main()
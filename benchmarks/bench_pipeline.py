@@ -0,0 +1,287 @@
+"""
+End-to-end benchmark of the email-to-reply pipeline: EmailHandler.process_email
+and process_unread_emails against local fake IMAP and SMTP servers, a stub
+OpenAI-compatible endpoint with configurable latency and a generated database.
+
+Reports p50/p95/p99 latency per stage and emails/s at each concurrency level
+(one EmailHandler per worker thread; in inbox mode each worker polls a mailbox
+of its own) and saves the results as JSON; --compare prints the change
+against an earlier results file.
+
+Usage:
+    python benchmarks/bench_pipeline.py --emails 200 --concurrency 1 4 16 --llm-latency-ms 300
+    python benchmarks/bench_pipeline.py --llm-latency-ms 0 --compare benchmarks/results/pipeline_previous.json
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_servers import FakeIMAPServer, FakeOpenAIServer, FakeSMTPServer
+from src.scripts.generate_data import Scale, generate
+from src.services.booking import idempotency_key_for_message
+
+MODES = ('process_email', 'process_unread_emails')
+# Stage name: (attribute path on an EmailHandler, method)
+STAGES = {
+    'imap_fetch': ('', 'fetch_unread_emails'),
+    'llm_sentiment': ('ai_responder', 'analyze_sentiment'),
+    'llm_extract': ('ai_responder', 'extract_key_information'),
+    'llm_reply': ('ai_responder', 'generate_response'),
+    'availability': ('availability_service', 'get_available_slots'),
+    'log': ('', '_log_interaction'),
+    'process_email': ('', 'process_email'),
+    'smtp_send': ('', 'send_email'),
+}
+
+class StageTimes:
+    """Latency samples per stage, recorded from any thread"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def instrument(self, handler):
+        """Time the handler's stage methods (on this instance only)"""
+        for stage, (path, method) in STAGES.items():
+            owner = getattr(handler, path) if path else handler
+            setattr(owner, method, self._timed(stage, getattr(owner, method)))
+        return handler
+
+    def _timed(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.samples[stage].append(elapsed)
+        return timed
+
+    def summary(self):
+        return {stage: summarize(self.samples[stage]) for stage in STAGES if self.samples[stage]}
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of sorted values"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+    }
+
+def make_emails(count, customers, days, seed):
+    """A mix of availability (45%), booking (45%) and unrecognised (10%) requests from generated customers"""
+    rng = random.Random(seed)
+    emails = []
+    for number in range(count):
+        customer_id = rng.randint(1, customers)
+        day = date.today() + timedelta(days=rng.randint(1, max(1, days - 1)))
+        kind = rng.random()
+        if kind < 0.45:
+            subject, body = 'Availability', f"Hi, what times are available on {day.isoformat()}?"
+        elif kind < 0.9:
+            when = f"{rng.randint(9, 16):02d}:{rng.choice([0, 15, 30, 45]):02d}"
+            subject, body = 'Booking', f"Hello, I'd like to book a haircut on {day.isoformat()} at {when}. Thanks!"
+        else:
+            subject, body = 'Question', "Do you sell gift cards?"
+        message = EmailMessage()
+        message['From'] = f'customer{customer_id}@example.com'
+        message['To'] = 'bookings@example.com'
+        message['Subject'] = subject
+        message['Message-ID'] = f'<bench-{seed}-{number}@example.com>'
+        message.set_content(body)
+        emails.append(message)
+    return emails
+
+def run_process_email(emails, concurrency, stages):
+    """Workers call process_email on a shared queue of emails"""
+    from src.api.email_handler import EmailHandler
+
+    pending = queue.Queue()
+    for message in emails:
+        pending.put(message)
+    errors = []
+
+    def worker(index, handler):
+        while True:
+            try:
+                message = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                sender = message['From']
+                handler.process_email(message.get_content(), sender, sender.split('@')[0],
+                                      idempotency_key=idempotency_key_for_message(message['Message-ID']))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    handlers = [stages.instrument(EmailHandler()) for _ in range(concurrency)]
+    return _run_workers(worker, handlers), errors
+
+def run_process_unread_emails(emails, concurrency, stages, imap, poll_batch):
+    """Each worker polls its own mailbox, receiving poll_batch new emails before each poll"""
+    from src.api.email_handler import EmailHandler
+
+    handlers = []
+    for index in range(concurrency):
+        handler = stages.instrument(EmailHandler())
+        handler.email_user = f'inbox{index}@example.com'
+        handlers.append(handler)
+    shares = [emails[index::concurrency] for index in range(concurrency)]
+    errors = []
+
+    def worker(index, handler):
+        share = shares[index]
+        for start in range(0, len(share), poll_batch):
+            for message in share[start:start + poll_batch]:
+                imap.deliver(handler.email_user, bytes(message))
+            try:
+                handler.process_unread_emails()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    return _run_workers(worker, handlers), errors
+
+def _run_workers(worker, handlers):
+    threads = [threading.Thread(target=worker, args=item) for item in enumerate(handlers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for handler in handlers:
+        handler.session.close()
+        handler.read_session.close()
+    return elapsed
+
+def print_run(run):
+    print(f"{run['mode']:<22} x{run['concurrency']:<3} {run['emails']:6d} emails  {run['seconds']:7.2f}s  "
+          f"{run['emails_per_second']:8.1f} emails/s  {len(run['errors'])} errors")
+    for stage, numbers in run['stages'].items():
+        print(f"    {stage:<16} {numbers['count']:6d}  p50 {numbers['p50_ms']:8.1f} ms  "
+              f"p95 {numbers['p95_ms']:8.1f} ms  p99 {numbers['p99_ms']:8.1f} ms")
+
+def compare(previous, current):
+    """Print emails/s and p95 changes for the runs both results have"""
+    before = {(run['mode'], run['concurrency']): run for run in previous['runs']}
+    print(f"-- compared with {previous['started_at']}")
+    for run in current['runs']:
+        old = before.get((run['mode'], run['concurrency']))
+        if old is None:
+            continue
+        change = run['emails_per_second'] / old['emails_per_second'] - 1 if old['emails_per_second'] else 0
+        print(f"{run['mode']:<22} x{run['concurrency']:<3} emails/s {old['emails_per_second']:8.1f} -> "
+              f"{run['emails_per_second']:8.1f} ({change:+.0%})")
+        for stage, numbers in run['stages'].items():
+            if stage in old['stages']:
+                print(f"    {stage:<16} p95 {old['stages'][stage]['p95_ms']:8.1f} -> {numbers['p95_ms']:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the email pipeline end to end')
+    parser.add_argument('--emails', type=int, default=200, help='Emails per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='Worker threads per run')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='Entry points to drive')
+    parser.add_argument('--poll-batch', type=int, default=10, help='New emails per poll in process_unread_emails mode')
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help='Stub OpenAI response time')
+    parser.add_argument('--llm-jitter-ms', type=float, default=50, help='Uniform +/- jitter on the response time')
+    parser.add_argument('--database-url', help='Use this (already populated) database instead of generating one')
+    parser.add_argument('--employees', type=int, default=50, help='Generated employees')
+    parser.add_argument('--customers', type=int, default=10000, help='Generated customers')
+    parser.add_argument('--days', type=int, default=30, help='Generated days of schedules and bookings, from today')
+    parser.add_argument('--density', type=float, default=0.6, help='Share of each shift that is booked')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--output', help='Results file (default benchmarks/results/pipeline_<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare with')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    output = Path(args.output or Path(__file__).parent / 'results' /
+                  f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json").resolve()
+    imap, smtp = FakeIMAPServer().start(), FakeSMTPServer().start()
+    openai = FakeOpenAIServer(args.llm_latency_ms, args.llm_jitter_ms, seed=args.seed).start()
+    os.environ.update({
+        'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(workdir, 'pipeline.db')}",
+        'OPENAI_BASE_URL': openai.base_url, 'OPENAI_API_KEY': 'benchmark',
+        'IMAP_SERVER': imap.host, 'IMAP_PORT': str(imap.port), 'IMAP_SSL': 'off',
+        'SMTP_SERVER': smtp.host, 'SMTP_PORT': str(smtp.port), 'SMTP_STARTTLS': 'off',
+        'EMAIL_USER': 'bookings@example.com', 'EMAIL_PASS': 'benchmark',
+    })
+    # process_email appends to customer_interactions.log in the working directory
+    os.chdir(workdir)
+
+    from src.infrastructure.database import dispose_engine, get_engine, init_db
+
+    dispose_engine()
+    init_db()
+    if not args.database_url:
+        counts = generate(get_engine(), Scale(
+            employees=args.employees, customers=args.customers, days=args.days, density=args.density,
+            first_day=date.today(), seed=args.seed
+        ))
+        print(f"Generated {counts['bookings']} bookings, {counts['customers']} customers in {counts['seconds']:.1f}s")
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'runs': []
+    }
+    emails = make_emails(args.emails, args.customers, args.days, args.seed)
+    for mode in args.modes:
+        for concurrency in args.concurrency:
+            stages = StageTimes()
+            requests, sent = openai.requests, smtp.received
+            # AIResponder prints every call
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                if mode == 'process_email':
+                    seconds, errors = run_process_email(emails, concurrency, stages)
+                else:
+                    seconds, errors = run_process_unread_emails(emails, concurrency, stages, imap, args.poll_batch)
+            run = {
+                'mode': mode,
+                'concurrency': concurrency,
+                'emails': len(emails),
+                'seconds': seconds,
+                'emails_per_second': len(emails) / seconds,
+                'llm_requests': openai.requests - requests,
+                'smtp_messages': smtp.received - sent,
+                'errors': errors[:10],
+                'stages': stages.summary()
+            }
+            results['runs'].append(run)
+            print_run(run)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
+    for server in (imap, smtp, openai):
+        server.stop()
+    dispose_engine()
+
+if __name__ == "__main__":
+    main()
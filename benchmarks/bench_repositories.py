@@ -0,0 +1,93 @@
+"""
+Benchmark repository read paths: full ORM entities (the previous
+implementation) against the column-projected select() queries.
+
+Usage:
+    python benchmarks/bench_repositories.py --bookings 1000000
+    python benchmarks/bench_repositories.py --path /tmp/bench.db  # reuse a generated database
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, time as dtime
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.models import Base, Booking, Service
+from src.infrastructure.repositories import SQLAlchemyBookingRepository
+from src.scripts.generate_data import Scale, generate
+
+FIRST_DAY = date(2023, 1, 2)
+
+def orm_bookings_in_range(session, start, end):
+    """The previous read path: ORM entities copied into dicts"""
+    rows = session.query(Booking, Service.duration_minutes).outerjoin(
+        Service, Booking.service_id == Service.id
+    ).filter(
+        Booking.appointment_time >= start,
+        Booking.appointment_time <= end,
+        Booking.status == 'confirmed'
+    ).order_by(Booking.employee_id, Booking.appointment_time).all()
+    return [{
+        'id': booking.id,
+        'employee_id': booking.employee_id,
+        'service_id': booking.service_id,
+        'appointment_time': booking.appointment_time,
+        'duration_minutes': duration_minutes,
+        'end_time': booking.appointment_time + timedelta(minutes=duration_minutes)
+    } for booking, duration_minutes in rows]
+
+def timed(label, func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"{label:<32} {median * 1000:9.1f} ms  {len(result) / median:12.0f} rows/s  ({len(result)} rows)")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark booking repository read paths')
+    parser.add_argument('--bookings', type=int, default=1000000, help='Rows in the bookings table')
+    parser.add_argument('--employees', type=int, default=100, help='Number of employees')
+    parser.add_argument('--path', help='SQLite file to use (generated when missing)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the median is reported')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'bench_repositories.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Session = sessionmaker(bind=engine)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        Base.metadata.create_all(engine)
+        scale = Scale(employees=args.employees, customers=100000, days=1, density=0.8,
+                      first_day=FIRST_DAY, seed=args.seed, cancelled_ratio=0.2)
+        scale.days = math.ceil(args.bookings / scale.expected_bookings())
+        counts = generate(engine, scale)
+        print(f"Generated {counts['bookings']} bookings in {counts['seconds']:.1f}s at {path}")
+
+    session = Session()
+    repo = SQLAlchemyBookingRepository(session)
+    print(f"{session.query(Booking).count()} bookings")
+    for days in (1, 7):
+        start = datetime.combine(FIRST_DAY + timedelta(days=14), dtime.min)
+        end = start + timedelta(days=days) - timedelta(microseconds=1)
+        print(f"-- {days} day range")
+        # A fresh identity map each run, as in a request-scoped session
+        orm = timed('ORM entities', lambda: (session.expunge_all(), orm_bookings_in_range(session, start, end))[1], args.repeat)
+        rows = timed('select() rows', lambda: repo.get_bookings_in_range(start, end), args.repeat)
+        spans = timed('select() spans', lambda: repo.get_booking_spans(start, end), args.repeat)
+        print(f"speedup: rows {orm / rows:.1f}x, spans {orm / spans:.1f}x")
+
+if __name__ == "__main__":
+    main()
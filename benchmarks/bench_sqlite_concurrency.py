@@ -0,0 +1,135 @@
+"""
+Concurrent booking and availability load against a SQLite file, with the
+default settings and with the WAL profile plus the single writer queue.
+
+Usage:
+    python benchmarks/bench_sqlite_concurrency.py --bookers 4 --readers 8 --bookings 400
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, time as dtime
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.core.models import Base, Customer, Service, Employee, EmployeeSchedule
+from src.infrastructure.cache import MemoryCacheBackend
+from src.infrastructure.database import apply_sqlite_profile, SQLiteWriter
+from src.services.availability import AvailabilityService
+from src.services.booking import BookingService
+
+FIRST_DAY = date(2030, 1, 7)  # a Monday
+DAYS = 7
+
+def seed(engine, employees):
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([
+            Service(id=1, name='Haircut', duration_minutes=30, price=35),
+            Customer(id=1, email='bench@example.com', first_name='Bench', last_name='Customer'),
+        ])
+        session.execute(insert(Employee), [
+            {'id': index, 'first_name': 'Employee', 'last_name': str(index), 'email': f'employee{index}@example.com'}
+            for index in range(1, employees + 1)
+        ])
+        session.execute(insert(EmployeeSchedule), [
+            {'employee_id': employee_id, 'day_of_week': weekday, 'start_time': dtime(8, 0), 'end_time': dtime(20, 0),
+             'start_date': FIRST_DAY, 'end_date': FIRST_DAY + timedelta(days=DAYS)}
+            for employee_id in range(1, employees + 1) for weekday in range(7)
+        ])
+        session.commit()
+
+def run_mode(label, tuned, args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench_concurrency.db')
+    engine = create_engine(f'sqlite:///{path}', pool_size=args.bookers + args.readers + 2)
+    if tuned:
+        apply_sqlite_profile(engine)
+    seed(engine, args.employees)
+    Session = sessionmaker(bind=engine)
+    writer = SQLiteWriter(Session) if tuned else None
+
+    rng = random.Random(args.seed)
+    work = [
+        (employee_id, datetime.combine(FIRST_DAY + timedelta(days=day), dtime(8, 0)) + timedelta(minutes=30 * slot))
+        for employee_id in range(1, args.employees + 1) for day in range(DAYS) for slot in range(24)
+    ]
+    rng.shuffle(work)
+    work = work[:args.bookings]
+    work_lock = threading.Lock()
+    done = threading.Event()
+    latencies, errors, reads = [], [], [0]
+
+    def booker():
+        session = Session()
+        # With the writer, create_booking runs on its thread (as BookingService
+        # does by itself on the process-wide SQLite engine)
+        booking_service = BookingService(session, writer)
+        while True:
+            with work_lock:
+                if not work:
+                    break
+                employee_id, when = work.pop()
+            started = time.perf_counter()
+            try:
+                booking_service.create_booking(1, employee_id, 1, when)
+                latencies.append(time.perf_counter() - started)
+            except ValueError as e:
+                errors.append(str(e))
+        session.close()
+
+    def reader(seed_value):
+        local = random.Random(seed_value)
+        session = Session()
+        # Uncached computation, so every read reaches the database
+        availability = AvailabilityService(session, cache_backend=MemoryCacheBackend())
+        while not done.is_set():
+            availability.compute_available_slots(FIRST_DAY + timedelta(days=local.randrange(DAYS)), 1)
+            session.rollback()
+            reads[0] += 1
+        session.close()
+
+    threads = [threading.Thread(target=reader, args=(index,)) for index in range(args.readers)]
+    bookers = [threading.Thread(target=booker) for _ in range(args.bookers)]
+    started = time.perf_counter()
+    for thread in threads + bookers:
+        thread.start()
+    for thread in bookers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in threads:
+        thread.join()
+    if writer is not None:
+        writer.close()
+    engine.dispose()
+
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else float('nan')
+    locked = sum('locked' in error for error in errors)
+    print(f"{label:<22} {len(latencies) / elapsed:8.1f} bookings/s  {reads[0] / elapsed:8.1f} reads/s  "
+          f"p95 booking {p95:7.1f} ms  {len(errors)} failed ({locked} database is locked)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent SQLite bookings and availability reads')
+    parser.add_argument('--employees', type=int, default=20, help='Number of employees')
+    parser.add_argument('--bookers', type=int, default=4, help='Threads creating bookings')
+    parser.add_argument('--readers', type=int, default=8, help='Threads computing availability')
+    parser.add_argument('--bookings', type=int, default=400, help='Bookings to create')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    print(f"{args.bookers} bookers, {args.readers} readers, {args.bookings} bookings")
+    run_mode('default journal', False, args)
+    run_mode('WAL + writer queue', True, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Local stand-ins for the services the email pipeline talks to, for the
+end-to-end benchmark: a plain-text IMAP server with a mailbox per user, an
+SMTP server that accepts and counts messages, and an OpenAI-compatible chat
+completions endpoint answering after a configurable latency.
+
+Each server listens on 127.0.0.1 (an ephemeral port by default) and serves
+every connection on a thread of its own.
+"""
+import json
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _Background:
+    """Runs a socketserver-style server on a daemon thread"""
+
+    def __init__(self, server):
+        self._server = server
+        self.host, self.port = server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+def _arguments(text):
+    """IMAP command arguments: atoms, quoted strings and parenthesised lists"""
+    return [quoted if quoted or not atom else atom
+            for quoted, atom in re.findall(r'"((?:[^"\\]|\\.)*)"|(\([^)]*\)|\S+)', text)]
+
+def _uid_set(text, uids):
+    """The uids among `uids` matched by an IMAP sequence set such as 1,3:5,7:*"""
+    highest = max(uids, default=0)
+    wanted = set()
+    for part in text.split(','):
+        first, _, last = part.partition(':')
+        first = highest if first == '*' else int(first)
+        last = first if not last else highest if last == '*' else int(last)
+        wanted.update(range(min(first, last), max(first, last) + 1))
+    return [uid for uid in uids if uid in wanted]
+
+class FakeIMAPServer(_Background):
+    """
+    The IMAP4rev1 subset IMAPClient uses to read an inbox: CAPABILITY, LOGIN,
+    SELECT, UID SEARCH (ALL or UNSEEN), UID FETCH and LOGOUT. Fetching a
+    message marks it seen. Mailboxes are keyed by login user.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.mailboxes = {}  # user: {uid: [raw message, seen]}
+        self.fetched = 0
+        self._lock = threading.Lock()
+        self._next_uid = 1
+        super().__init__(_TCPServer((host, port), self._handler_class()))
+
+    def deliver(self, user, raw):
+        with self._lock:
+            self.mailboxes.setdefault(user, {})[self._next_uid] = [raw, False]
+            self._next_uid += 1
+
+    def unseen(self, user):
+        with self._lock:
+            return sum(not seen for _, seen in self.mailboxes.get(user, {}).values())
+
+    def _handler_class(self):
+        imap = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def send(self, line):
+                self.wfile.write(line if isinstance(line, bytes) else line.encode() + b'\r\n')
+
+            def quick_ack(self):
+                # IMAPClient writes some commands in two pieces; a delayed ACK
+                # of the first would hold the second back for 40 ms (Linux only)
+                if hasattr(socket, 'TCP_QUICKACK'):
+                    self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
+            def handle(self):
+                user = None
+                self.send('* OK [CAPABILITY IMAP4rev1] Fake IMAP ready')
+                while True:
+                    self.quick_ack()
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    tag, _, rest = line.decode().rstrip('\r\n').partition(' ')
+                    command, _, rest = rest.partition(' ')
+                    command = command.upper()
+                    if command == 'UID':
+                        command, _, rest = rest.partition(' ')
+                        command = 'UID ' + command.upper()
+                    args = _arguments(rest)
+                    if command == 'CAPABILITY':
+                        self.send('* CAPABILITY IMAP4rev1')
+                    elif command == 'LOGIN':
+                        user = args[0]
+                    elif command in ('SELECT', 'EXAMINE'):
+                        with imap._lock:
+                            mailbox = imap.mailboxes.setdefault(user, {})
+                            self.send(f'* {len(mailbox)} EXISTS')
+                            self.send(f'* OK [UIDNEXT {imap._next_uid}] Predicted next UID')
+                        self.send('* 0 RECENT')
+                        self.send('* FLAGS (\\Seen)')
+                        self.send('* OK [UIDVALIDITY 1] UIDs valid')
+                    elif command == 'UID SEARCH':
+                        only_unseen = 'UNSEEN' in (arg.upper() for arg in args)
+                        with imap._lock:
+                            uids = [uid for uid, (_, seen) in imap.mailboxes.get(user, {}).items()
+                                    if not (only_unseen and seen)]
+                        self.send('* SEARCH' + ''.join(f' {uid}' for uid in uids))
+                    elif command == 'UID FETCH':
+                        with imap._lock:
+                            mailbox = imap.mailboxes.get(user, {})
+                            messages = []
+                            for uid in _uid_set(args[0], list(mailbox)):
+                                mailbox[uid][1] = True
+                                messages.append((uid, mailbox[uid][0]))
+                            imap.fetched += len(messages)
+                        for number, (uid, raw) in enumerate(messages, 1):
+                            self.send(f'* {number} FETCH (UID {uid} RFC822 {{{len(raw)}}}\r\n'.encode() + raw + b')\r\n')
+                    elif command == 'LOGOUT':
+                        self.send('* BYE Logging out')
+                        self.send(f'{tag} OK LOGOUT completed')
+                        return
+                    elif command != 'NOOP':
+                        self.send(f'{tag} BAD Unsupported command {command}')
+                        continue
+                    self.send(f'{tag} OK {command} completed')
+
+        return Handler
+
+class FakeSMTPServer(_Background):
+    """Accepts any login and message (EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT), counting the messages"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.received = 0
+        self._lock = threading.Lock()
+        super().__init__(_TCPServer((host, port), self._handler_class()))
+
+    def _handler_class(self):
+        smtp = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def send(self, line):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                self.send('220 fake ESMTP ready')
+                for line in self.rfile:
+                    command = line.decode().strip().split(' ', 1)[0].upper()
+                    if command == 'EHLO':
+                        self.send('250-fake')
+                        self.send('250-AUTH PLAIN')
+                        self.send('250 8BITMIME')
+                    elif command == 'AUTH':
+                        self.send('235 Authentication successful')
+                    elif command == 'DATA':
+                        self.send('354 End data with <CR><LF>.<CR><LF>')
+                        for data in self.rfile:
+                            if data in (b'.\r\n', b'.\n'):
+                                break
+                        with smtp._lock:
+                            smtp.received += 1
+                        self.send('250 Message accepted')
+                    elif command == 'QUIT':
+                        self.send('221 Bye')
+                        return
+                    else:
+                        self.send('250 OK')
+
+        return Handler
+
+class FakeOpenAIServer(_Background):
+    """
+    POST /v1/chat/completions answering after latency_ms +/- jitter_ms: one
+    word to sentiment prompts, a JSON object to extraction prompts and a
+    short reply otherwise. Set OPENAI_BASE_URL to base_url to use it.
+    """
+
+    REPLY = ("Thank you for getting in touch. I have checked the schedule for you; "
+             "please see the details below and reply if you would like to change anything.")
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, host='127.0.0.1', port=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        super().__init__(ThreadingHTTPServer((host, port), self._handler_class()))
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/v1'
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _content(self, messages):
+        system = next((message['content'] for message in messages if message['role'] == 'system'), '')
+        if 'sentiment' in system:
+            return 'neutral'
+        if 'Extract key information' in system:
+            return json.dumps({'name': None, 'phone': None, 'date': None, 'time': None, 'request_type': None})
+        return self.REPLY
+
+    def _handler_class(self):
+        openai = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, as the real API
+            disable_nagle_algorithm = True  # headers and body are written separately
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                time.sleep(openai._delay())
+                content = openai._content(request.get('messages', []))
+                body = json.dumps({
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'fake'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
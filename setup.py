@@ -16,6 +16,14 @@ setup(
             'pytest-cov',
             'pytest-mock',
         ],
+        'bitmap': [
+            'numpy',
+        ],
+        'async': [
+            'aiosqlite',
+            'asyncpg',
+            'greenlet',
+        ],
     },
     python_requires=">=3.7",
     author="Your Name",
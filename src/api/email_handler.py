@@ -8,12 +8,13 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import json
 
-from src.infrastructure.database import get_session
+from src.infrastructure.database import get_session, get_read_session
 from src.infrastructure.repositories import SQLAlchemyScheduleRepository, SQLAlchemyBookingRepository
 from src.services.email_parser import RegexEmailParser
 from src.services.availability import AvailabilityService
 from src.services.response import EmailResponseHandler
 from src.services.ai_responder import AIResponder
+from src.services.booking import idempotency_key_for_message
 from src.core.models import Customer
 
 load_dotenv()
@@ -24,9 +25,17 @@ class EmailHandler:
         self.smtp_server = os.getenv('SMTP_SERVER')
         self.email_user = os.getenv('EMAIL_USER')
         self.email_pass = os.getenv('EMAIL_PASS')
+        # Defaults are IMAPS on 993 and SMTP with STARTTLS on 587; plain
+        # connections are for local servers such as the benchmarks' fakes
+        self.imap_port = int(os.getenv('IMAP_PORT', 993))
+        self.imap_ssl = os.getenv('IMAP_SSL', 'on').lower() != 'off'
+        self.smtp_port = int(os.getenv('SMTP_PORT', 587))
+        self.smtp_starttls = os.getenv('SMTP_STARTTLS', 'on').lower() != 'off'
         
-        # Initialize database session
+        # Initialize database sessions; lookups and availability may be
+        # served by a read replica (DATABASE_REPLICA_URLS)
         self.session = get_session()
+        self.read_session = get_read_session()
         
         # Initialize repositories
         self.schedule_repository = SQLAlchemyScheduleRepository(self.session)
@@ -34,12 +43,12 @@ class EmailHandler:
         
         # Initialize services
         self.email_parser = RegexEmailParser()
-        self.availability_service = AvailabilityService(self.session)
+        self.availability_service = AvailabilityService(self.read_session)
         self.response_handler = EmailResponseHandler()
         self.ai_responder = AIResponder()
 
     def fetch_unread_emails(self):
-        with IMAPClient(self.imap_server) as server:
+        with IMAPClient(self.imap_server, port=self.imap_port, ssl=self.imap_ssl) as server:
             server.login(self.email_user, self.email_pass)
             server.select_folder('INBOX')
             messages = server.search(['UNSEEN'])
@@ -48,14 +57,23 @@ class EmailHandler:
                 email_message = BytesParser(policy=default).parsebytes(message_data[b'RFC822'])
                 emails.append({
                     'uid': uid,
+                    # Reprocessing the same email gives the same booking key
+                    'idempotency_key': idempotency_key_for_message(
+                        email_message['Message-ID'], message_data[b'RFC822']
+                    ),
                     'from': email_message['from'],
                     'subject': email_message['subject'],
                     'body': email_message.get_body(preferencelist=('plain')).get_content()
                 })
             return emails
 
-    def process_email(self, email_body: str, from_email: str, from_name: str) -> str:
-        """Process an email and generate appropriate response using AI"""
+    def process_email(self, email_body: str, from_email: str, from_name: str, idempotency_key: str = None) -> str:
+        """
+        Process an email and generate appropriate response using AI. The data
+        of a booking request carries idempotency_key (see
+        idempotency_key_for_message) for BookingService.create_booking; the
+        booking itself is not created here yet.
+        """
         # First, analyze the email content
         sentiment = self.ai_responder.analyze_sentiment(email_body)
         extracted_info = self.ai_responder.extract_key_information(email_body)
@@ -68,8 +86,10 @@ class EmailHandler:
             request_type = "booking_request"
         
         # Get customer info from database
-        customer_info = self.session.query(Customer).filter_by(email=from_email).first()
+        customer_info = self.read_session.query(Customer).filter_by(email=from_email).first()
         customer_context = f"Customer since: {customer_info.created_at.strftime('%Y-%m-%d')}" if customer_info else "New customer"
+        # End the read transaction so the pooled connection is not held while the model writes
+        self.read_session.rollback()
         
         # Generate AI response
         ai_response = self.ai_responder.generate_response(
@@ -111,7 +131,8 @@ class EmailHandler:
                         'employee_name': "Test Employee",  # In production, this would be selected based on availability
                         'appointment_time': booking_time,
                         'duration_minutes': 60,  # Default duration, in production this would come from the service
-                        'service_id': 1  # Default service ID for testing
+                        'service_id': 1,  # Default service ID for testing
+                        'idempotency_key': idempotency_key
                     }
                     
                     # Process booking logic...
@@ -123,6 +144,9 @@ class EmailHandler:
             system_response = self.response_handler.handle_unknown_request()
             final_response = f"{ai_response}\n\n{system_response}"
         
+        # End the read transaction so no connection is held between emails
+        self.read_session.rollback()
+
         # Log the interaction
         self._log_interaction(from_email, email_body, final_response, sentiment, extracted_info)
         
@@ -150,8 +174,9 @@ class EmailHandler:
         msg['From'] = self.email_user
         msg['To'] = to_address
         msg.set_content(body)
-        with smtplib.SMTP(self.smtp_server, 587) as server:
-            server.starttls()
+        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+            if self.smtp_starttls:
+                server.starttls()
             server.login(self.email_user, self.email_pass)
             server.send_message(msg)
 
@@ -162,7 +187,8 @@ class EmailHandler:
             response = self.process_email(
                 email_body=email['body'],
                 from_email=email['from'],
-                from_name=email['from'].split('@')[0]  # Simple name extraction
+                from_name=email['from'].split('@')[0],  # Simple name extraction
+                idempotency_key=email.get('idempotency_key')
             )
             self.send_email(
                 to_address=email['from'],
@@ -9,8 +9,15 @@ from .models import (
     EmployeeService,
     Customer,
     EmployeeSchedule,
-    Booking
+    Booking,
+    ArchivedBooking,
+    ArchiveLog,
+    MaterializedDay,
+    FreeInterval,
+    ReplicationHeartbeat,
+    JobLease
 )
+from .values import BookingSpan, Slot, SlotColumns
 
 __all__ = [
     'Base',
@@ -19,5 +26,14 @@ __all__ = [
     'EmployeeService',
     'Customer',
     'EmployeeSchedule',
-    'Booking'
+    'Booking',
+    'ArchivedBooking',
+    'ArchiveLog',
+    'MaterializedDay',
+    'FreeInterval',
+    'ReplicationHeartbeat',
+    'JobLease',
+    'BookingSpan',
+    'Slot',
+    'SlotColumns'
 ] 
\ No newline at end of file
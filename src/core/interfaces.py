@@ -1,14 +1,19 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import List, Dict, Optional
+from datetime import date, datetime
+from typing import Any, List, Dict, Optional, Sequence, Tuple
+from src.core.values import BookingSpan
 
 class ScheduleRepository(ABC):
     @abstractmethod
-    def get_employee_schedule(self, employee_id: int, day_of_week: int) -> Optional[Dict]:
+    def get_employee_schedule(self, employee_id: int, day_of_week: int, on_date: Optional[date] = None) -> Optional[Dict]:
         pass
 
     @abstractmethod
-    def get_all_schedules_for_day(self, day_of_week: int) -> List[Dict]:
+    def get_all_schedules_for_day(self, day_of_week: int, on_date: Optional[date] = None) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_schedules_in_range(self, start_date: date, end_date: date, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
         pass
 
 class BookingRepository(ABC):
@@ -20,6 +25,63 @@ class BookingRepository(ABC):
     def get_bookings_for_employee(self, employee_id: int, date: datetime) -> List[Dict]:
         pass
 
+    @abstractmethod
+    def get_bookings_for_day(self, date: datetime) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_bookings_in_range(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_booking_spans(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[BookingSpan]:
+        pass
+
+    @abstractmethod
+    def has_overlapping_booking(self, employee_id: int, start: datetime, end: datetime, earliest_start: Optional[datetime] = None) -> bool:
+        pass
+
+class AsyncScheduleRepository(ABC):
+    """ScheduleRepository for asyncio code: the same queries, awaited"""
+    @abstractmethod
+    async def get_employee_schedule(self, employee_id: int, day_of_week: int, on_date: Optional[date] = None) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    async def get_all_schedules_for_day(self, day_of_week: int, on_date: Optional[date] = None) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def get_schedules_in_range(self, start_date: date, end_date: date, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        pass
+
+class AsyncBookingRepository(ABC):
+    """BookingRepository for asyncio code: the same queries, awaited"""
+    @abstractmethod
+    async def add_booking(self, booking_data: Dict) -> Dict:
+        """Insert a booking from the model's columns (customer_id, service_id, schedule_id...)"""
+        pass
+
+    @abstractmethod
+    async def get_bookings_for_employee(self, employee_id: int, date: datetime) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def get_bookings_for_day(self, date: datetime) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def get_bookings_in_range(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def get_booking_spans(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[BookingSpan]:
+        pass
+
+    @abstractmethod
+    async def has_overlapping_booking(self, employee_id: int, start: datetime, end: datetime, earliest_start: Optional[datetime] = None) -> bool:
+        pass
+
 class EmailParser(ABC):
     @abstractmethod
     def parse_availability_request(self, email_body: str) -> Optional[Dict]:
@@ -45,4 +107,33 @@ class ResponseHandler(ABC):
 
     @abstractmethod
     def handle_unknown_request(self) -> str:
-        pass 
\ No newline at end of file
+        pass
+
+class CacheBackend(ABC):
+    """
+    Cache store with versioned invalidation. Every entry records the versions of
+    the scopes it depends on; bumping a scope makes those entries stale.
+    """
+    @abstractmethod
+    def get(self, key: Tuple, scopes: Sequence[Tuple]) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: Tuple, value: Any, versions: Tuple[int, ...]):
+        pass
+
+    @abstractmethod
+    def versions(self, scopes: Sequence[Tuple]) -> Tuple[int, ...]:
+        pass
+
+    @abstractmethod
+    def bump(self, scopes: Sequence[Tuple]):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
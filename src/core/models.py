@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Time, ForeignKey, Date, Text, Boolean, Numeric, Index
+from sqlalchemy import Column, Integer, String, DateTime, Time, ForeignKey, Date, Text, Boolean, Numeric, Index, Float
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, timezone
 
@@ -119,8 +119,13 @@ class Booking(Base):
     service_id = Column(Integer, ForeignKey('services.id'), nullable=False, index=True)
     schedule_id = Column(Integer, ForeignKey('employee_schedules.id'), nullable=False, index=True)
     appointment_time = Column(DateTime, nullable=False, index=True)
+    # Set by the database from the service duration (see booking_constraints)
+    end_time = Column(DateTime)
     status = Column(String(20), default='confirmed', index=True)  # confirmed, cancelled, completed
     notes = Column(Text)
+    # Client-supplied key (e.g. derived from the request email's Message-ID);
+    # creating a booking again with the same key returns this one
+    idempotency_key = Column(String(255))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
@@ -135,4 +140,84 @@ class Booking(Base):
         Index('idx_booking_appointment', 'appointment_time', 'status'),
         Index('idx_booking_employee_date', 'employee_id', 'appointment_time'),
         Index('idx_booking_customer', 'customer_id', 'appointment_time'),
-    ) 
\ No newline at end of file
+        Index('idx_booking_idempotency_key', 'idempotency_key', unique=True),
+    )
+
+class ArchivedBooking(Base):
+    __tablename__ = 'archived_bookings'
+
+    # Completed and cancelled bookings moved out of bookings by
+    # BookingArchiver, keeping their ids; no foreign keys, so the rows they
+    # pointed to can be removed later
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    customer_id = Column(Integer, nullable=False)
+    employee_id = Column(Integer, nullable=False)
+    service_id = Column(Integer, nullable=False)
+    schedule_id = Column(Integer, nullable=False)
+    appointment_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime)
+    status = Column(String(20))
+    notes = Column(Text)
+    idempotency_key = Column(String(255))
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_archived_booking_appointment', 'appointment_time'),
+        Index('idx_archived_booking_customer', 'customer_id', 'appointment_time'),
+    )
+
+class ArchiveLog(Base):
+    __tablename__ = 'archive_log'
+
+    id = Column(Integer, primary_key=True)
+    operation_date = Column(DateTime, nullable=False)
+    records_moved = Column(Integer)
+    duration_seconds = Column(Float)
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_archive_log_date', 'operation_date'),
+    )
+
+class MaterializedDay(Base):
+    __tablename__ = 'materialized_days'
+
+    date = Column(Date, primary_key=True)
+    built_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class FreeInterval(Base):
+    __tablename__ = 'free_intervals'
+
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False)
+    date = Column(Date, ForeignKey('materialized_days.date'), nullable=False)
+    anchor_time = Column(DateTime, nullable=False)  # Schedule start, slots are aligned to it
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_free_interval_date', 'date', 'employee_id', 'start_time'),
+    )
+
+class ReplicationHeartbeat(Base):
+    __tablename__ = 'replication_heartbeat'
+
+    # One row, written on the primary by ReplicaRouter.heartbeat(); its age
+    # on a replica is that replica's lag
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(Float, nullable=False)  # Seconds since the epoch
+
+class JobLease(Base):
+    __tablename__ = 'job_leases'
+
+    # Held by the JobScheduler worker running the job, so workers sharing the
+    # database never run it at the same time; an expired lease is free
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(Float, nullable=False)  # Seconds since the epoch
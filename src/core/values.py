@@ -0,0 +1,147 @@
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List
+
+MINUTES_PER_DAY = 24 * 60
+
+def minute_of_day(value, round_up: bool = False) -> int:
+    """Minutes since midnight of a datetime or time, rounding seconds down (or up)"""
+    minutes = value.hour * 60 + value.minute
+    if round_up and (value.second or value.microsecond):
+        minutes += 1
+    return minutes
+
+@dataclass(frozen=True)
+class BookingSpan:
+    """
+    A confirmed booking reduced to what availability needs: the employee and
+    the booked minutes of one day. Partial minutes count as booked.
+    """
+    __slots__ = ('employee_id', 'day_ordinal', 'start_minute', 'end_minute')
+    employee_id: int
+    day_ordinal: int
+    start_minute: int
+    end_minute: int
+
+    @classmethod
+    def from_row(cls, employee_id: int, appointment_time: datetime, duration_minutes: int) -> 'BookingSpan':
+        end = appointment_time + timedelta(minutes=duration_minutes)
+        end_minute = minute_of_day(end, round_up=True) + (end.toordinal() - appointment_time.toordinal()) * MINUTES_PER_DAY
+        return cls(employee_id, appointment_time.toordinal(), minute_of_day(appointment_time), end_minute)
+
+@dataclass(frozen=True)
+class Slot:
+    """One available slot, materialized from SlotColumns on demand"""
+    __slots__ = ('employee_id', 'start_time', 'end_time', 'duration_minutes')
+    employee_id: int
+    start_time: datetime
+    end_time: datetime
+    duration_minutes: int
+
+    def to_dict(self) -> Dict:
+        return {
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration_minutes': self.duration_minutes,
+            'employee_id': self.employee_id
+        }
+
+class SlotColumns:
+    """
+    Available slots of one service duration stored column-wise: parallel int
+    arrays of day ordinals, employee ids and start minutes. A slot costs 12
+    bytes instead of a dict holding two datetimes, so computed and cached
+    results stay small. Convert with to_dicts() only when handing slots to
+    callers outside the availability code.
+    """
+
+    __slots__ = ('duration_minutes', 'days', 'employee_ids', 'start_minutes')
+
+    def __init__(self, duration_minutes: int):
+        self.duration_minutes = duration_minutes
+        self.days = array('i')
+        self.employee_ids = array('i')
+        self.start_minutes = array('i')
+
+    def add(self, day_ordinal: int, employee_id: int, starts: Iterable[int]):
+        """Append slots of one employee-day given their start minutes"""
+        before = len(self.start_minutes)
+        self.start_minutes.extend(starts)
+        added = len(self.start_minutes) - before
+        self.days.extend(array('i', [day_ordinal]) * added)
+        self.employee_ids.extend(array('i', [employee_id]) * added)
+
+    def extend(self, other: 'SlotColumns'):
+        self.days.extend(other.days)
+        self.employee_ids.extend(other.employee_ids)
+        self.start_minutes.extend(other.start_minutes)
+
+    def copy(self) -> 'SlotColumns':
+        """An independent copy (the arrays are copied with memcpy)"""
+        copied = SlotColumns(self.duration_minutes)
+        copied.days = self.days[:]
+        copied.employee_ids = self.employee_ids[:]
+        copied.start_minutes = self.start_minutes[:]
+        return copied
+
+    def _take(self, indices: Iterable[int]) -> 'SlotColumns':
+        taken = SlotColumns(self.duration_minutes)
+        for index in indices:
+            taken.days.append(self.days[index])
+            taken.employee_ids.append(self.employee_ids[index])
+            taken.start_minutes.append(self.start_minutes[index])
+        return taken
+
+    def sorted(self) -> 'SlotColumns':
+        """Slots ordered by start time, then employee"""
+        days, starts, employee_ids = self.days, self.start_minutes, self.employee_ids
+        # A single int key per slot is cheaper than building tuples
+        key = lambda i: ((days[i] * MINUTES_PER_DAY + starts[i]) << 32) | employee_ids[i]
+        return self._take(sorted(range(len(starts)), key=key))
+
+    def since(self, when: datetime) -> 'SlotColumns':
+        """Slots starting at or after when"""
+        threshold = when.toordinal() * MINUTES_PER_DAY + minute_of_day(when, round_up=True)
+        days, starts = self.days, self.start_minutes
+        return self._take(i for i in range(len(starts)) if days[i] * MINUTES_PER_DAY + starts[i] >= threshold)
+
+    def head(self, limit: int) -> 'SlotColumns':
+        return self._take(range(min(limit, len(self))))
+
+    def __len__(self) -> int:
+        return len(self.start_minutes)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SlotColumns):
+            return NotImplemented
+        return (self.duration_minutes == other.duration_minutes and self.days == other.days and
+                self.employee_ids == other.employee_ids and self.start_minutes == other.start_minutes)
+
+    def __getstate__(self):
+        return (self.duration_minutes, self.days, self.employee_ids, self.start_minutes)
+
+    def __setstate__(self, state):
+        self.duration_minutes, self.days, self.employee_ids, self.start_minutes = state
+
+    def __iter__(self) -> Iterator[Slot]:
+        for start_time, employee_id in self._start_times():
+            yield Slot(employee_id, start_time, start_time + timedelta(minutes=self.duration_minutes), self.duration_minutes)
+
+    def _start_times(self):
+        midnights = {}
+        for day_ordinal, employee_id, start_minute in zip(self.days, self.employee_ids, self.start_minutes):
+            midnight = midnights.get(day_ordinal)
+            if midnight is None:
+                midnight = midnights[day_ordinal] = datetime.combine(date.fromordinal(day_ordinal), time.min)
+            yield midnight + timedelta(minutes=start_minute), employee_id
+
+    def to_dicts(self) -> List[Dict]:
+        """The slot dicts returned by the public availability API"""
+        duration = timedelta(minutes=self.duration_minutes)
+        return [{
+            'start_time': start_time,
+            'end_time': start_time + duration,
+            'duration_minutes': self.duration_minutes,
+            'employee_id': employee_id
+        } for start_time, employee_id in self._start_times()]
@@ -2,11 +2,49 @@
 Infrastructure package containing database configuration and handlers.
 """
 
-from .database import init_db, get_session
+from .database import (
+    init_db, get_engine, get_session, get_session_factory, get_scoped_session, dispose_engine,
+    apply_sqlite_profile, SQLiteWriter, get_writer, get_writer_for, get_router, get_read_session,
+    async_database_url, get_async_engine, get_async_session_factory, get_async_session, dispose_async_engine
+)
 from .db_handler import DBHandler
+from .cache import TTLCache, MemoryCacheBackend, SQLiteCacheBackend, get_cache_backend, share_engine_state
+from .schedule_index import ScheduleIndex, get_schedule_index
+from .replicas import ReplicaRouter, RoutingSession
+from .archiver import BookingArchiver, ArchiveReport
+from .jobs import JobScheduler, CronSchedule, IntervalSchedule
 
 __all__ = [
     'init_db',
+    'get_engine',
     'get_session',
-    'DBHandler'
+    'get_session_factory',
+    'get_scoped_session',
+    'dispose_engine',
+    'apply_sqlite_profile',
+    'SQLiteWriter',
+    'get_writer',
+    'get_writer_for',
+    'get_router',
+    'get_read_session',
+    'async_database_url',
+    'get_async_engine',
+    'get_async_session_factory',
+    'get_async_session',
+    'dispose_async_engine',
+    'DBHandler',
+    'TTLCache',
+    'MemoryCacheBackend',
+    'SQLiteCacheBackend',
+    'get_cache_backend',
+    'share_engine_state',
+    'ScheduleIndex',
+    'get_schedule_index',
+    'ReplicaRouter',
+    'RoutingSession',
+    'BookingArchiver',
+    'ArchiveReport',
+    'JobScheduler',
+    'CronSchedule',
+    'IntervalSchedule'
 ] 
\ No newline at end of file
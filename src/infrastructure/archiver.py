@@ -0,0 +1,111 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Sequence
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from src.core.models import Booking, ArchivedBooking, ArchiveLog
+
+ARCHIVED_STATUSES = ('completed', 'cancelled')
+# Columns copied from bookings to archived_bookings
+ARCHIVED_COLUMNS = (
+    'id', 'customer_id', 'employee_id', 'service_id', 'schedule_id', 'appointment_time', 'end_time',
+    'status', 'notes', 'idempotency_key', 'created_at', 'updated_at'
+)
+
+@dataclass
+class ArchiveReport:
+    rows_moved: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_moved / self.seconds if self.seconds else 0.0
+
+class BookingArchiver:
+    """
+    Moves completed and cancelled bookings older than older_than from
+    bookings to archived_bookings, on any database.
+
+    Rows are moved batch_size at a time, each batch in its own short
+    transaction (INSERT ... SELECT then DELETE by primary key), paginating
+    on bookings.id so no batch rescans what earlier ones skipped. Sleeping
+    sleep_seconds between batches leaves room for booking writes, which on
+    SQLite wait for the single writer.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        older_than: timedelta = timedelta(days=90),
+        batch_size: int = 1000,
+        sleep_seconds: float = 0.0,
+        statuses: Sequence[str] = ARCHIVED_STATUSES,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.session = session
+        self.older_than = older_than
+        self.batch_size = batch_size
+        self.sleep_seconds = sleep_seconds
+        self.statuses = tuple(statuses)
+        self._clock = clock
+        self._sleep = sleep
+
+    def _next_batch(self, after_id: int, before: datetime) -> list:
+        return self.session.execute(
+            select(Booking.id).where(
+                Booking.id > after_id,
+                Booking.appointment_time < before,
+                Booking.status.in_(self.statuses)
+            ).order_by(Booking.id).limit(self.batch_size)
+        ).scalars().all()
+
+    def _move(self, ids: list):
+        columns = [getattr(Booking, name) for name in ARCHIVED_COLUMNS]
+        self.session.execute(insert(ArchivedBooking).from_select(
+            list(ARCHIVED_COLUMNS), select(*columns).where(Booking.id.in_(ids))
+        ))
+        self.session.execute(delete(Booking).where(Booking.id.in_(ids)))
+
+    def run(self, before: Optional[datetime] = None, max_batches: Optional[int] = None) -> ArchiveReport:
+        """
+        Archive the matching bookings starting before `before` (default: now
+        minus older_than), stopping after max_batches if given. Each run is
+        recorded in archive_log, failures included.
+        """
+        before = before or datetime.now() - self.older_than
+        report, after_id = ArchiveReport(), 0
+        started = self._clock()
+        try:
+            while max_batches is None or report.batches < max_batches:
+                ids = self._next_batch(after_id, before)
+                if not ids:
+                    break
+                self._move(ids)
+                self.session.commit()
+                report.rows_moved += len(ids)
+                report.batches += 1
+                after_id = ids[-1]
+                if len(ids) < self.batch_size:
+                    break
+                if self.sleep_seconds:
+                    self._sleep(self.sleep_seconds)
+        except Exception as e:
+            self.session.rollback()
+            report.seconds = self._clock() - started
+            self._log(report, str(e))
+            raise
+        report.seconds = self._clock() - started
+        self._log(report)
+        return report
+
+    def _log(self, report: ArchiveReport, error: Optional[str] = None):
+        self.session.add(ArchiveLog(
+            operation_date=datetime.now(), records_moved=report.rows_moved,
+            duration_seconds=report.seconds, error_message=error
+        ))
+        self.session.commit()
@@ -0,0 +1,174 @@
+"""
+Database-enforced prevention of overlapping confirmed bookings.
+
+PostgreSQL: bookings.end_time is kept in step with the service duration by a
+trigger, and an exclusion constraint over tsrange(appointment_time, end_time)
+rejects a confirmed booking overlapping another of the same employee (one
+constraint per partition when bookings is partitioned, see partitioning).
+
+SQLite: triggers reserve every RESERVATION_CELL_MINUTES cell a confirmed
+booking touches in booking_cells, whose primary key (employee_id, cell) is
+the unique index that rejects the overlap. Bookings off the cell grid
+reserve whole cells, so such neighbours may conflict; overlaps never pass.
+
+Either way a conflicting INSERT or UPDATE fails at once with an
+IntegrityError (see is_overlap_error), without locks or retries. The objects
+are installed with the bookings table and by install_booking_constraints()
+for existing databases.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from src.core.models import Booking
+
+RESERVATION_CELL_MINUTES = 5
+MAX_RESERVED_CELLS = 24 * 60 // RESERVATION_CELL_MINUTES  # bookings longer than a day reserve their first day
+
+def _cell_bounds(row: str):
+    """SQL for the first cell a booking row touches and the cell after its end"""
+    seconds = RESERVATION_CELL_MINUTES * 60
+    start = f"CAST(strftime('%s', {row}.appointment_time) AS INTEGER)"
+    return f"{start} / {seconds}", f"({start} + services.duration_minutes * 60 + {seconds - 1}) / {seconds}"
+
+def _sqlite_reserve(row: str) -> str:
+    first_cell, end_cell = _cell_bounds(row)
+    return f"""
+        INSERT INTO booking_cells (employee_id, cell, booking_id)
+        SELECT {row}.employee_id, {first_cell} + reservation_offsets.n, {row}.id
+        FROM services JOIN reservation_offsets ON reservation_offsets.n < {end_cell} - {first_cell}
+        WHERE services.id = {row}.service_id AND {row}.status = 'confirmed'
+    """
+
+def _sqlite_end_time(row: str) -> str:
+    return f"""
+        SELECT strftime('%Y-%m-%d %H:%M:%S', {row}.appointment_time, '+' || services.duration_minutes || ' minutes')
+               || '.000000'
+        FROM services WHERE services.id = {row}.service_id
+    """
+
+SQLITE_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS booking_cells (
+        employee_id INTEGER NOT NULL,
+        cell INTEGER NOT NULL,
+        booking_id INTEGER NOT NULL,
+        PRIMARY KEY (employee_id, cell)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_booking_cells_booking ON booking_cells (booking_id)",
+    "CREATE TABLE IF NOT EXISTS reservation_offsets (n INTEGER PRIMARY KEY)",
+    f"""
+    INSERT OR IGNORE INTO reservation_offsets (n)
+    WITH RECURSIVE offsets(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM offsets WHERE n < {MAX_RESERVED_CELLS - 1})
+    SELECT n FROM offsets
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bookings_reserve_insert AFTER INSERT ON bookings
+    BEGIN
+        UPDATE bookings SET end_time = ({_sqlite_end_time('NEW')}) WHERE id = NEW.id;
+        {_sqlite_reserve('NEW')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bookings_reserve_update
+    AFTER UPDATE OF status, appointment_time, employee_id, service_id ON bookings
+    BEGIN
+        DELETE FROM booking_cells WHERE booking_id = OLD.id;
+        UPDATE bookings SET end_time = ({_sqlite_end_time('NEW')}) WHERE id = NEW.id;
+        {_sqlite_reserve('NEW')};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_reserve_delete AFTER DELETE ON bookings
+    BEGIN
+        DELETE FROM booking_cells WHERE booking_id = OLD.id;
+    END
+    """,
+]
+
+def _sqlite_reserve_bookings(condition: str, verb: str = 'INSERT OR IGNORE') -> str:
+    """Reserve the cells of the confirmed bookings matching condition in one statement (CROSS JOIN fixes the join order)"""
+    first_cell, end_cell = _cell_bounds('bookings')
+    return f"""
+        {verb} INTO booking_cells (employee_id, cell, booking_id)
+        SELECT bookings.employee_id, {first_cell} + reservation_offsets.n, bookings.id
+        FROM bookings
+        CROSS JOIN services ON services.id = bookings.service_id
+        CROSS JOIN reservation_offsets ON reservation_offsets.n < {end_cell} - {first_cell}
+        WHERE bookings.status = 'confirmed' AND {condition}
+    """
+
+def _sqlite_backfill() -> list:
+    """Fill end_time and cells of rows written before the triggers existed; overlaps among them are kept"""
+    return [
+        f"UPDATE bookings SET end_time = ({_sqlite_end_time('bookings')}) WHERE end_time IS NULL",
+        _sqlite_reserve_bookings(
+            "NOT EXISTS (SELECT 1 FROM booking_cells WHERE booking_cells.booking_id = bookings.id)"
+        ),
+    ]
+
+POSTGRES_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    """
+    CREATE OR REPLACE FUNCTION bookings_set_end_time() RETURNS trigger AS $$
+    BEGIN
+        NEW.end_time := NEW.appointment_time + make_interval(
+            mins => (SELECT duration_minutes FROM services WHERE id = NEW.service_id)
+        );
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS bookings_end_time ON bookings",
+    """
+    CREATE TRIGGER bookings_end_time BEFORE INSERT OR UPDATE OF appointment_time, service_id ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_set_end_time()
+    """,
+    """
+    UPDATE bookings SET end_time = bookings.appointment_time + make_interval(mins => services.duration_minutes)
+    FROM services WHERE services.id = bookings.service_id AND bookings.end_time IS NULL
+    """,
+    """
+    DO $$ BEGIN
+        -- Partitioned bookings get the constraint on each partition instead
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap')
+                AND (SELECT relkind FROM pg_class WHERE oid = 'bookings'::regclass) <> 'p' THEN
+            ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap EXCLUDE USING gist (
+                employee_id WITH =, tsrange(appointment_time, end_time) WITH &&
+            ) WHERE (status = 'confirmed');
+        END IF;
+    END $$
+    """,
+]
+
+def install_booking_constraints(connection):
+    """Create (idempotently) the overlap-prevention objects for the connection's dialect"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_STATEMENTS + _sqlite_backfill()
+    elif dialect == 'postgresql':
+        statements = POSTGRES_STATEMENTS
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+def reserve_loaded_bookings(connection, first_booking_id: int):
+    """
+    SQLite: reserve the cells of bookings bulk-loaded with the triggers
+    dropped, from first_booking_id on. Unlike the backfill it does not check
+    for existing cells, so it is fastest with idx_booking_cells_booking
+    dropped too, and an overlap among the loaded rows fails it.
+    """
+    if connection.dialect.name == 'sqlite':
+        # In the cells' key order, so the inserts append
+        condition = "bookings.id >= :first ORDER BY bookings.employee_id, bookings.appointment_time"
+        connection.execute(text(_sqlite_reserve_bookings(condition, verb='INSERT')), {'first': first_booking_id})
+
+def is_overlap_error(error: IntegrityError) -> bool:
+    """Whether an IntegrityError is a rejected overlapping booking"""
+    message = str(error.orig)
+    return 'booking_cells' in message or 'bookings_no_overlap' in message
+
+@event.listens_for(Booking.__table__, 'after_create')
+def _install_after_create(target, connection, **kw):
+    install_booking_constraints(connection)
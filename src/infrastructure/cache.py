@@ -0,0 +1,360 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+from src.core.interfaces import CacheBackend
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry expiry and least-recently-used eviction.
+
+    Unlike functools.lru_cache on a method, each instance owns its own storage,
+    so it never holds a reference to the object (or database session) using it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: Optional[float] = 300,
+        on_evict: Optional[Callable[[Hashable], None]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                self._notify(key)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                oldest, _ = self._data.popitem(last=False)
+                self.evictions += 1
+                evicted.append(oldest)
+        for oldest in evicted:
+            self._notify(oldest)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value or compute it with loader and cache it"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable) -> bool:
+        """Remove an entry, returning True if it was present"""
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        """Remove every entry (statistics are kept)"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and (entry[0] is None or self._clock() < entry[0])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def _notify(self, key: Hashable):
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate and eviction counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Versioned cache held in process memory (the default). A scope's version
+    is forgotten once it was last bumped over ttl_seconds ago: every entry
+    recorded against an older version has expired by then.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: Optional[float] = 300,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self._entries = TTLCache(maxsize, ttl_seconds, clock=clock)
+        self._clock = clock
+        self._versions: Dict[Tuple, int] = {}
+        self._bumped_at: Dict[Tuple, float] = {}
+        self._last_forget = clock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def versions(self, scopes: Sequence[Tuple]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def get(self, key: Tuple, scopes: Sequence[Tuple]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        versions, value = entry
+        if versions != self.versions(scopes):
+            self.misses += 1
+            self.stale += 1
+            self._entries.pop(key)
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: Tuple, value: Any, versions: Tuple[int, ...]):
+        self._entries.set(key, (versions, value))
+
+    def bump(self, scopes: Sequence[Tuple]):
+        now = self._clock()
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+                self._bumped_at[scope] = now
+            ttl_seconds = self._entries.ttl_seconds
+            # At most once a TTL, so bumping stays cheap
+            if ttl_seconds is not None and now - self._last_forget >= ttl_seconds:
+                self._last_forget = now
+                for scope in [scope for scope, at in self._bumped_at.items() if at <= now - ttl_seconds]:
+                    del self._versions[scope]
+                    del self._bumped_at[scope]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        entries = self._entries.stats()
+        return {
+            'size': entries['size'],
+            'maxsize': entries['maxsize'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stale': self.stale,
+            'evictions': entries['evictions'],
+            'expirations': entries['expirations']
+        }
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Versioned cache stored in a SQLite file so several local worker processes
+    share entries, and a booking in one process invalidates the others.
+    Values are pickled; only point it at a file the workers own. Versions
+    last bumped over ttl_seconds ago are pruned with the expired entries.
+    """
+
+    def __init__(self, path: str, maxsize: int = 10000, ttl_seconds: Optional[float] = 300):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    versions TEXT NOT NULL,
+                    expires_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_versions (
+                    scope TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    bumped_at REAL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_versions)")}
+            if 'bumped_at' not in columns:
+                # A cache file from before versions were pruned: age its versions from now
+                conn.execute("ALTER TABLE cache_versions ADD COLUMN bumped_at REAL")
+                conn.execute("UPDATE cache_versions SET bumped_at = ?", (time.time(),))
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(value: Tuple) -> str:
+        return repr(value)
+
+    def versions(self, scopes: Sequence[Tuple]) -> Tuple[int, ...]:
+        encoded = [self._encode(scope) for scope in scopes]
+        placeholders = ','.join('?' * len(encoded))
+        rows = dict(self._connection().execute(
+            f"SELECT scope, version FROM cache_versions WHERE scope IN ({placeholders})",
+            encoded
+        ).fetchall())
+        return tuple(rows.get(scope, 0) for scope in encoded)
+
+    def get(self, key: Tuple, scopes: Sequence[Tuple]) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value, versions FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self._encode(key), time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        if row[1] != self._encode(self.versions(scopes)):
+            self.misses += 1
+            self.stale += 1
+            return None
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key: Tuple, value: Any, versions: Tuple[int, ...]):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds is not None else None
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, versions, expires_at) VALUES (?, ?, ?, ?)",
+            (self._encode(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._encode(versions), expires_at)
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Drop expired entries and the versions they could depend on, then the entries closest to expiry beyond maxsize"""
+        now = time.time()
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM cache_versions WHERE bumped_at <= ?", (now - self.ttl_seconds,))
+        cursor = conn.execute("""
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries ORDER BY expires_at
+                LIMIT max((SELECT COUNT(*) FROM cache_entries) - ?, 0)
+            )
+        """, (self.maxsize,))
+        self.evictions += cursor.rowcount
+
+    def bump(self, scopes: Sequence[Tuple]):
+        conn = self._connection()
+        conn.executemany(
+            "INSERT INTO cache_versions (scope, version, bumped_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(scope) DO UPDATE SET version = version + 1, bumped_at = excluded.bumped_at",
+            [(self._encode(scope), time.time()) for scope in scopes]
+        )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        size = self._connection().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stale': self.stale,
+            'evictions': self.evictions
+        }
+
+_engine_aliases: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def share_engine_state(engine, canonical):
+    """
+    Make engine use the cache backend and schedule index of canonical, e.g.
+    the asyncio engine of the same database as the synchronous one, so an
+    invalidation through either reaches readers on both.
+    """
+    _engine_aliases[engine] = canonical
+
+def engine_key(bind):
+    """The engine whose process-wide cache backend and schedule index a bind uses"""
+    engine = getattr(bind, 'engine', bind)
+    return _engine_aliases.get(engine, engine) if engine is not None else None
+
+_default_backends: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_unbound_backends: Dict[Optional[str], CacheBackend] = {}
+_default_backends_lock = threading.Lock()
+
+def get_cache_backend(maxsize: int = 1024, ttl_seconds: Optional[float] = 300, bind=None) -> CacheBackend:
+    """
+    The process-wide cache backend configured by AVAILABILITY_CACHE_PATH
+    (in-memory when unset). Every AvailabilityService of a process using the
+    same engine shares it, so an invalidation by one is seen by all. The
+    first caller's maxsize and ttl_seconds apply.
+    """
+    path = os.getenv('AVAILABILITY_CACHE_PATH') or None
+    engine = engine_key(bind)
+    with _default_backends_lock:
+        backends = _default_backends.setdefault(engine, {}) if engine is not None else _unbound_backends
+        backend = backends.get(path)
+        if backend is None:
+            if path:
+                backend = SQLiteCacheBackend(path, maxsize, ttl_seconds)
+            else:
+                backend = MemoryCacheBackend(maxsize, ttl_seconds)
+            backends[path] = backend
+        return backend
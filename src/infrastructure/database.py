@@ -1,114 +1,420 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from src.core.models import Base
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from src.core.models import Base, Booking
+from src.infrastructure.archiver import ARCHIVED_COLUMNS, ArchiveReport, BookingArchiver
+from src.infrastructure.booking_constraints import install_booking_constraints
+from src.infrastructure.cache import share_engine_state
+from src.infrastructure.partitioning import create_partitioned_bookings, ensure_partitions, is_partitioned
+from src.infrastructure.replicas import ReplicaRouter, RoutingSession
+import asyncio
 import os
+import queue
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import schedule
-import time
 import threading
 
 load_dotenv()
 
-def init_db():
-    """Initialize the database connection and create tables"""
-    database_url = os.getenv('DATABASE_URL', 'sqlite:///appointments.db')
-    engine = create_engine(database_url)
+_engine = None
+_session_factory = None
+_scoped_session = None
+_writer = None
+_router = None
+_async_engine = None
+_async_session_factory = None
+_engine_lock = threading.RLock()
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _engine_options(database_url: str) -> dict:
+    """Connection pool settings, overridable with DB_POOL_* environment variables"""
+    options = {
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    url = make_url(database_url)
+    # In-memory SQLite uses one connection per thread; there is no pool to size
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    options.update(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    )
+    return options
+
+def _is_sqlite_file(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def apply_sqlite_profile(
+    engine: Engine,
+    mmap_size: Optional[int] = None,
+    cache_size_kib: Optional[int] = None,
+    busy_timeout_ms: Optional[int] = None
+) -> Engine:
+    """
+    Tune every new connection of a file-backed SQLite engine: WAL journaling
+    so readers never block the writer (or each other), synchronous=NORMAL
+    (durable at checkpoints, safe with WAL), memory-mapped reads, a larger
+    page cache and a busy timeout instead of failing at once on a lock.
+    Defaults come from SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KIB and
+    SQLITE_BUSY_TIMEOUT_MS.
+    """
+    mmap_size = mmap_size if mmap_size is not None else int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    cache_size_kib = cache_size_kib if cache_size_kib is not None else int(os.getenv('SQLITE_CACHE_SIZE_KIB', 64 * 1024))
+    busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        # A negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size={-int(cache_size_kib)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+    return engine
+
+def _create_engine(database_url: str) -> Engine:
+    engine = create_engine(database_url, **_engine_options(database_url))
+    if _is_sqlite_file(database_url) and os.getenv('SQLITE_PROFILE', 'on').lower() != 'off':
+        apply_sqlite_profile(engine)
+    return engine
+
+def get_engine() -> Engine:
+    """
+    The process-wide engine for DATABASE_URL, created on first use. File-backed
+    SQLite gets apply_sqlite_profile unless SQLITE_PROFILE=off.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(os.getenv('DATABASE_URL', 'sqlite:///appointments.db'))
+    return _engine
+
+def async_database_url(database_url: str) -> str:
+    """The asyncio driver URL for a database URL: aiosqlite for SQLite, asyncpg for PostgreSQL"""
+    url = make_url(database_url)
+    drivers = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+    if url.get_backend_name() in drivers and url.get_driver_name() not in ('aiosqlite', 'asyncpg'):
+        url = url.set(drivername=drivers[url.get_backend_name()])
+    return url.render_as_string(hide_password=False)
+
+def get_async_engine() -> AsyncEngine:
+    """
+    The process-wide asyncio engine, on ASYNC_DATABASE_URL or else the
+    DATABASE_URL database through its async driver. Pool settings and the
+    SQLite profile are the same as get_engine().
+    """
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                database_url = os.getenv('ASYNC_DATABASE_URL') or async_database_url(
+                    os.getenv('DATABASE_URL', 'sqlite:///appointments.db')
+                )
+                engine = create_async_engine(database_url, **_engine_options(database_url))
+                if _is_sqlite_file(database_url) and os.getenv('SQLITE_PROFILE', 'on').lower() != 'off':
+                    apply_sqlite_profile(engine.sync_engine)
+                if not os.getenv('ASYNC_DATABASE_URL'):
+                    # Same database as get_engine(): share its slot cache and
+                    # schedule index so writes through either are seen by both
+                    share_engine_state(engine.sync_engine, get_engine())
+                _async_engine = engine
+    return _async_engine
+
+def get_async_session_factory() -> async_sessionmaker:
+    """
+    The process-wide async_sessionmaker bound to get_async_engine(). Objects
+    are not expired on commit, since reloading them would need an await.
+    """
+    global _async_session_factory
+    if _async_session_factory is None:
+        engine = get_async_engine()
+        with _engine_lock:
+            if _async_session_factory is None:
+                _async_session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    return _async_session_factory
+
+def get_async_session() -> AsyncSession:
+    """Get a new AsyncSession from the shared async engine"""
+    return get_async_session_factory()()
+
+async def dispose_async_engine():
+    """Close the async engine's pooled connections and forget it"""
+    global _async_engine, _async_session_factory
+    engine = _async_engine
+    with _engine_lock:
+        _async_engine = _async_session_factory = None
+    if engine is not None:
+        await engine.dispose()
+
+def get_session_factory() -> sessionmaker:
+    """The process-wide sessionmaker bound to get_engine()"""
+    global _session_factory
+    if _session_factory is None:
+        with _engine_lock:
+            if _session_factory is None:
+                _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory
+
+def get_scoped_session() -> scoped_session:
+    """
+    Thread-local session registry: calling it returns the current thread's
+    session. Call .remove() when a unit of work (e.g. one email) is done.
+    """
+    global _scoped_session
+    if _scoped_session is None:
+        factory = get_session_factory()
+        with _engine_lock:
+            if _scoped_session is None:
+                _scoped_session = scoped_session(factory)
+    return _scoped_session
+
+def get_router() -> ReplicaRouter:
+    """
+    The process-wide ReplicaRouter: get_engine() as the primary and an engine
+    for each comma-separated URL in DATABASE_REPLICA_URLS. Replicas more than
+    DB_REPLICA_MAX_LAG seconds behind (default 5, probed every
+    DB_REPLICA_CHECK_INTERVAL seconds) are skipped.
+    """
+    global _router
+    if _router is None:
+        primary = get_engine()
+        with _engine_lock:
+            if _router is None:
+                urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+                _router = ReplicaRouter(
+                    primary,
+                    [_create_engine(url) for url in urls],
+                    max_lag_seconds=float(os.getenv('DB_REPLICA_MAX_LAG', 5)),
+                    check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 1))
+                )
+    return _router
+
+def get_read_session() -> Session:
+    """
+    A session for read-only work (availability, customer lookups): SELECTs go
+    to a replica when one is current enough, anything else to the primary.
+    Without DATABASE_REPLICA_URLS this is a plain get_session().
+    """
+    router = get_router()
+    if not router.replicas:
+        return get_session()
+    return RoutingSession(router)
+
+class SQLiteWriter:
+    """
+    Serializes writes through one thread with its own session.
+
+    SQLite allows a single writer at a time; concurrent sessions that try to
+    write wait on the lock and can still fail with "database is locked" when
+    a read transaction has to be upgraded. Submitting each unit of work
+    (a callable taking the writer's session) to this queue avoids that: work
+    runs in submission order, is committed when it returns and rolled back
+    when it raises. Return plain data, not ORM objects, from the work.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], max_queue: int = 0):
+        self._session_factory = session_factory
+        self._queue: "queue.Queue" = queue.Queue(max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, work: Callable[[Session], Any]) -> Future:
+        """Queue a unit of work, returning a Future for its result"""
+        if self._closed:
+            raise RuntimeError("SQLiteWriter is closed")
+        future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def run(self, work: Callable[[Session], Any], timeout: Optional[float] = None) -> Any:
+        """Queue a unit of work and wait for its result (re-raising its exception)"""
+        return self.submit(work).result(timeout)
+
+    def is_writer_thread(self) -> bool:
+        """Whether the caller is the writer's own thread, i.e. work already being run"""
+        return threading.current_thread() is self._thread
+
+    def _run(self):
+        session = self._session_factory()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                work, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = work(session)
+                    session.commit()
+                except BaseException as e:
+                    session.rollback()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            session.close()
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish the queued work and stop the thread"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+def get_writer() -> SQLiteWriter:
+    """The process-wide write queue on get_engine()"""
+    global _writer
+    if _writer is None:
+        factory = get_session_factory()
+        with _engine_lock:
+            if _writer is None:
+                _writer = SQLiteWriter(factory)
+    return _writer
+
+def get_writer_for(session: Session) -> Optional[SQLiteWriter]:
+    """
+    The write queue for writes made with `session`: get_writer() when the
+    session is bound to the process-wide engine and that is a file-backed
+    SQLite database, unless SQLITE_WRITER=off; otherwise None (PostgreSQL
+    handles concurrent writers itself, and other engines are the caller's).
+    """
+    engine = _engine
+    if engine is None or session.get_bind() is not engine or not _is_sqlite_file(engine.url):
+        return None
+    if os.getenv('SQLITE_WRITER', 'on').lower() == 'off':
+        return None
+    return get_writer()
+
+def _dispose_async_engine_now(engine: AsyncEngine):
+    """Close the async engine's connections from synchronous code"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        try:
+            asyncio.run(engine.dispose())
+            return
+        except Exception:
+            pass  # connections tied to an event loop that is gone
+    # A running loop cannot be waited on here: drop the pool without closing
+    engine.sync_engine.dispose(close=False)
+
+def dispose_engine():
+    """
+    Close pooled connections and forget the engines (the async one included),
+    e.g. after forking or to pick up new settings. In a coroutine, prefer
+    awaiting dispose_async_engine() first.
+    """
+    global _engine, _session_factory, _scoped_session, _writer, _router, _async_engine, _async_session_factory
+    with _engine_lock:
+        if _writer is not None:
+            _writer.close()
+        if _router is not None:
+            _router.dispose()
+        if _scoped_session is not None:
+            _scoped_session.remove()
+        if _async_engine is not None:
+            _dispose_async_engine_now(_async_engine)
+        if _engine is not None:
+            _engine.dispose()
+        _engine = _session_factory = _scoped_session = _writer = _router = None
+        _async_engine = _async_session_factory = None
+
+def upgrade_tables(connection):
+    """
+    Add model columns (nullable ones only) and indexes missing from existing
+    tables, as create_all never alters a table; e.g. bookings.end_time on a
+    database created before it existed.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def detach_historical_bookings(connection):
+    """
+    Move the rows of the historical_bookings table (which INHERITS bookings,
+    so every bookings query scanned it) created by earlier versions into
+    archived_bookings, and stop it inheriting. The emptied table is kept.
+    """
+    if not inspect(connection).has_table('historical_bookings'):
+        return
+    columns = ', '.join(ARCHIVED_COLUMNS)
+    connection.execute(text(f"""
+        INSERT INTO archived_bookings ({columns})
+        SELECT {columns} FROM ONLY historical_bookings
+        ON CONFLICT (id) DO NOTHING
+    """))
+    connection.execute(text("DELETE FROM ONLY historical_bookings"))
+    connection.execute(text("""
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'historical_bookings'::regclass) THEN
+                ALTER TABLE historical_bookings NO INHERIT bookings;
+            END IF;
+        END $$
+    """))
+
+def init_db(partition_bookings: Optional[bool] = None):
+    """
+    Create the schema (and the booking constraints). This is the explicit
+    bootstrap step: run it once at deploy or startup, not per session.
+
+    On PostgreSQL, partition_bookings (default: BOOKINGS_PARTITIONING=monthly)
+    creates a new bookings table partitioned by month (see partitioning) with
+    the partitions of the next BOOKINGS_PARTITION_MONTHS_AHEAD (12) months.
+    """
+    engine = get_engine()
+    if partition_bookings is None:
+        partition_bookings = os.getenv('BOOKINGS_PARTITIONING', '').lower() == 'monthly'
+    partition_bookings = partition_bookings and engine.dialect.name == 'postgresql'
     
     # Create tables
+    if partition_bookings:
+        Base.metadata.create_all(engine, tables=[
+            table for table in Base.metadata.sorted_tables if table is not Booking.__table__
+        ])
+        with engine.begin() as conn:
+            create_partitioned_bookings(conn)
     Base.metadata.create_all(engine)
-    
-    # Set up partitioning for bookings if using PostgreSQL
-    if 'postgresql' in database_url:
-        with engine.connect() as conn:
-            # Create partitioned table for historical bookings
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS historical_bookings (
-                    LIKE bookings INCLUDING ALL
-                ) INHERITS (bookings);
-            """))
-            
-            # Create indexes on the partitioned table
-            conn.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_historical_booking_appointment 
-                ON historical_bookings (appointment_time);
-                
-                CREATE INDEX IF NOT EXISTS idx_historical_booking_status 
-                ON historical_bookings (status);
-            """))
-            
-            # Create function to move old bookings to historical table
-            conn.execute(text("""
-                CREATE OR REPLACE FUNCTION move_old_bookings()
-                RETURNS void AS $$
-                BEGIN
-                    -- Use a transaction to ensure atomicity
-                    BEGIN
-                        -- Move old bookings to historical table
-                        INSERT INTO historical_bookings 
-                        SELECT * FROM bookings 
-                        WHERE appointment_time < NOW() - INTERVAL '3 months'
-                        AND status IN ('completed', 'cancelled');
-                        
-                        -- Delete moved bookings from main table
-                        DELETE FROM bookings 
-                        WHERE appointment_time < NOW() - INTERVAL '3 months'
-                        AND status IN ('completed', 'cancelled');
-                        
-                        -- Log the operation
-                        INSERT INTO archive_log (operation_date, records_moved)
-                        SELECT NOW(), COUNT(*)
-                        FROM historical_bookings
-                        WHERE created_at >= NOW() - INTERVAL '1 day';
-                    EXCEPTION
-                        WHEN OTHERS THEN
-                            -- Log the error
-                            INSERT INTO archive_log (operation_date, error_message)
-                            VALUES (NOW(), SQLERRM);
-                            RAISE;
-                    END;
-                END;
-                $$ LANGUAGE plpgsql;
-            """))
-            
-            # Create archive log table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS archive_log (
-                    id SERIAL PRIMARY KEY,
-                    operation_date TIMESTAMP NOT NULL,
-                    records_moved INTEGER,
-                    error_message TEXT,
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_archive_log_date 
-                ON archive_log (operation_date);
-            """))
+    # New bookings tables get these with the table; existing ones here
+    with engine.begin() as conn:
+        upgrade_tables(conn)
+        install_booking_constraints(conn)
+        if conn.dialect.name == 'postgresql':
+            detach_historical_bookings(conn)
+        if is_partitioned(conn):
+            ensure_partitions(conn, int(os.getenv('BOOKINGS_PARTITION_MONTHS_AHEAD', '12')))
     
     return engine
 
-def get_session():
-    """Get a new database session"""
-    engine = init_db()
-    Session = sessionmaker(bind=engine)
-    return Session()
-
-def archive_old_bookings(session):
-    """Manually trigger archiving of old bookings"""
-    if 'postgresql' in os.getenv('DATABASE_URL', ''):
-        session.execute(text("SELECT move_old_bookings();"))
-        session.commit()
-
-def start_archive_scheduler():
-    """Start the background scheduler for archiving old bookings"""
-    def run_scheduler():
-        schedule.every().day.at("02:00").do(lambda: archive_old_bookings(get_session()))
-        
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-    
-    # Start scheduler in a background thread
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    return scheduler_thread 
\ No newline at end of file
+def get_session() -> Session:
+    """Get a new database session from the shared engine (does not create the schema, see init_db)"""
+    return get_session_factory()()
+
+def archive_old_bookings(session, **options) -> ArchiveReport:
+    """Move completed and cancelled bookings older than three months to archived_bookings (see BookingArchiver)"""
+    return BookingArchiver(session, **options).run()
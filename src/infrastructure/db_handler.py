@@ -1,14 +1,17 @@
 from sqlalchemy.orm import Session
 from src.core.models import Customer, Employee, Service, Booking, EmployeeSchedule
 from datetime import datetime, date
+from typing import Optional
 
 class DBHandler:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, read_session: Optional[Session] = None):
         self.session = session
+        # Lookups may use a replica-routed session (see get_read_session); writes use session
+        self.read_session = read_session or session
 
     def get_customer_info(self, email: str) -> tuple:
         """Get customer information by email"""
-        customer = self.session.query(Customer).filter_by(email=email).first()
+        customer = self.read_session.query(Customer).filter_by(email=email).first()
         if customer:
             return (
                 f"{customer.first_name} {customer.last_name}",
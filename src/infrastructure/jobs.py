@@ -0,0 +1,316 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Union
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from src.core.models import JobLease
+from src.infrastructure.replicas import HEARTBEAT_OPTION
+
+# Lease writes change nothing readers see, so replica routing ignores them
+LEASE_WRITE = {HEARTBEAT_OPTION: True}
+
+class IntervalSchedule:
+    """Every `seconds`, counted from the end of the previous check"""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("An interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+class CronSchedule:
+    """
+    A five-field cron expression: minute, hour, day of month, month and day of
+    week (0 or 7 is Sunday). Fields take *, numbers, ranges a-b, lists and
+    /step. As in cron, when both day fields are restricted either may match.
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have five fields")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(text, low, high) for text, (low, high) in zip(fields, self._RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day, self._any_weekday = fields[2] == '*', fields[4] == '*'
+
+    @staticmethod
+    def _parse(text: str, low: int, high: int) -> set:
+        values = set()
+        for part in text.split(','):
+            part, _, step = part.partition('/')
+            if part == '*':
+                first, last = low, high
+            elif '-' in part:
+                first, last = (int(value) for value in part.split('-'))
+            else:
+                first = last = int(part)
+                if step:
+                    last = high
+            if not low <= first <= last <= high:
+                raise ValueError(f"Cron field '{text}' is outside {low}-{high}")
+            values.update(range(first, last + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_month = day.day in self.days
+        on_weekday = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and on_weekday
+        return in_month or on_weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute after moment"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+def as_schedule(schedule: Union[str, float, timedelta, IntervalSchedule, CronSchedule]):
+    """A schedule from a cron expression, a number of seconds or a timedelta"""
+    if isinstance(schedule, str):
+        return CronSchedule(schedule)
+    if isinstance(schedule, timedelta):
+        return IntervalSchedule(schedule.total_seconds())
+    if isinstance(schedule, (int, float)):
+        return IntervalSchedule(schedule)
+    return schedule
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], object]
+    schedule: object
+    lease_seconds: Optional[float] = None
+    exclusive: bool = True
+    next_run: Optional[datetime] = None
+    running: bool = False
+    # Metrics
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    last_started: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+    last_error: Optional[str] = None
+    last_result: object = field(default=None, repr=False)
+
+    def metrics(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_started': self.last_started,
+            'last_duration': self.last_duration,
+            'mean_duration': self.total_duration / self.runs if self.runs else None,
+            'max_duration': self.max_duration,
+            'last_error': self.last_error,
+            'next_run': self.next_run
+        }
+
+class JobScheduler:
+    """
+    Runs named jobs on interval or cron schedules in a small thread pool.
+
+    A job never overlaps itself: a run is skipped while the previous one is
+    still going. With a session_factory, a run of an exclusive job also needs
+    the job's lease in job_leases, so of several workers sharing the database
+    only one runs it; a lease lasts lease_seconds (at least the longest
+    expected run) and is released when the run ends. stop() lets running
+    jobs finish.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        worker_id: Optional[str] = None,
+        max_workers: int = 4,
+        poll_seconds: float = 1.0,
+        default_lease_seconds: float = 3600.0,
+        now: Callable[[], datetime] = datetime.now,
+        clock: Callable[[], float] = time.time
+    ):
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_seconds = poll_seconds
+        self.default_lease_seconds = default_lease_seconds
+        self._now = now
+        self._clock = clock
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._futures = set()
+        self._thread = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], object],
+        schedule,
+        lease_seconds: Optional[float] = None,
+        exclusive: bool = True,
+        run_immediately: bool = False
+    ) -> Job:
+        """
+        Register func under name, first run at the schedule's next time (or at
+        once). Jobs that are not exclusive run on every worker.
+        """
+        if name in self._jobs:
+            raise ValueError(f"Job '{name}' is already registered")
+        job = Job(name, func, as_schedule(schedule), lease_seconds, exclusive)
+        now = self._now()
+        job.next_run = now if run_immediately else job.schedule.next_after(now)
+        self._jobs[name] = job
+        return job
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: job.metrics() for name, job in self._jobs.items()}
+
+    def _acquire_lease(self, job: Job) -> bool:
+        if self.session_factory is None or not job.exclusive:
+            return True
+        now = self._clock()
+        expires_at = now + (job.lease_seconds or self.default_lease_seconds)
+        session = self.session_factory()
+        try:
+            taken = session.execute(update(JobLease).where(
+                JobLease.name == job.name,
+                (JobLease.expires_at <= now) | (JobLease.owner == self.worker_id)
+            ).values(owner=self.worker_id, expires_at=expires_at), execution_options=LEASE_WRITE).rowcount
+            if not taken:
+                session.execute(insert(JobLease).values(
+                    name=job.name, owner=self.worker_id, expires_at=expires_at
+                ), execution_options=LEASE_WRITE)
+            session.commit()
+            return True
+        except IntegrityError:
+            # Another worker holds the lease
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def _release_lease(self, job: Job):
+        if self.session_factory is None or not job.exclusive:
+            return
+        session = self.session_factory()
+        try:
+            session.execute(update(JobLease).where(
+                JobLease.name == job.name, JobLease.owner == self.worker_id
+            ).values(expires_at=0), execution_options=LEASE_WRITE)
+            session.commit()
+        finally:
+            session.close()
+
+    def _run(self, job: Job):
+        try:
+            if not self._acquire_lease(job):
+                with self._lock:
+                    job.skipped += 1
+                return
+            started, error, result = time.perf_counter(), None, None
+            with self._lock:
+                job.last_started = self._now()
+            try:
+                result = job.func()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                self._release_lease(job)
+            duration = time.perf_counter() - started
+            with self._lock:
+                job.runs += 1
+                job.last_duration = duration
+                job.total_duration += duration
+                job.max_duration = max(job.max_duration, duration)
+                job.last_error = error
+                job.last_result = result
+                if error:
+                    job.failures += 1
+        except Exception as e:
+            # The lease table could not be reached; try again next time
+            with self._lock:
+                job.failures += 1
+                job.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                job.running = False
+
+    def run_pending(self) -> List[str]:
+        """Start the jobs that are due and not running. Returns their names."""
+        now = self._now()
+        started = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.next_run > now:
+                    continue
+                job.next_run = job.schedule.next_after(now)
+                if job.running:
+                    job.skipped += 1
+                    continue
+                job.running = True
+                started.append(job)
+        for job in started:
+            future = self._executor.submit(self._run, job)
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+        return [job.name for job in started]
+
+    def run_job(self, name: str):
+        """Run a job now in the calling thread (unless it is running), returning its metrics"""
+        job = self._jobs[name]
+        with self._lock:
+            if job.running:
+                job.skipped += 1
+                return job.metrics()
+            job.running = True
+        self._run(job)
+        return job.metrics()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            self.run_pending()
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self) -> threading.Thread:
+        """Check for due jobs every poll_seconds in a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop starting jobs and wait up to timeout seconds (forever when None)
+        for running ones. Returns whether they all finished.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        _, pending = wait(list(self._futures), timeout)
+        self._executor.shutdown(wait=False)
+        return not pending
@@ -0,0 +1,208 @@
+"""
+Opt-in PostgreSQL layout in which bookings is range-partitioned by month of
+appointment_time (BOOKINGS_PARTITIONING=monthly, see init_db).
+
+A day's availability query then reads one small partition through partition
+pruning, and old months leave the table with DETACH PARTITION instead of
+row-by-row deletes. Compared with the plain table:
+
+- the primary key is (id, appointment_time), as every unique index of a
+  partitioned table must include the partition key;
+- idempotency keys are kept unique through the booking_idempotency_keys
+  table, maintained by triggers, instead of a unique index;
+- the overlap exclusion constraint exists per partition, so two bookings
+  of different months overlapping across midnight at a month's end are not
+  rejected by the database (BookingService still checks them);
+- bookings of a month without its partition go to the DEFAULT partition,
+  and move to the month's partition when ensure_partitions creates it.
+"""
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from src.core.models import Booking
+
+PARTITION_PREFIX = 'bookings_p'
+DEFAULT_PARTITION = 'bookings_default'
+
+IDEMPOTENCY_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS booking_idempotency_keys (
+        idempotency_key VARCHAR(255) PRIMARY KEY
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bookings_track_idempotency_key() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.idempotency_key IS NOT NULL THEN
+            DELETE FROM booking_idempotency_keys WHERE idempotency_key = OLD.idempotency_key;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.idempotency_key IS NOT NULL THEN
+            INSERT INTO booking_idempotency_keys (idempotency_key) VALUES (NEW.idempotency_key);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS bookings_idempotency_key ON bookings",
+    """
+    CREATE TRIGGER bookings_idempotency_key AFTER INSERT OR DELETE OR UPDATE OF idempotency_key ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_track_idempotency_key()
+    """,
+]
+
+def is_partitioned(connection) -> bool:
+    """Whether bookings is a partitioned table"""
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('bookings')"
+    )).scalar() is True
+
+def partitioned_bookings_table() -> Table:
+    """
+    The bookings table as partitioned: the model's table, with its foreign
+    keys and indexes, keyed by (id, appointment_time) and partitioned by
+    range of appointment_time. It lives in a copy of the model's metadata.
+    """
+    metadata = MetaData()
+    for table in Booking.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    table = metadata.tables[Booking.__tablename__]
+    table.c.appointment_time.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.appointment_time))
+    table.c.id.autoincrement = True
+    table.dialect_kwargs['postgresql_partition_by'] = 'RANGE (appointment_time)'
+    for index in table.indexes:
+        if index.unique and table.c.appointment_time not in index.columns.values():
+            # Unique across partitions through booking_idempotency_keys instead
+            index.unique = False
+    return table
+
+def create_partitioned_bookings(connection):
+    """
+    Create bookings as a partitioned table (see partitioned_bookings_table)
+    with its DEFAULT partition. Call before create_all, once the tables it
+    references exist; an existing bookings table is left alone.
+    """
+    if inspect(connection).has_table('bookings'):
+        return
+    table = partitioned_bookings_table()
+    connection.execute(CreateTable(table))
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+    for statement in IDEMPOTENCY_STATEMENTS:
+        connection.execute(text(statement))
+    ensure_default_partition(connection)
+
+def _add_overlap_constraint(connection, name: str, suffix: str):
+    # Named so is_overlap_error recognises it
+    connection.execute(text(f"""
+        ALTER TABLE {name} ADD CONSTRAINT bookings_no_overlap_{suffix} EXCLUDE USING gist (
+            employee_id WITH =, tsrange(appointment_time, end_time) WITH &&
+        ) WHERE (status = 'confirmed')
+    """))
+
+def ensure_default_partition(connection) -> bool:
+    """
+    Create the DEFAULT partition, which takes bookings of months without a
+    partition of their own until ensure_partitions creates it. Returns
+    whether it was created.
+    """
+    if connection.execute(text(f"SELECT to_regclass('{DEFAULT_PARTITION}')")).scalar() is not None:
+        return False
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF bookings DEFAULT"))
+    _add_overlap_constraint(connection, DEFAULT_PARTITION, 'default')
+    return True
+
+def _month(value: date, offset: int = 0) -> date:
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+def list_partitions(connection) -> List[Tuple[str, date]]:
+    """(name, first day of month) of each monthly partition attached to bookings, oldest first"""
+    names = connection.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass('bookings')
+    """)).scalars()
+    partitions = []
+    for name in names:
+        if name.startswith(PARTITION_PREFIX):
+            year, month = name[len(PARTITION_PREFIX):].split('_')
+            partitions.append((name, date(int(year), int(month), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def ensure_partitions(connection, months_ahead: int = 12, start: Optional[date] = None) -> List[str]:
+    """
+    Create the monthly partitions from start's month (default: this month)
+    to months_ahead months later, each with its overlap exclusion
+    constraint, moving their bookings out of the DEFAULT partition (created
+    too if missing). Returns the names created.
+    """
+    ensure_default_partition(connection)
+    first = _month(start or datetime.now().date())
+    existing = {name for name, _ in list_partitions(connection)}
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _month(first, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        bounds = {'start': month, 'end': _month(month, 1)}
+        in_month = "appointment_time >= :start AND appointment_time < :end"
+        # The month's bookings in the DEFAULT partition would block the new
+        # partition; they are taken out and inserted again once it exists
+        moved = connection.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})"
+        ), bounds).scalar()
+        if moved:
+            connection.execute(text(
+                f"CREATE TEMPORARY TABLE bookings_moved AS "
+                f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}"
+            ), bounds)
+            connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds)
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF bookings "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month(month, 1).isoformat()}')"
+        ))
+        _add_overlap_constraint(connection, name, name[len(PARTITION_PREFIX):])
+        if moved:
+            connection.execute(text("INSERT INTO bookings SELECT * FROM bookings_moved"))
+            connection.execute(text("DROP TABLE bookings_moved"))
+        created.append(name)
+    return created
+
+def retire_partitions(connection, keep_months: int, drop: bool = False, today: Optional[date] = None) -> List[str]:
+    """
+    Detach (and with drop, drop) the partitions of months ending more than
+    keep_months months before today's month. Detached tables keep their rows
+    for archiving elsewhere; their idempotency keys are released. Returns the
+    names retired.
+    """
+    cutoff = _month(today or datetime.now().date(), -keep_months)
+    retired = []
+    for name, month in list_partitions(connection):
+        if _month(month, 1) > cutoff:
+            break
+        connection.execute(text(
+            f"DELETE FROM booking_idempotency_keys WHERE idempotency_key IN "
+            f"(SELECT idempotency_key FROM {name} WHERE idempotency_key IS NOT NULL)"
+        ))
+        connection.execute(text(f"ALTER TABLE bookings DETACH PARTITION {name}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+        retired.append(name)
+    return retired
+
+def maintain_partitions(engine, months_ahead: int = 12, keep_months: Optional[int] = None, drop: bool = False):
+    """Periodic maintenance: create the coming months' partitions and retire old ones. Returns (created, retired)."""
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return [], []
+        created = ensure_partitions(conn, months_ahead)
+        retired = retire_partitions(conn, keep_months, drop) if keep_months is not None else []
+    return created, retired
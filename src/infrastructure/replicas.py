@@ -0,0 +1,167 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+from sqlalchemy import event, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from src.core.models import ReplicationHeartbeat
+from src.infrastructure.cache import share_engine_state
+
+HEARTBEAT_OPTION = 'replica_heartbeat'
+
+def postgres_lag(connection, now: float) -> float:
+    # A standby that has replayed everything it received is current even when
+    # the primary has been idle (and the last replayed transaction is old)
+    return connection.execute(text("""
+        SELECT COALESCE(CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END, 0)
+    """)).scalar()
+
+def heartbeat_lag(connection, now: float) -> float:
+    beat_at = connection.execute(
+        select(ReplicationHeartbeat.beat_at).where(ReplicationHeartbeat.id == 1)
+    ).scalar()
+    return float('inf') if beat_at is None else max(0.0, now - beat_at)
+
+def default_lag_probe(engine: Engine) -> Callable:
+    return postgres_lag if engine.dialect.name == 'postgresql' else heartbeat_lag
+
+class ReplicaRouter:
+    """
+    Chooses the engine for read-only queries: a replica that is at most
+    max_lag_seconds behind and has caught up with this process's last write
+    to the primary, or the primary when none qualifies (or a replica fails).
+
+    Replica lag is probed at most every check_interval seconds per replica:
+    on PostgreSQL from the standby's WAL replay position, elsewhere from the
+    age of the heartbeat row (call heartbeat() on a schedule, e.g. every
+    second). Writes are noticed from the primary engine's DML commits.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Sequence[Engine] = (),
+        max_lag_seconds: float = 5.0,
+        check_interval: float = 1.0,
+        lag_probe: Optional[Callable] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self._lag_probe = lag_probe
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._probes: Dict[Engine, tuple] = {}  # replica -> (probed_at, lag)
+        self._next = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._last_write = None
+        self.reads = {'primary': 0, 'replica': 0}
+        for replica in self.replicas:
+            # Cache entries and the schedule index are per database, not per copy
+            share_engine_state(replica, primary)
+        event.listen(primary, 'after_cursor_execute', self._on_execute)
+        event.listen(primary, 'commit', self._on_commit)
+        event.listen(primary, 'rollback', self._on_rollback)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if (context.isinsert or context.isupdate or context.isdelete) and \
+                not context.execution_options.get(HEARTBEAT_OPTION):
+            conn.info['replica_write'] = True
+
+    def _on_commit(self, conn):
+        if conn.info.pop('replica_write', False):
+            self.note_write()
+
+    def _on_rollback(self, conn):
+        conn.info.pop('replica_write', None)
+
+    def note_write(self):
+        """Reads must not go to replicas that have not replayed this moment yet"""
+        with self._lock:
+            self._last_write = self._clock()
+
+    def heartbeat(self):
+        """Record the current time on the primary for heartbeat_lag"""
+        beat = {'id': 1, 'beat_at': self._clock()}
+        with self.primary.connect() as conn:
+            conn = conn.execution_options(**{HEARTBEAT_OPTION: True})
+            if conn.execute(ReplicationHeartbeat.__table__.update().values(beat_at=beat['beat_at'])).rowcount == 0:
+                conn.execute(ReplicationHeartbeat.__table__.insert().values(**beat))
+            conn.commit()
+
+    def _probe(self, replica: Engine) -> tuple:
+        now = self._clock()
+        try:
+            with replica.connect() as conn:
+                lag = (self._lag_probe or default_lag_probe(replica))(conn, now)
+        except Exception:
+            # Unreachable, or without the heartbeat table: use the primary
+            lag = float('inf')
+        return now, lag
+
+    def lag(self, replica: Engine) -> float:
+        """The replica's last probed lag in seconds, probing when the result is old"""
+        return self._state(replica)[1]
+
+    def _state(self, replica: Engine) -> tuple:
+        now = self._clock()
+        with self._lock:
+            probe = self._probes.get(replica)
+            last_write = self._last_write
+        # Re-probe when the result is old, or was taken before the last write
+        if probe is None or now - probe[0] >= self.check_interval or \
+                (last_write is not None and probe[0] < last_write):
+            probe = self._probe(replica)
+            with self._lock:
+                self._probes[replica] = probe
+        return probe
+
+    def _usable(self, replica: Engine) -> bool:
+        probed_at, lag = self._state(replica)
+        if lag > self.max_lag_seconds:
+            return False
+        # The replica reflects the primary as of probed_at - lag
+        return self._last_write is None or probed_at - lag >= self._last_write
+
+    def read_engine(self) -> Engine:
+        """The engine for the next read-only query"""
+        if self.replicas:
+            with self._lock:
+                start = next(self._next)
+            for offset in range(len(self.replicas)):
+                replica = self.replicas[(start + offset) % len(self.replicas)]
+                if self._usable(replica):
+                    self.reads['replica'] += 1
+                    return replica
+        self.reads['primary'] += 1
+        return self.primary
+
+    def dispose(self):
+        event.remove(self.primary, 'after_cursor_execute', self._on_execute)
+        event.remove(self.primary, 'commit', self._on_commit)
+        event.remove(self.primary, 'rollback', self._on_rollback)
+        for replica in self.replicas:
+            replica.dispose()
+
+class RoutingSession(Session):
+    """
+    Session sending SELECTs to router.read_engine() and everything else
+    (flushes, UPDATE/DELETE statements, text(), connection()) to the primary.
+    Use it for read-mostly code; code that validates and then writes, like
+    BookingService, should use a plain session on the primary.
+    """
+
+    def __init__(self, router: ReplicaRouter, **kwargs):
+        super().__init__(bind=router.primary, **kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or not isinstance(clause, Select):
+            return self.router.primary
+        return self.router.read_engine()
@@ -1,41 +1,113 @@
-from datetime import datetime
-from typing import List, Dict, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Sequence, Tuple
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.core.models import EmployeeSchedule, Booking
-from src.core.interfaces import ScheduleRepository, BookingRepository
+from src.core.models import Employee, EmployeeSchedule, Booking, Service
+from src.core.interfaces import (
+    ScheduleRepository, BookingRepository, AsyncScheduleRepository, AsyncBookingRepository
+)
+from src.core.values import BookingSpan
+from src.infrastructure.schedule_index import ScheduleIndex, effective_schedules
+
+def _day_bounds(date) -> Tuple[datetime, datetime]:
+    return datetime.combine(date, datetime.min.time()), datetime.combine(date, datetime.max.time())
 
 class SQLAlchemyScheduleRepository(ScheduleRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, index: Optional[ScheduleIndex] = None):
         self.session = session
+        # Optional in-memory index answering date-bounded lookups without SQL
+        self.index = index
+
+    @staticmethod
+    def _select_schedules():
+        # Only the columns the dicts need, as plain rows rather than ORM
+        # entities, with the employee name joined in the same statement
+        return select(
+            EmployeeSchedule.id,
+            EmployeeSchedule.employee_id,
+            Employee.first_name,
+            Employee.last_name,
+            EmployeeSchedule.start_time,
+            EmployeeSchedule.end_time,
+            EmployeeSchedule.day_of_week,
+            EmployeeSchedule.start_date,
+            EmployeeSchedule.end_date
+        ).join(Employee, EmployeeSchedule.employee_id == Employee.id)
+
+    @staticmethod
+    def _to_dict(row) -> Dict:
+        return {
+            'id': row.id,
+            'employee_id': row.employee_id,
+            'employee_name': f"{row.first_name} {row.last_name}",
+            'start_time': row.start_time,
+            'end_time': row.end_time,
+            'day_of_week': row.day_of_week,
+            'start_date': row.start_date,
+            'end_date': row.end_date
+        }
+
+    def _fetch(self, statement) -> List[Dict]:
+        return [self._to_dict(row) for row in self.session.execute(statement)]
+
+    def get_all_schedules(self) -> List[Dict]:
+        return self._fetch(self._select_schedules())
 
-    def get_employee_schedule(self, employee_id: int, day_of_week: int) -> Optional[Dict]:
-        schedule = self.session.query(EmployeeSchedule).filter(
+    def get_employee_schedule(self, employee_id: int, day_of_week: int, on_date: Optional[date] = None) -> Optional[Dict]:
+        if on_date is not None and self.index is not None:
+            schedules = self.index.schedules_on(self.get_all_schedules, on_date, employee_id)
+            return schedules[0] if schedules else None
+
+        statement = self._select_schedules().where(
             EmployeeSchedule.employee_id == employee_id,
             EmployeeSchedule.day_of_week == day_of_week
-        ).first()
+        )
+        if on_date is not None:
+            # Matches idx_schedule_employee_date; the most recent temporary
+            # change wins when several rows are valid
+            statement = statement.where(
+                EmployeeSchedule.start_date <= on_date,
+                EmployeeSchedule.end_date >= on_date
+            ).order_by(EmployeeSchedule.start_date.desc())
+        row = self.session.execute(statement.limit(1)).first()
         
-        if schedule:
-            return {
-                'id': schedule.id,
-                'employee_id': schedule.employee_id,
-                'employee_name': schedule.employee_name,
-                'start_time': schedule.start_time,
-                'end_time': schedule.end_time
-            }
+        if row:
+            return self._to_dict(row)
         return None
 
-    def get_all_schedules_for_day(self, day_of_week: int) -> List[Dict]:
-        schedules = self.session.query(EmployeeSchedule).filter(
+    def get_all_schedules_for_day(self, day_of_week: int, on_date: Optional[date] = None) -> List[Dict]:
+        if on_date is not None and self.index is not None:
+            return self.index.schedules_on(self.get_all_schedules, on_date)
+
+        statement = self._select_schedules().where(
             EmployeeSchedule.day_of_week == day_of_week
-        ).all()
-        
-        return [{
-            'id': schedule.id,
-            'employee_id': schedule.employee_id,
-            'employee_name': schedule.employee_name,
-            'start_time': schedule.start_time,
-            'end_time': schedule.end_time
-        } for schedule in schedules]
+        )
+        if on_date is None:
+            return self._fetch(statement)
+
+        return effective_schedules(self._fetch(statement.where(
+            EmployeeSchedule.start_date <= on_date,
+            EmployeeSchedule.end_date >= on_date
+        )), on_date)
+
+    def get_schedules_in_range(
+        self,
+        start_date: date,
+        end_date: date,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        if self.index is not None:
+            return self.index.schedules_in_range(self.get_all_schedules, start_date, end_date, employee_ids)
+
+        statement = self._select_schedules().where(
+            EmployeeSchedule.start_date <= end_date,
+            EmployeeSchedule.end_date >= start_date
+        )
+        if employee_ids:
+            statement = statement.where(EmployeeSchedule.employee_id.in_(employee_ids))
+
+        return self._fetch(statement.order_by(EmployeeSchedule.employee_id, EmployeeSchedule.start_date))
 
 class SQLAlchemyBookingRepository(BookingRepository):
     def __init__(self, session: Session):
@@ -62,19 +134,250 @@ class SQLAlchemyBookingRepository(BookingRepository):
             'status': booking.status
         }
 
+    @staticmethod
+    def _select_bookings(start: datetime, end: datetime, *columns):
+        # Confirmed bookings in the range as plain rows of the given columns;
+        # joining the service duration here means callers never have to look
+        # up the Service of each booking
+        return select(*columns).select_from(Booking).outerjoin(
+            Service, Booking.service_id == Service.id
+        ).where(
+            Booking.appointment_time >= start,
+            Booking.appointment_time <= end,
+            Booking.status == 'confirmed'
+        )
+
+    def _fetch(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        statement = self._select_bookings(
+            start, end,
+            Booking.id, Booking.employee_id, Booking.service_id, Booking.appointment_time, Service.duration_minutes
+        )
+        if employee_ids:
+            statement = statement.where(Booking.employee_id.in_(employee_ids))
+        statement = statement.order_by(Booking.employee_id, Booking.appointment_time)
+        return [self._to_dict(row) for row in self.session.execute(statement)]
+
+    @staticmethod
+    def _to_dict(row) -> Dict:
+        return {
+            'id': row.id,
+            'employee_id': row.employee_id,
+            'service_id': row.service_id,
+            'appointment_time': row.appointment_time,
+            'duration_minutes': row.duration_minutes,
+            'end_time': (
+                row.appointment_time + timedelta(minutes=row.duration_minutes)
+                if row.duration_minutes is not None else None
+            )
+        }
+
     def get_bookings_for_employee(self, employee_id: int, date: datetime) -> List[Dict]:
-        start_of_day = datetime.combine(date, datetime.min.time())
-        end_of_day = datetime.combine(date, datetime.max.time())
-        
-        bookings = self.session.query(Booking).filter(
+        return self._fetch(*_day_bounds(date), [employee_id])
+
+    def get_bookings_for_day(self, date: datetime) -> List[Dict]:
+        return self._fetch(*_day_bounds(date))
+
+    def get_bookings_in_range(
+        self,
+        start: datetime,
+        end: datetime,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        return self._fetch(start, end, employee_ids)
+
+    def get_booking_spans(
+        self,
+        start: datetime,
+        end: datetime,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[BookingSpan]:
+        """Confirmed bookings in the range as compact spans, for availability computation"""
+        # Only the three columns a span needs; bookings without a service
+        # have no known end and are skipped
+        statement = self._select_bookings(
+            start, end, Booking.employee_id, Booking.appointment_time, Service.duration_minutes
+        ).where(Service.id.is_not(None))
+        if employee_ids:
+            statement = statement.where(Booking.employee_id.in_(employee_ids))
+        rows = self.session.execute(statement.order_by(Booking.employee_id, Booking.appointment_time))
+
+        return [BookingSpan.from_row(*row) for row in rows]
+
+    @staticmethod
+    def _select_overlapping(employee_id: int, start: datetime, end: datetime, earliest_start: Optional[datetime]):
+        # One seek on idx_booking_employee_date: the employee's bookings
+        # starting before end (and no earlier than earliest_start, the start
+        # of the longest booking that could still reach start)
+        statement = select(Booking.id).where(
             Booking.employee_id == employee_id,
-            Booking.appointment_time >= start_of_day,
-            Booking.appointment_time <= end_of_day,
-            Booking.status == 'confirmed'
-        ).all()
-        
-        return [{
+            Booking.appointment_time < end,
+            Booking.status == 'confirmed',
+            # end_time is kept by the booking constraints; a row without it
+            # counts as overlapping
+            or_(Booking.end_time.is_(None), Booking.end_time > start)
+        )
+        if earliest_start is not None:
+            statement = statement.where(Booking.appointment_time >= earliest_start)
+        return statement.limit(1)
+
+    def has_overlapping_booking(
+        self,
+        employee_id: int,
+        start: datetime,
+        end: datetime,
+        earliest_start: Optional[datetime] = None
+    ) -> bool:
+        """Whether a confirmed booking of the employee overlaps [start, end)"""
+        return self.session.execute(
+            self._select_overlapping(employee_id, start, end, earliest_start)
+        ).first() is not None
+
+class AsyncSQLAlchemyScheduleRepository(AsyncScheduleRepository):
+    """
+    SQLAlchemyScheduleRepository on an AsyncSession (aiosqlite, asyncpg).
+    The statements and row conversion are shared with the synchronous class.
+    """
+
+    def __init__(self, session: AsyncSession, index: Optional[ScheduleIndex] = None):
+        self.session = session
+        self.index = index
+
+    async def _fetch(self, statement) -> List[Dict]:
+        result = await self.session.execute(statement)
+        return [SQLAlchemyScheduleRepository._to_dict(row) for row in result]
+
+    async def get_all_schedules(self) -> List[Dict]:
+        return await self._fetch(SQLAlchemyScheduleRepository._select_schedules())
+
+    async def _snapshot(self):
+        # The index loader is synchronous, so a stale index is reloaded here
+        # with an awaited query and handed the rows
+        return self.index.snapshot() or self.index.load(await self.get_all_schedules())
+
+    async def get_employee_schedule(self, employee_id: int, day_of_week: int, on_date: Optional[date] = None) -> Optional[Dict]:
+        if on_date is not None and self.index is not None:
+            schedules = ScheduleIndex.snapshot_schedules_on(await self._snapshot(), on_date, employee_id)
+            return schedules[0] if schedules else None
+
+        statement = SQLAlchemyScheduleRepository._select_schedules().where(
+            EmployeeSchedule.employee_id == employee_id,
+            EmployeeSchedule.day_of_week == day_of_week
+        )
+        if on_date is not None:
+            statement = statement.where(
+                EmployeeSchedule.start_date <= on_date,
+                EmployeeSchedule.end_date >= on_date
+            ).order_by(EmployeeSchedule.start_date.desc())
+        row = (await self.session.execute(statement.limit(1))).first()
+        return SQLAlchemyScheduleRepository._to_dict(row) if row else None
+
+    async def get_all_schedules_for_day(self, day_of_week: int, on_date: Optional[date] = None) -> List[Dict]:
+        if on_date is not None and self.index is not None:
+            return ScheduleIndex.snapshot_schedules_on(await self._snapshot(), on_date)
+
+        statement = SQLAlchemyScheduleRepository._select_schedules().where(
+            EmployeeSchedule.day_of_week == day_of_week
+        )
+        if on_date is None:
+            return await self._fetch(statement)
+
+        return effective_schedules(await self._fetch(statement.where(
+            EmployeeSchedule.start_date <= on_date,
+            EmployeeSchedule.end_date >= on_date
+        )), on_date)
+
+    async def get_schedules_in_range(
+        self,
+        start_date: date,
+        end_date: date,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        if self.index is not None:
+            return ScheduleIndex.snapshot_schedules_in_range(await self._snapshot(), start_date, end_date, employee_ids)
+
+        statement = SQLAlchemyScheduleRepository._select_schedules().where(
+            EmployeeSchedule.start_date <= end_date,
+            EmployeeSchedule.end_date >= start_date
+        )
+        if employee_ids:
+            statement = statement.where(EmployeeSchedule.employee_id.in_(employee_ids))
+
+        return await self._fetch(statement.order_by(EmployeeSchedule.employee_id, EmployeeSchedule.start_date))
+
+class AsyncSQLAlchemyBookingRepository(AsyncBookingRepository):
+    """SQLAlchemyBookingRepository on an AsyncSession (aiosqlite, asyncpg)"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add_booking(self, booking_data: Dict) -> Dict:
+        booking = Booking(
+            customer_id=booking_data['customer_id'],
+            employee_id=booking_data['employee_id'],
+            service_id=booking_data['service_id'],
+            schedule_id=booking_data['schedule_id'],
+            appointment_time=booking_data['appointment_time'],
+            notes=booking_data.get('notes')
+        )
+        self.session.add(booking)
+        await self.session.commit()
+
+        return {
             'id': booking.id,
+            'customer_id': booking.customer_id,
+            'employee_id': booking.employee_id,
+            'service_id': booking.service_id,
             'appointment_time': booking.appointment_time,
-            'duration_minutes': booking.duration_minutes
-        } for booking in bookings] 
\ No newline at end of file
+            'status': booking.status
+        }
+
+    async def _fetch(self, start: datetime, end: datetime, employee_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        statement = SQLAlchemyBookingRepository._select_bookings(
+            start, end,
+            Booking.id, Booking.employee_id, Booking.service_id, Booking.appointment_time, Service.duration_minutes
+        )
+        if employee_ids:
+            statement = statement.where(Booking.employee_id.in_(employee_ids))
+        result = await self.session.execute(statement.order_by(Booking.employee_id, Booking.appointment_time))
+        return [SQLAlchemyBookingRepository._to_dict(row) for row in result]
+
+    async def get_bookings_for_employee(self, employee_id: int, date: datetime) -> List[Dict]:
+        return await self._fetch(*_day_bounds(date), [employee_id])
+
+    async def get_bookings_for_day(self, date: datetime) -> List[Dict]:
+        return await self._fetch(*_day_bounds(date))
+
+    async def get_bookings_in_range(
+        self,
+        start: datetime,
+        end: datetime,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        return await self._fetch(start, end, employee_ids)
+
+    async def get_booking_spans(
+        self,
+        start: datetime,
+        end: datetime,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[BookingSpan]:
+        """Confirmed bookings in the range as compact spans, for availability computation"""
+        statement = SQLAlchemyBookingRepository._select_bookings(
+            start, end, Booking.employee_id, Booking.appointment_time, Service.duration_minutes
+        ).where(Service.id.is_not(None))
+        if employee_ids:
+            statement = statement.where(Booking.employee_id.in_(employee_ids))
+        result = await self.session.execute(statement.order_by(Booking.employee_id, Booking.appointment_time))
+        return [BookingSpan.from_row(*row) for row in result]
+
+    async def has_overlapping_booking(
+        self,
+        employee_id: int,
+        start: datetime,
+        end: datetime,
+        earliest_start: Optional[datetime] = None
+    ) -> bool:
+        result = await self.session.execute(
+            SQLAlchemyBookingRepository._select_overlapping(employee_id, start, end, earliest_start)
+        )
+        return result.first() is not None
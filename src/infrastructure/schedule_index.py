@@ -0,0 +1,181 @@
+import threading
+import time
+import weakref
+from bisect import bisect_right
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.core.models import Employee, EmployeeSchedule
+from src.infrastructure.cache import engine_key
+
+def effective_schedules(schedules: List[Dict], day: date) -> List[Dict]:
+    """
+    Schedules in effect on a day, one per employee, ordered by employee.
+    When temporary changes overlap, the row starting most recently wins.
+    """
+    effective = {}
+    for schedule in schedules:
+        if (schedule['day_of_week'] == day.weekday() and
+                schedule['start_date'] <= day <= schedule['end_date']):
+            current = effective.get(schedule['employee_id'])
+            if current is None or schedule['start_date'] >= current['start_date']:
+                effective[schedule['employee_id']] = schedule
+    return [effective[employee_id] for employee_id in sorted(effective)]
+
+class ScheduleIndex:
+    """
+    In-memory per-day-of-week index of every employee schedule row.
+
+    Schedule lookups are answered without SQL. The index is reloaded (one
+    query) after schedule or employee rows change in this process, and after
+    ttl_seconds so changes made by other processes are picked up.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = 300, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._by_weekday: Optional[Dict[int, List[Dict]]] = None
+        self._start_dates: Dict[int, List[date]] = {}
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def mark_stale(self):
+        with self._lock:
+            self._by_weekday = None
+
+    def _build(self, rows: List[Dict]) -> Tuple[Dict[int, List[Dict]], Dict[int, List[date]]]:
+        by_weekday = {day_of_week: [] for day_of_week in range(7)}
+        for schedule in sorted(rows, key=lambda s: s['start_date']):
+            by_weekday[schedule['day_of_week']].append(schedule)
+        self._start_dates = {
+            day_of_week: [schedule['start_date'] for schedule in day_rows]
+            for day_of_week, day_rows in by_weekday.items()
+        }
+        self._by_weekday = by_weekday
+        self._loaded_at = self._clock()
+        self.loads += 1
+        return self._by_weekday, self._start_dates
+
+    def _current(self) -> Optional[Tuple[Dict[int, List[Dict]], Dict[int, List[date]]]]:
+        expired = self.ttl_seconds is not None and self._clock() - self._loaded_at >= self.ttl_seconds
+        if self._by_weekday is None or expired:
+            return None
+        return self._by_weekday, self._start_dates
+
+    def _ensure(self, loader: Callable[[], List[Dict]]) -> Tuple[Dict[int, List[Dict]], Dict[int, List[date]]]:
+        """The rows and start dates of one load, returned together so a concurrent reload cannot mix them"""
+        with self._lock:
+            return self._current() or self._build(loader())
+
+    def snapshot(self) -> Optional[Tuple[Dict[int, List[Dict]], Dict[int, List[date]]]]:
+        """The loaded index, or None when it is stale and must be reloaded"""
+        with self._lock:
+            return self._current()
+
+    def load(self, rows: List[Dict]) -> Tuple[Dict[int, List[Dict]], Dict[int, List[date]]]:
+        """
+        Replace the index with rows fetched by the caller. Async repositories
+        await the query themselves and hand the rows over, since the loader
+        of schedules_on() is synchronous.
+        """
+        with self._lock:
+            return self._build(rows)
+
+    def schedules_on(self, loader: Callable[[], List[Dict]], day: date, employee_id: Optional[int] = None) -> List[Dict]:
+        """Schedules in effect on a day, optionally for a single employee"""
+        return self.snapshot_schedules_on(self._ensure(loader), day, employee_id)
+
+    @staticmethod
+    def snapshot_schedules_on(snapshot, day: date, employee_id: Optional[int] = None) -> List[Dict]:
+        by_weekday, start_dates = snapshot
+        weekday = day.weekday()
+        # Rows are sorted by start_date, so only those starting on or before the day qualify
+        candidates = by_weekday[weekday][:bisect_right(start_dates[weekday], day)]
+        if employee_id:
+            candidates = [schedule for schedule in candidates if schedule['employee_id'] == employee_id]
+        return effective_schedules(candidates, day)
+
+    def schedules_in_range(
+        self,
+        loader: Callable[[], List[Dict]],
+        start_date: date,
+        end_date: date,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        """Every schedule row valid at some point in the range"""
+        return self.snapshot_schedules_in_range(self._ensure(loader), start_date, end_date, employee_ids)
+
+    @staticmethod
+    def snapshot_schedules_in_range(
+        snapshot,
+        start_date: date,
+        end_date: date,
+        employee_ids: Optional[Sequence[int]] = None
+    ) -> List[Dict]:
+        by_weekday, _ = snapshot
+        wanted = set(employee_ids) if employee_ids else None
+        rows = [
+            schedule
+            for weekday_rows in by_weekday.values()
+            for schedule in weekday_rows
+            if schedule['start_date'] <= end_date and schedule['end_date'] >= start_date
+            and (wanted is None or schedule['employee_id'] in wanted)
+        ]
+        rows.sort(key=lambda s: (s['employee_id'], s['start_date']))
+        return rows
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+def get_schedule_index(bind) -> ScheduleIndex:
+    """The process-wide schedule index for an engine"""
+    engine = engine_key(bind)
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is None:
+            index = _indexes[engine] = ScheduleIndex()
+        return index
+
+def _mark_engine_stale(bind):
+    index = _indexes.get(engine_key(bind))
+    if index is not None:
+        index.mark_stale()
+
+def _on_row_change(mapper, connection, target):
+    _mark_engine_stale(connection)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['schedules_changed'] = True
+
+def _on_bulk_change(context):
+    if context.mapper.class_ in (EmployeeSchedule, Employee):
+        _mark_engine_stale(context.session.get_bind())
+        context.session.info['schedules_changed'] = True
+
+def _on_commit(session):
+    # Reload once more after commit: another session may have reloaded the
+    # index between our flush and the commit and missed the change
+    if session.info.pop('schedules_changed', False):
+        _mark_engine_stale(session.get_bind())
+
+def _on_rollback(session):
+    # The index may have been reloaded with the flushed, now rolled back, rows
+    if session.info.pop('schedules_changed', False):
+        _mark_engine_stale(session.get_bind())
+
+def _on_soft_rollback(session, previous_transaction):
+    # A savepoint rollback may discard flushed rows too; the outer
+    # transaction keeps the flag for its own commit or rollback
+    if session.info.get('schedules_changed'):
+        _mark_engine_stale(session.get_bind())
+
+for _model in (EmployeeSchedule, Employee):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _on_row_change)
+event.listen(Session, 'after_bulk_update', _on_bulk_change)
+event.listen(Session, 'after_bulk_delete', _on_bulk_change)
+event.listen(Session, 'after_commit', _on_commit)
+event.listen(Session, 'after_rollback', _on_rollback)
+event.listen(Session, 'after_soft_rollback', _on_soft_rollback)
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from src.infrastructure.archiver import BookingArchiver
+from src.infrastructure.database import get_session
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old completed and cancelled bookings to archived_bookings')
+    parser.add_argument('--older-than-days', type=int, default=90, help='Archive bookings older than this many days')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+    parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    args = parser.parse_args()
+
+    session = get_session()
+    try:
+        archiver = BookingArchiver(
+            session, older_than=timedelta(days=args.older_than_days),
+            batch_size=args.batch_size, sleep_seconds=args.sleep
+        )
+        report = archiver.run(max_batches=args.max_batches)
+        print(f"Archived {report.rows_moved} bookings in {report.batches} batches "
+              f"({report.seconds:.1f}s, {report.rows_per_second:.0f} rows/s)")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Synthetic data for load tests and benchmarks: employees with weekly shifts
+and days off, the services each offers, customers and bookings filling a
+`density` share of every shift, reproducible from a seed.
+
+Customers and bookings go straight to the driver in large batches:
+executemany, or COPY with psycopg2 on PostgreSQL. Bookings carry their
+end_time and are loaded with the booking triggers off and the non-unique
+indexes dropped; the indexes and, on SQLite, the reservation cells are then
+built in one statement each. Meant for empty or throwaway databases: ids
+continue after the largest existing ones.
+
+Usage:
+    python -m src.scripts.generate_data --employees 500 --customers 100000 --days 365 --density 0.7
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, time as dtime
+from itertools import accumulate, islice
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import func, insert, select, text
+from src.core.models import Base, Booking, Customer, Employee, EmployeeSchedule, EmployeeService, Service
+from src.infrastructure.booking_constraints import install_booking_constraints, reserve_loaded_bookings
+from src.infrastructure.partitioning import ensure_partitions, is_partitioned
+
+# name, minutes, price, how often it is booked
+SERVICES = [
+    ('Haircut', 30, 35, 10),
+    ('Beard trim', 15, 15, 4),
+    ('Manicure', 45, 25, 5),
+    ('Pedicure', 60, 40, 3),
+    ('Massage', 90, 70, 2),
+    ('Hair colouring', 120, 85, 2),
+]
+CUSTOMER_COLUMNS = ('id', 'email', 'first_name', 'last_name', 'phone', 'created_at', 'updated_at')
+BOOKING_COLUMNS = ('id', 'customer_id', 'employee_id', 'service_id', 'schedule_id', 'appointment_time', 'end_time',
+                   'status', 'created_at', 'updated_at')
+SQLITE_TRIGGERS = ('bookings_reserve_insert', 'bookings_reserve_update', 'bookings_reserve_delete')
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Maria', 'John', 'Aisha', 'Wei', 'Olga', 'Pedro', 'Fatima', 'Kenji', 'Noah', 'Emma']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Kowalski', 'Silva', 'Nguyen', 'Müller', 'Haddad', 'Patel',
+              'Johnson', 'Lee', 'Brown', 'Rossi', 'Tanaka', 'Ivanova', 'Dubois', 'Jensen', 'Murphy', 'Khan']
+
+@dataclass
+class Scale:
+    employees: int = 50
+    customers: int = 5000
+    days: int = 30
+    density: float = 0.6  # Share of each shift that is booked
+    first_day: date = date(2024, 1, 1)
+    seed: int = 42
+    cancelled_ratio: float = 0.1
+    completed_before: Optional[date] = None  # Bookings before this day are completed (when not cancelled)
+    batch_size: int = 50000
+
+    @property
+    def last_day(self) -> date:
+        return self.first_day + timedelta(days=self.days - 1)
+
+    def expected_bookings(self) -> float:
+        """Roughly how many bookings generate() writes at this scale"""
+        total_weight = sum(weight for *_, weight in SERVICES)
+        mean_minutes = sum(minutes * weight for _, minutes, _, weight in SERVICES) / total_weight
+        # Five 7.5 hour shifts a week; a booking is followed by a 15 minute gap one time in four
+        per_shift = 450 * self.density / (mean_minutes + 3.75 * self.density)
+        return self.employees * self.days * 5 / 7 * per_shift
+
+def _timestamp(day: date, minutes: int) -> str:
+    """Text of a datetime as SQLAlchemy stores it in SQLite, which PostgreSQL reads as well"""
+    return f"{day.isoformat()} {minutes // 60:02d}:{minutes % 60:02d}:00.000000"
+
+def _next_id(connection, column) -> int:
+    return (connection.execute(select(func.max(column))).scalar() or 0) + 1
+
+class _Generator:
+    def __init__(self, connection, scale: Scale):
+        self.connection = connection
+        self.scale = scale
+        self.rng = random.Random(scale.seed)
+
+    def services(self) -> List[Dict]:
+        first = _next_id(self.connection, Service.id)
+        rows = [
+            {'id': first + index, 'name': name, 'description': f'{name} ({minutes} minutes)',
+             'duration_minutes': minutes, 'price': price, 'is_active': True}
+            for index, (name, minutes, price, _) in enumerate(SERVICES)
+        ]
+        self.connection.execute(insert(Service), rows)
+        for row, (*_, weight) in zip(rows, SERVICES):
+            row['weight'] = weight
+        return rows
+
+    def employees(self, services: List[Dict]) -> Dict[int, Dict]:
+        """Employees with their shifts {weekday: (schedule id, start, end)} and offered services"""
+        scale, rng = self.scale, self.rng
+        first = _next_id(self.connection, Employee.id)
+        first_schedule = _next_id(self.connection, EmployeeSchedule.id)
+        employees, employee_rows, schedule_rows, offer_rows = {}, [], [], []
+        for employee_id in range(first, first + scale.employees):
+            employee_rows.append({
+                'id': employee_id, 'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+                'email': f'employee{employee_id}@example.com', 'phone': f'555-{employee_id:07d}', 'is_active': True
+            })
+            days_off = set(rng.sample(range(7), 2))
+            start_hour = rng.choice([7, 8, 8, 9, 9, 10])
+            hours = rng.choice([8, 8, 8, 6])  # some part-timers
+            shifts = {}
+            for weekday in range(7):
+                if weekday in days_off:
+                    continue
+                schedule_id = first_schedule + len(schedule_rows)
+                start, end = dtime(start_hour), dtime(start_hour + hours)
+                schedule_rows.append({
+                    'id': schedule_id, 'employee_id': employee_id, 'day_of_week': weekday,
+                    'start_time': start, 'end_time': end,
+                    'start_date': scale.first_day, 'end_date': scale.last_day
+                })
+                shifts[weekday] = (schedule_id, start, end)
+            offered = rng.sample(services, rng.randint(3, len(services)))
+            offer_rows.extend({'employee_id': employee_id, 'service_id': service['id']} for service in offered)
+            employees[employee_id] = {'shifts': shifts, 'services': offered,
+                                      'cum_weights': list(accumulate(service['weight'] for service in offered))}
+        self.connection.execute(insert(Employee), employee_rows)
+        self.connection.execute(insert(EmployeeSchedule), schedule_rows)
+        self.connection.execute(insert(EmployeeService), offer_rows)
+        return employees
+
+    def customers(self) -> range:
+        rng, first = self.rng, _next_id(self.connection, Customer.id)
+        ids = range(first, first + self.scale.customers)
+        created_at = _timestamp(self.scale.first_day, 0)
+        self.copy_rows('customers', CUSTOMER_COLUMNS, (
+            (customer_id, f'customer{customer_id}@example.com', rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+             f'555-{customer_id:07d}', created_at, created_at)
+            for customer_id in ids
+        ))
+        return ids
+
+    def bookings(self, employees: Dict[int, Dict], customer_ids: range, first_id: int) -> Iterator[tuple]:
+        """Booking rows, shift by shift; confirmed ones of an employee never overlap"""
+        scale, rng = self.scale, self.rng
+        booking_id = first_id
+        created_at = _timestamp(scale.first_day, 0)
+        for offset in range(scale.days):
+            day = scale.first_day + timedelta(days=offset)
+            finished = scale.completed_before is not None and day < scale.completed_before
+            for employee_id, employee in employees.items():
+                shift = employee['shifts'].get(day.weekday())
+                if shift is None:
+                    continue
+                schedule_id, start, end = shift
+                current, closing = start.hour * 60, end.hour * 60
+                # Drawn a shift at a time, far cheaper than one by one
+                for service in rng.choices(employee['services'], cum_weights=employee['cum_weights'], k=64):
+                    finish = current + service['duration_minutes']
+                    if finish > closing:
+                        break
+                    if rng.random() < scale.density:
+                        status = 'cancelled' if rng.random() < scale.cancelled_ratio else (
+                            'completed' if finished else 'confirmed')
+                        customer_id = customer_ids[int(rng.random() * len(customer_ids))]
+                        yield (booking_id, customer_id, employee_id, service['id'], schedule_id,
+                               _timestamp(day, current), _timestamp(day, finish), status, created_at, created_at)
+                        booking_id += 1
+                        finish += 15 if rng.random() < 0.25 else 0
+                    current = finish
+
+    def write_bookings(self, employees: Dict[int, Dict], customer_ids: range) -> int:
+        """
+        Load the bookings with the triggers off and the non-unique indexes
+        dropped, then build the indexes and (SQLite) reservation cells once.
+        """
+        connection = self.connection
+        dialect = connection.dialect.name
+        first_id = _next_id(connection, Booking.id)
+        indexes = [index for index in Booking.__table__.indexes if not index.unique]
+        if dialect == 'sqlite':
+            for trigger in SQLITE_TRIGGERS:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            connection.execute(text("DROP INDEX IF EXISTS idx_booking_cells_booking"))
+        elif dialect == 'postgresql':
+            connection.execute(text("ALTER TABLE bookings DISABLE TRIGGER USER"))
+            if is_partitioned(connection):
+                ensure_partitions(connection, months_ahead=self.scale.days // 28 + 1, start=self.scale.first_day)
+        for index in indexes:
+            index.drop(connection, checkfirst=True)
+
+        written = self.copy_rows('bookings', BOOKING_COLUMNS, self.bookings(employees, customer_ids, first_id))
+
+        for index in indexes:
+            index.create(connection)
+        if dialect == 'sqlite':
+            reserve_loaded_bookings(connection, first_id)
+            install_booking_constraints(connection)  # the triggers and cell index again
+        elif dialect == 'postgresql':
+            connection.execute(text("ALTER TABLE bookings ENABLE TRIGGER USER"))
+        return written
+
+    def copy_rows(self, table: str, columns: tuple, rows: Iterable[tuple]) -> int:
+        """
+        Write rows in batches straight through the driver, skipping SQLAlchemy's
+        per-value processing: COPY with psycopg2, executemany otherwise. Column
+        defaults do not apply, so rows are complete and timestamps are text.
+        """
+        connection = self.connection
+        cursor = connection.connection.dbapi_connection.cursor()
+        if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+            def write(batch):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            statement = str(insert(Base.metadata.tables[table]).compile(
+                dialect=connection.dialect, column_keys=list(columns)
+            ))
+
+            def write(batch):
+                cursor.executemany(statement, batch)
+        written = 0
+        try:
+            for batch in _batches(rows, self.scale.batch_size):
+                write(batch)
+                written += len(batch)
+        finally:
+            cursor.close()
+        return written
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def generate(engine, scale: Scale) -> Dict:
+    """Fill the database (schema already created) at the given scale in one transaction. Returns row counts and seconds."""
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        generator = _Generator(connection, scale)
+        services = generator.services()
+        employees = generator.employees(services)
+        customer_ids = generator.customers()
+        bookings = generator.write_bookings(employees, customer_ids)
+        if connection.dialect.name == 'postgresql':
+            # Explicit ids leave the sequences behind
+            for table in ('services', 'employees', 'employee_schedules', 'customers', 'bookings'):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                ))
+        # Planner statistics, as the benchmarks query the data straight away
+        connection.execute(text("ANALYZE"))
+    return {
+        'services': len(services),
+        'employees': len(employees),
+        'schedules': sum(len(employee['shifts']) for employee in employees.values()),
+        'customers': len(customer_ids),
+        'bookings': bookings,
+        'seconds': time.perf_counter() - started
+    }
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main():
+    from src.infrastructure.database import get_engine, init_db
+
+    parser = argparse.ArgumentParser(description='Fill the DATABASE_URL database with synthetic load-test data')
+    parser.add_argument('--employees', type=int, default=50, help='Number of employees')
+    parser.add_argument('--customers', type=int, default=5000, help='Number of customers')
+    parser.add_argument('--days', type=int, default=30, help='Days of schedules and bookings')
+    parser.add_argument('--density', type=float, default=0.6, help='Share of each shift that is booked')
+    parser.add_argument('--first-day', type=parse_date, default=date.today(), help='First day (YYYY-MM-DD)')
+    parser.add_argument('--completed-before', type=parse_date, help='Mark earlier bookings completed')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    init_db()
+    counts = generate(get_engine(), Scale(
+        employees=args.employees, customers=args.customers, days=args.days, density=args.density,
+        first_day=args.first_day, completed_before=args.completed_before, seed=args.seed
+    ))
+    seconds = counts.pop('seconds')
+    print(', '.join(f"{count} {name}" for name, count in counts.items()) +
+          f" in {seconds:.1f}s ({counts['bookings'] / seconds:.0f} bookings/s)")
+
+if __name__ == "__main__":
+    main()
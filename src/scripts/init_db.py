@@ -0,0 +1,8 @@
+from src.infrastructure.database import init_db
+
+def main():
+    engine = init_db()
+    print(f"Database schema ready at {engine.url.render_as_string(hide_password=True)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+from datetime import date, datetime, timedelta
+from src.infrastructure.database import get_session
+from src.services.free_slots import FreeSlotStore
+import argparse
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or check the materialized free interval table')
+    parser.add_argument('--start', type=parse_date, default=date.today(), help='First day (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--days', type=int, default=60, help='Number of days to materialize')
+    parser.add_argument('--check', action='store_true', help='Only compare materialized availability with the live computation')
+    parser.add_argument('--drop', action='store_true', help='Stop materializing the days and delete their intervals')
+    args = parser.parse_args()
+    end = args.start + timedelta(days=args.days - 1)
+
+    session = get_session()
+    try:
+        store = FreeSlotStore(session)
+        if args.drop:
+            store.drop(args.start, end)
+            print(f"Dropped materialized intervals from {args.start} to {end}")
+        elif args.check:
+            mismatches = store.check_consistency(args.start, end)
+            for mismatch in mismatches:
+                print(f"{mismatch['date']} service {mismatch['service_id']}: "
+                      f"{len(mismatch['missing'])} missing, {len(mismatch['unexpected'])} unexpected slots")
+            print(f"{len(mismatches)} inconsistencies found")
+            if mismatches:
+                raise SystemExit(1)
+        else:
+            written = store.rebuild(args.start, end)
+            print(f"Materialized {written} free intervals from {args.start} to {end}")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from src.services.maintenance import start_job_scheduler
+import signal
+import threading
+
+def main():
+    scheduler = start_job_scheduler()
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopping.set())
+    print(f"Running jobs: {', '.join(scheduler.metrics())}")
+    stopping.wait()
+    print("Stopping, waiting for running jobs to finish")
+    scheduler.stop()
+    for name, metrics in scheduler.metrics().items():
+        print(f"{name}: {metrics['runs']} runs, {metrics['failures']} failures, {metrics['skipped']} skipped")
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,13 @@ Services package for the email AI system
 from .ai_responder import AIResponder
 from .email_parser import RegexEmailParser
 from .availability import AvailabilityService
+from .async_availability import AsyncAvailabilityService
 from .response import EmailResponseHandler
 
 __all__ = [
     'AIResponder',
     'RegexEmailParser',
     'AvailabilityService',
+    'AsyncAvailabilityService',
     'EmailResponseHandler'
 ] 
\ No newline at end of file
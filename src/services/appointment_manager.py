@@ -1,6 +1,5 @@
 from datetime import datetime, timedelta
-from sqlalchemy.orm import sessionmaker
-from src.infrastructure.database import init_db
+from src.infrastructure.database import get_session
 from src.infrastructure.repositories import SQLAlchemyScheduleRepository, SQLAlchemyBookingRepository
 from email_parser import RegexEmailParser
 from availability import AvailabilityService
@@ -8,9 +7,7 @@ from response import EmailResponseHandler
 
 class AppointmentManager:
     def __init__(self):
-        self.engine = init_db()
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.session = get_session()
         
         # Initialize repositories
         self.schedule_repository = SQLAlchemyScheduleRepository(self.session)
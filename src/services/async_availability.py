@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.interfaces import CacheBackend
+from src.core.models import Service
+from src.core.values import BookingSpan, SlotColumns
+from src.infrastructure.repositories import AsyncSQLAlchemyScheduleRepository, AsyncSQLAlchemyBookingRepository
+from src.infrastructure.schedule_index import ScheduleIndex
+from src.services.availability import SERVICE_DURATIONS, AvailabilityBase, _as_date
+
+_MISSING = object()
+
+class AsyncAvailabilityService(AvailabilityBase):
+    """
+    AvailabilityService for asyncio code on an AsyncSession: every query is
+    awaited, so one event loop serves many concurrent requests. Slot
+    computation, the slot cache and the schedule index are shared with the
+    synchronous service (see share_engine_state for an engine of the same
+    database). Materialized days are not read; slots are always computed.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        slot_granularity_minutes: int = 15,
+        slot_engine: str = 'interval',
+        cache_maxsize: int = 1024,
+        cache_ttl: timedelta = timedelta(minutes=5),
+        cache_backend: Optional[CacheBackend] = None,
+        schedule_index: Optional[ScheduleIndex] = None
+    ):
+        super().__init__(
+            session.bind.sync_engine, slot_granularity_minutes, slot_engine,
+            cache_maxsize, cache_ttl, cache_backend, schedule_index
+        )
+        self.session = session
+        self.schedule_repo = AsyncSQLAlchemyScheduleRepository(session, self.schedule_index)
+        self.booking_repo = AsyncSQLAlchemyBookingRepository(session)
+
+    async def _get_booking_spans(self, date: datetime, employee_id: Optional[int] = None, versions=None) -> List[BookingSpan]:
+        """Get booked spans for a date with caching, keyed by the scope versions so invalidation applies"""
+        day = _as_date(date)
+        if versions is None:
+            versions = self._cache.versions(self._cache_scopes((day, employee_id or None)))
+        key = (day, employee_id or None, versions)
+        spans = self._bookings_cache.get(key, _MISSING)
+        if spans is _MISSING:
+            spans = await self.booking_repo.get_booking_spans(
+                *self._day_bounds(day), [employee_id] if employee_id else None
+            )
+            self._bookings_cache.set(key, spans)
+        return spans
+
+    async def _get_service_durations(self, service_id: Optional[int] = None) -> Dict[int, int]:
+        """Load the duration of every service in one query, again once the map expires or lacks service_id"""
+        durations = self._cached_durations(service_id)
+        if durations is None:
+            result = await self.session.execute(select(Service.id, Service.duration_minutes))
+            durations = dict(result.all())
+            self._durations_cache.set(SERVICE_DURATIONS, durations)
+        return durations
+
+    async def is_slot_free(self, employee_id: int, start: datetime, end: datetime) -> bool:
+        """AvailabilityService.is_slot_free, awaited"""
+        day = _as_date(start)
+        schedule = await self.schedule_repo.get_employee_schedule(employee_id, day.weekday(), day)
+        if not self._within_schedule(schedule, start, end):
+            return False
+        earliest_start = self._earliest_overlapping_start(start, await self._get_service_durations())
+        return not await self.booking_repo.has_overlapping_booking(employee_id, start, end, earliest_start)
+
+    async def get_slot_columns(
+        self,
+        date: datetime,
+        service_id: int,
+        employee_id: Optional[int] = None
+    ) -> SlotColumns:
+        """Available slots for a date and service in compact form (the caller's own copy)"""
+        cache_key = self._get_cache_key(date, employee_id, service_id)
+        cached_slots = self._get_cached_availability(cache_key)
+        if cached_slots is not None:
+            return cached_slots.copy()
+
+        # Versions are read before loading, as in AvailabilityService.get_slot_columns
+        versions = self._cache.versions(self._cache_scopes(cache_key))
+        service_duration = (await self._get_service_durations(service_id)).get(service_id)
+        if service_duration is None:
+            return SlotColumns(0)
+
+        available_slots = await self._compute_slots(
+            date, service_duration, employee_id, await self._get_booking_spans(date, employee_id, versions)
+        )
+        self._update_cache(cache_key, available_slots, versions)
+        return available_slots.copy()
+
+    async def get_available_slots(
+        self,
+        date: datetime,
+        service_id: int,
+        employee_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Get available time slots for a specific date and service"""
+        return (await self.get_slot_columns(date, service_id, employee_id)).to_dicts()
+
+    async def compute_available_slots(
+        self,
+        date: datetime,
+        service_id: int,
+        employee_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Compute available slots from schedules and bookings, bypassing every cache"""
+        service_duration = (await self._get_service_durations(service_id)).get(service_id)
+        if service_duration is None:
+            return []
+        spans = await self.booking_repo.get_booking_spans(
+            *self._day_bounds(_as_date(date)), [employee_id] if employee_id else None
+        )
+        return (await self._compute_slots(date, service_duration, employee_id, spans)).to_dicts()
+
+    async def _compute_slots(
+        self,
+        date: datetime,
+        service_duration: int,
+        employee_id: Optional[int],
+        spans: List[BookingSpan]
+    ) -> SlotColumns:
+        """Compute available slots for the schedules of a day"""
+        day = _as_date(date)
+        if employee_id:
+            schedules = [await self.schedule_repo.get_employee_schedule(employee_id, day.weekday(), day)]
+        else:
+            schedules = await self.schedule_repo.get_all_schedules_for_day(day.weekday(), day)
+        return self._day_columns(schedules, spans, service_duration, day)
+
+    async def find_next_available(
+        self,
+        service_id: int,
+        after: datetime,
+        limit: int = 5,
+        employee_id: Optional[int] = None,
+        horizon_days: int = 90
+    ) -> List[Dict]:
+        """The next `limit` available slots at or after `after`, see AvailabilityService.find_next_available"""
+        service_duration = (await self._get_service_durations(service_id)).get(service_id)
+        if service_duration is None or limit <= 0:
+            return []
+
+        not_before = self._not_before(after)
+        employee_ids = [employee_id] if employee_id else None
+        available_slots = SlotColumns(service_duration)
+        for window in self._search_windows(not_before.date(), horizon_days):
+            if len(available_slots) >= limit:
+                break
+            schedules = await self.schedule_repo.get_schedules_in_range(*window, employee_ids)
+            spans = await self.booking_repo.get_booking_spans(
+                *self._range_bounds(*window), employee_ids
+            ) if schedules else []
+            self._add_next_available(available_slots, schedules, spans, window, not_before, limit)
+
+        return available_slots.head(limit).to_dicts()
+
+    async def get_slot_columns_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        service_id: int,
+        employee_ids: Optional[List[int]] = None,
+        slot_engine: Optional[str] = None
+    ) -> SlotColumns:
+        """get_available_slots_range in compact form"""
+        service_duration = (await self._get_service_durations(service_id)).get(service_id)
+        if service_duration is None:
+            return SlotColumns(0)
+
+        first_day, last_day = _as_date(start_date), _as_date(end_date)
+        schedules = await self.schedule_repo.get_schedules_in_range(first_day, last_day, employee_ids)
+        if not schedules:
+            return SlotColumns(service_duration)
+        spans = await self.booking_repo.get_booking_spans(*self._range_bounds(first_day, last_day), employee_ids)
+        return self._range_columns(schedules, spans, service_duration, first_day, last_day, slot_engine)
+
+    async def get_available_slots_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        service_id: int,
+        employee_ids: Optional[List[int]] = None,
+        slot_engine: Optional[str] = None
+    ) -> List[Dict]:
+        """Get available time slots for every day from start_date to end_date inclusive"""
+        columns = await self.get_slot_columns_range(start_date, end_date, service_id, employee_ids, slot_engine)
+        return columns.to_dicts()
+
+    async def get_available_slots_for_week(self, start_date: datetime, service_id: int, days: int = 7) -> List[Dict]:
+        """Get available time slots for all employees over several days in one bitmap computation"""
+        return await self.get_available_slots_range(
+            *self._week_range(start_date, days), service_id, slot_engine='bitmap'
+        )
@@ -1,145 +1,464 @@
 from datetime import datetime, timedelta, time
-from typing import List, Dict, Optional
-from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from src.core.models import EmployeeSchedule, Booking, Service
+from src.core.models import Service
+from src.core.interfaces import CacheBackend
+from src.core.values import BookingSpan, SlotColumns, minute_of_day
+from src.infrastructure.cache import TTLCache, get_cache_backend
 from src.infrastructure.repositories import SQLAlchemyScheduleRepository, SQLAlchemyBookingRepository
+from src.infrastructure.schedule_index import ScheduleIndex, get_schedule_index, effective_schedules
+from src.services.intervals import merge_intervals, subtract_intervals, slot_start_minutes
+from src.services.availability_bitmap import bitmap_slot_columns
+from src.services.free_slots import FreeSlotStore
 
-class AvailabilityService:
-    def __init__(self, session: Session):
-        self.session = session
-        self.schedule_repo = SQLAlchemyScheduleRepository(session)
-        self.booking_repo = SQLAlchemyBookingRepository(session)
-        self._cache = {}
-        self._cache_ttl = timedelta(minutes=5)  # Cache time-to-live
+SLOT_ENGINES = ('interval', 'bitmap')
+DAY_WIDE = '*'  # cache scope bumped when every employee's entries for a day are stale
+SERVICE_DURATIONS = 'durations'  # key of the duration map in its cache
+
+def _as_date(value):
+    """Accept either a date or a datetime"""
+    return value.date() if isinstance(value, datetime) else value
+
+class AvailabilityBase:
+    """
+    Slot computation and caching shared by the synchronous and the asyncio
+    availability services; subclasses supply the data access.
+    """
+
+    def __init__(
+        self,
+        bind,
+        slot_granularity_minutes: int = 15,
+        slot_engine: str = 'interval',
+        cache_maxsize: int = 1024,
+        cache_ttl: timedelta = timedelta(minutes=5),
+        cache_backend: Optional[CacheBackend] = None,
+        schedule_index: Optional[ScheduleIndex] = None
+    ):
+        if slot_engine not in SLOT_ENGINES:
+            raise ValueError(f"Unknown slot engine '{slot_engine}', expected one of {SLOT_ENGINES}")
+        self.slot_granularity_minutes = slot_granularity_minutes
+        self.slot_engine = slot_engine
+        # Schedules are answered from the process-wide in-memory index
+        self.schedule_index = schedule_index or get_schedule_index(bind)
+        # The slot cache backend is shared by every service of the process
+        # using the same engine, so an invalidation by BookingService reaches
+        # them all (and other processes with AVAILABILITY_CACHE_PATH, see
+        # get_cache_backend). The bookings memo and the service durations are
+        # owned by the instance, and expire so bookings made by other
+        # processes and edited services become visible
+        ttl_seconds = cache_ttl.total_seconds()
+        self._cache = cache_backend or get_cache_backend(cache_maxsize, ttl_seconds, bind)
+        self._bookings_cache = TTLCache(cache_maxsize, ttl_seconds)
+        self._durations_cache = TTLCache(1, ttl_seconds)
 
-    def _get_cache_key(self, date: datetime, employee_id: Optional[int] = None) -> str:
+    def _get_cache_key(self, date: datetime, employee_id: Optional[int] = None, service_id: Optional[int] = None) -> Tuple:
         """Generate a cache key for availability checks"""
         # Handle both datetime and date objects
-        date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
-        return f"{date_str}_{employee_id if employee_id else 'all'}"
+        return (_as_date(date), employee_id or None, service_id)
 
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cached data is still valid"""
-        if cache_key not in self._cache:
-            return False
-        cache_time, _ = self._cache[cache_key]
-        return datetime.now() - cache_time < self._cache_ttl
+    @staticmethod
+    def _cache_scopes(cache_key: Tuple) -> Tuple[Tuple, Tuple]:
+        """Version scopes a cache entry depends on: its (date, employee) and the whole date"""
+        day, employee_id = cache_key[:2]
+        return ((day, employee_id), (day, DAY_WIDE))
 
-    def _update_cache(self, cache_key: str, data: List[Dict]):
-        """Update the cache with new data"""
-        self._cache[cache_key] = (datetime.now(), data)
+    def _update_cache(self, cache_key: Tuple, data: SlotColumns, versions: Tuple[int, ...]):
+        """Update the cache with data computed at the given scope versions"""
+        self._cache.set(cache_key, data, versions)
 
-    def _get_cached_availability(self, cache_key: str) -> Optional[List[Dict]]:
+    def _get_cached_availability(self, cache_key: Tuple) -> Optional[SlotColumns]:
         """Get availability data from cache if valid"""
-        if self._is_cache_valid(cache_key):
-            return self._cache[cache_key][1]
-        return None
+        return self._cache.get(cache_key, self._cache_scopes(cache_key))
+
+    def _cached_durations(self, service_id: Optional[int] = None) -> Optional[Dict[int, int]]:
+        """The cached duration of every service, or None to reload it: expired, or without service_id (added since)"""
+        durations = self._durations_cache.get(SERVICE_DURATIONS)
+        if durations is None or (service_id is not None and service_id not in durations):
+            return None
+        return durations
+
+    @staticmethod
+    def _day_bounds(day) -> Tuple[datetime, datetime]:
+        return datetime.combine(day, time.min), datetime.combine(day, time.max)
+
+    @staticmethod
+    def _range_bounds(first_day, last_day) -> Tuple[datetime, datetime]:
+        return datetime.combine(first_day, time.min), datetime.combine(last_day, time.max)
+
+    @staticmethod
+    def _week_range(start_date, days: int) -> Tuple:
+        first_day = _as_date(start_date)
+        return first_day, first_day + timedelta(days=days - 1)
+
+    @staticmethod
+    def _not_before(after) -> datetime:
+        """A date means from its start"""
+        return after if isinstance(after, datetime) else datetime.combine(after, time.min)
 
-    @lru_cache(maxsize=100)
-    def _get_employee_schedule(self, employee_id: int, date: datetime) -> List[Dict]:
-        """Get employee schedule with caching"""
-        return self.schedule_repo.get_employee_schedule(employee_id, date.weekday())
+    @staticmethod
+    def _search_windows(first_day, horizon_days: int):
+        """The (first, last) days find_next_available loads at once: 7, 14, 28... days, up to horizon_days"""
+        last_day = first_day + timedelta(days=horizon_days - 1)
+        window_start, window_days = first_day, 7
+        while window_start <= last_day:
+            window_end = min(window_start + timedelta(days=window_days - 1), last_day)
+            yield window_start, window_end
+            window_start = window_end + timedelta(days=1)
+            window_days *= 2
 
-    @lru_cache(maxsize=100)
-    def _get_bookings_for_date(self, date: datetime, employee_id: Optional[int] = None) -> List[Dict]:
-        """Get bookings for a date with caching"""
-        return self.booking_repo.get_bookings_for_employee(employee_id, date) if employee_id else []
+    @staticmethod
+    def _group_spans(spans: List[BookingSpan]) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+        """Booked minute ranges keyed by (employee_id, day ordinal)"""
+        grouped = {}
+        for span in spans:
+            grouped.setdefault((span.employee_id, span.day_ordinal), []).append((span.start_minute, span.end_minute))
+        return grouped
 
-    def _find_available_slots(
+    @staticmethod
+    def _window(schedule: Dict) -> Tuple[int, int]:
+        """Working minutes of a schedule"""
+        return minute_of_day(schedule['start_time']), minute_of_day(schedule['end_time'])
+
+    @staticmethod
+    def _within_schedule(schedule: Optional[Dict], start: datetime, end: datetime) -> bool:
+        day = start.date()
+        return schedule is not None and \
+            datetime.combine(day, schedule['start_time']) <= start and end <= datetime.combine(day, schedule['end_time'])
+
+    @staticmethod
+    def _earliest_overlapping_start(start: datetime, service_durations: Dict[int, int]) -> datetime:
+        """No booking starting before this can reach start"""
+        return start - timedelta(minutes=max(service_durations.values(), default=0))
+
+    def _columns_for_days(
         self,
-        schedule: Dict,
-        existing_bookings: List[Dict],
+        schedules: List[Dict],
+        booked: Dict[Tuple[int, int], List[Tuple[int, int]]],
         service_duration: int,
-        date: datetime
-    ) -> List[Dict]:
-        """Find available time slots within a schedule"""
-        available_slots = []
-        start_time = datetime.combine(date.date(), schedule['start_time'])
-        end_time = datetime.combine(date.date(), schedule['end_time'])
-        
-        # Convert existing bookings to time ranges
-        booked_ranges = []
-        for booking in existing_bookings:
-            booking_time = booking['appointment_time']
-            service = self.session.get(Service, booking['service_id'])
-            if service:
-                booking_end = booking_time + timedelta(minutes=service.duration_minutes)
-                booked_ranges.append((booking_time, booking_end))
-
-        # Find available slots
-        current_time = start_time
-        while current_time + timedelta(minutes=service_duration) <= end_time:
-            slot_available = True
-            slot_end = current_time + timedelta(minutes=service_duration)
-            
-            # Check if slot overlaps with any existing booking
-            for booking_start, booking_end in booked_ranges:
-                if (current_time < booking_end and slot_end > booking_start):
-                    slot_available = False
-                    break
-            
-            if slot_available:
-                available_slots.append({
-                    'start_time': current_time,
-                    'end_time': slot_end,
-                    'duration_minutes': service_duration
-                })
-            
-            # Move to next 15-minute slot
-            current_time += timedelta(minutes=15)
-        
-        return available_slots
+        days: List,
+        slot_engine: str
+    ) -> SlotColumns:
+        """
+        Slots for each day from the schedules in effect and the grouped booked
+        ranges, ordered by start time then employee.
+        """
+        if slot_engine == 'bitmap':
+            # Every employee-day goes through one array computation and
+            # comes back already sorted by start time
+            day_ordinals, employee_ids, windows, ranges = [], [], [], []
+            for day in days:
+                ordinal = day.toordinal()
+                for schedule in effective_schedules(schedules, day):
+                    day_ordinals.append(ordinal)
+                    employee_ids.append(schedule['employee_id'])
+                    windows.append(self._window(schedule))
+                    ranges.append(booked.get((schedule['employee_id'], ordinal), []))
+            return bitmap_slot_columns(
+                day_ordinals, employee_ids, windows, ranges, service_duration, self.slot_granularity_minutes
+            )
 
-    def get_available_slots(
+        # Subtract the merged booked ranges from each schedule and only
+        # generate slot starts inside the remaining gaps
+        columns = SlotColumns(service_duration)
+        for day in days:
+            ordinal = day.toordinal()
+            for schedule in effective_schedules(schedules, day):
+                window = self._window(schedule)
+                gaps = subtract_intervals(window, merge_intervals(booked.get((schedule['employee_id'], ordinal), [])))
+                columns.add(ordinal, schedule['employee_id'], slot_start_minutes(
+                    gaps, service_duration, self.slot_granularity_minutes, window[0]
+                ))
+        return columns.sorted()
+
+    def _day_columns(
+        self,
+        schedules: List[Optional[Dict]],
+        spans: List[BookingSpan],
+        service_duration: int,
+        day
+    ) -> SlotColumns:
+        """Slots of one day from its loaded schedules (None for an employee not working) and booked spans"""
+        schedules = [schedule for schedule in schedules if schedule]
+        return self._columns_for_days(
+            schedules, self._group_spans(spans), service_duration, [day], self.slot_engine
+        )
+
+    def _range_columns(
+        self,
+        schedules: List[Dict],
+        spans: List[BookingSpan],
+        service_duration: int,
+        first_day,
+        last_day,
+        slot_engine: Optional[str] = None
+    ) -> SlotColumns:
+        """Slots of every day from first_day to last_day from the schedules and spans loaded for the range"""
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        return self._columns_for_days(
+            schedules, self._group_spans(spans), service_duration, days, slot_engine or self.slot_engine
+        )
+
+    def _add_next_available(
+        self,
+        found: SlotColumns,
+        schedules: List[Dict],
+        spans: List[BookingSpan],
+        window: Tuple,
+        not_before: datetime,
+        limit: int
+    ):
+        """Add a search window's slots at or after not_before to found, day by day, until it holds limit slots"""
+        booked = self._group_spans(spans)
+        day, window_end = window
+        while schedules and day <= window_end and len(found) < limit:
+            found.extend(self._columns_for_days(
+                schedules, booked, found.duration_minutes, [day], 'interval'
+            ).since(not_before))
+            day += timedelta(days=1)
+
+    def invalidate(self, date: datetime, employee_id: Optional[int] = None):
+        """
+        Mark the cached availability a booking change can affect as stale: entries
+        for that employee on that date and the all-employees entries for the date.
+        Without an employee every entry for the date is invalidated. With a shared
+        backend this applies to every process using it.
+        """
+        day = _as_date(date)
+        if employee_id:
+            self._cache.bump([(day, employee_id), (day, None)])
+        else:
+            self._cache.bump([(day, DAY_WIDE)])
+        self._durations_cache.clear()
+
+    def clear_cache(self):
+        """Clear the availability cache"""
+        self._cache.clear()
+        self._durations_cache.clear()
+        self.schedule_index.mark_stale()
+        self._bookings_cache.clear()
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Hit-rate and eviction metrics for each cache"""
+        return {
+            'slots': self._cache.stats(),
+            'schedule_index': {'loads': self.schedule_index.loads},
+            'bookings': self._bookings_cache.stats()
+        }
+
+class AvailabilityService(AvailabilityBase):
+    def __init__(
+        self,
+        session: Session,
+        slot_granularity_minutes: int = 15,
+        slot_engine: str = 'interval',
+        cache_maxsize: int = 1024,
+        cache_ttl: timedelta = timedelta(minutes=5),
+        cache_backend: Optional[CacheBackend] = None,
+        use_materialized: bool = False,
+        schedule_index: Optional[ScheduleIndex] = None
+    ):
+        super().__init__(
+            session.get_bind(), slot_granularity_minutes, slot_engine,
+            cache_maxsize, cache_ttl, cache_backend, schedule_index
+        )
+        self.session = session
+        self.schedule_repo = SQLAlchemyScheduleRepository(session, self.schedule_index)
+        self.booking_repo = SQLAlchemyBookingRepository(session)
+        # Read availability of materialized days from the free_intervals table
+        self.free_slot_store = FreeSlotStore(session, self) if use_materialized else None
+
+    def _get_employee_schedule(self, employee_id: int, date: datetime) -> Optional[Dict]:
+        """Get the employee schedule in effect on a date"""
+        day = _as_date(date)
+        return self.schedule_repo.get_employee_schedule(employee_id, day.weekday(), day)
+
+    def _get_booking_spans(
+        self,
+        date: datetime,
+        employee_id: Optional[int] = None,
+        versions: Optional[Tuple[int, ...]] = None
+    ) -> List[BookingSpan]:
+        """Get booked spans for a date with caching, keyed by the scope versions so invalidation applies"""
+        day = _as_date(date)
+        if versions is None:
+            versions = self._cache.versions(self._cache_scopes((day, employee_id or None)))
+        employee_ids = [employee_id] if employee_id else None
+        loader = lambda: self.booking_repo.get_booking_spans(*self._day_bounds(day), employee_ids)
+        return self._bookings_cache.get_or_load((day, employee_id or None, versions), loader)
+
+    def _get_service_durations(self, service_id: Optional[int] = None) -> Dict[int, int]:
+        """Load the duration of every service in one query, again once the map expires or lacks service_id"""
+        durations = self._cached_durations(service_id)
+        if durations is None:
+            durations = dict(self.session.query(Service.id, Service.duration_minutes).all())
+            self._durations_cache.set(SERVICE_DURATIONS, durations)
+        return durations
+
+    def is_slot_free(self, employee_id: int, start: datetime, end: datetime) -> bool:
+        """
+        Whether the employee works from start to end and has no confirmed
+        booking overlapping it: one indexed overlap query (the schedule comes
+        from the in-memory index), however long the day or fine the slots.
+        """
+        if not self._within_schedule(self._get_employee_schedule(employee_id, start), start, end):
+            return False
+        earliest_start = self._earliest_overlapping_start(start, self._get_service_durations())
+        return not self.booking_repo.has_overlapping_booking(employee_id, start, end, earliest_start)
+
+    def get_slot_columns(
         self,
         date: datetime,
         service_id: int,
         employee_id: Optional[int] = None
-    ) -> List[Dict]:
-        """Get available time slots for a specific date and service"""
-        cache_key = self._get_cache_key(date, employee_id)
-        
+    ) -> SlotColumns:
+        """
+        Available slots for a date and service in compact form. The caller
+        gets its own copy, so changing it never touches the cached entry.
+        """
+        cache_key = self._get_cache_key(date, employee_id, service_id)
+
         # Check cache first
         cached_slots = self._get_cached_availability(cache_key)
         if cached_slots is not None:
-            return cached_slots
+            return cached_slots.copy()
+
+        # Read the versions before loading anything, so a booking committed
+        # while we compute leaves this entry stale rather than wrongly fresh
+        versions = self._cache.versions(self._cache_scopes(cache_key))
 
         # Get service duration
-        service = self.session.get(Service, service_id)
-        if not service:
+        service_duration = self._get_service_durations(service_id).get(service_id)
+        if service_duration is None:
+            return SlotColumns(0)
+
+        # Materialized days are a single indexed read of free intervals
+        available_slots = None
+        if self.free_slot_store is not None:
+            available_slots = self.free_slot_store.get_slot_columns(
+                _as_date(date), service_duration, employee_id, self.slot_granularity_minutes
+            )
+
+        if available_slots is None:
+            available_slots = self._compute_slots(
+                date,
+                service_duration,
+                employee_id,
+                self._get_booking_spans(date, employee_id, versions)
+            )
+
+        # Update cache
+        self._update_cache(cache_key, available_slots, versions)
+
+        return available_slots.copy()
+
+    def get_available_slots(
+        self,
+        date: datetime,
+        service_id: int,
+        employee_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Get available time slots for a specific date and service"""
+        return self.get_slot_columns(date, service_id, employee_id).to_dicts()
+
+    def compute_available_slots(
+        self,
+        date: datetime,
+        service_id: int,
+        employee_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Compute available slots from schedules and bookings, bypassing every cache and the materialized store"""
+        service_duration = self._get_service_durations(service_id).get(service_id)
+        if service_duration is None:
             return []
-        
+        spans = self.booking_repo.get_booking_spans(
+            *self._day_bounds(_as_date(date)), [employee_id] if employee_id else None
+        )
+        return self._compute_slots(date, service_duration, employee_id, spans).to_dicts()
+
+    def _compute_slots(
+        self,
+        date: datetime,
+        service_duration: int,
+        employee_id: Optional[int],
+        spans: List[BookingSpan]
+    ) -> SlotColumns:
+        """Compute available slots for the schedules of a day"""
+        day = _as_date(date)
         # Get employee schedules
         if employee_id:
-            schedules = [self._get_employee_schedule(employee_id, date)]
+            schedules = [self._get_employee_schedule(employee_id, day)]
         else:
-            schedules = self.schedule_repo.get_all_schedules_for_day(date.weekday())
-
-        # Get existing bookings
-        existing_bookings = self._get_bookings_for_date(date, employee_id)
-
-        # Find available slots
-        available_slots = []
-        for schedule in schedules:
-            slots = self._find_available_slots(
-                schedule,
-                existing_bookings,
-                service.duration_minutes,
-                date
-            )
-            available_slots.extend(slots)
+            schedules = self.schedule_repo.get_all_schedules_for_day(day.weekday(), day)
+        return self._day_columns(schedules, spans, service_duration, day)
 
-        # Sort slots by start time
-        available_slots.sort(key=lambda x: x['start_time'])
+    def find_next_available(
+        self,
+        service_id: int,
+        after: datetime,
+        limit: int = 5,
+        employee_id: Optional[int] = None,
+        horizon_days: int = 90
+    ) -> List[Dict]:
+        """
+        Find the next `limit` available slots starting at or after `after`.
+        Scans forward in windows that double in size (7, 14, 28... days), each
+        loaded with one schedule query and one booking query, and stops as
+        soon as enough slots are found or horizon_days is reached.
+        """
+        service_duration = self._get_service_durations(service_id).get(service_id)
+        if service_duration is None or limit <= 0:
+            return []
 
-        # Update cache
-        self._update_cache(cache_key, available_slots)
+        not_before = self._not_before(after)
+        employee_ids = [employee_id] if employee_id else None
+        available_slots = SlotColumns(service_duration)
+        for window in self._search_windows(not_before.date(), horizon_days):
+            if len(available_slots) >= limit:
+                break
+            schedules = self.schedule_repo.get_schedules_in_range(*window, employee_ids)
+            spans = self.booking_repo.get_booking_spans(
+                *self._range_bounds(*window), employee_ids
+            ) if schedules else []
+            self._add_next_available(available_slots, schedules, spans, window, not_before, limit)
 
-        return available_slots
+        return available_slots.head(limit).to_dicts()
 
-    def clear_cache(self):
-        """Clear the availability cache"""
-        self._cache.clear()
-        self._get_employee_schedule.cache_clear()
-        self._get_bookings_for_date.cache_clear() 
\ No newline at end of file
+    def get_slot_columns_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        service_id: int,
+        employee_ids: Optional[List[int]] = None,
+        slot_engine: Optional[str] = None
+    ) -> SlotColumns:
+        """get_available_slots_range in compact form"""
+        service_duration = self._get_service_durations(service_id).get(service_id)
+        if service_duration is None:
+            return SlotColumns(0)
+
+        first_day, last_day = _as_date(start_date), _as_date(end_date)
+        schedules = self.schedule_repo.get_schedules_in_range(first_day, last_day, employee_ids)
+        if not schedules:
+            return SlotColumns(service_duration)
+        spans = self.booking_repo.get_booking_spans(*self._range_bounds(first_day, last_day), employee_ids)
+        return self._range_columns(schedules, spans, service_duration, first_day, last_day, slot_engine)
+
+    def get_available_slots_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        service_id: int,
+        employee_ids: Optional[List[int]] = None,
+        slot_engine: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Get available time slots for every day from start_date to end_date inclusive.
+        Schedules (respecting their start_date/end_date) and confirmed bookings for
+        the whole range are loaded in two queries and slots are computed in memory.
+        """
+        return self.get_slot_columns_range(start_date, end_date, service_id, employee_ids, slot_engine).to_dicts()
+
+    def get_available_slots_for_week(self, start_date: datetime, service_id: int, days: int = 7) -> List[Dict]:
+        """Get available time slots for all employees over several days in one bitmap computation"""
+        return self.get_available_slots_range(*self._week_range(start_date, days), service_id, slot_engine='bitmap')
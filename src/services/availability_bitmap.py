@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from math import gcd
+from typing import List, Dict, Tuple, Optional, Sequence
+from src.core.values import MINUTES_PER_DAY, SlotColumns
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency (pip install .[bitmap])
+    np = None
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The bitmap availability engine requires numpy: pip install numpy")
+
+def _minutes(value: datetime, day: datetime) -> int:
+    """Minutes between midnight of day and value, clipped to the day"""
+    minutes = (value - day) // timedelta(minutes=1)
+    return min(max(minutes, 0), MINUTES_PER_DAY)
+
+def find_slots_bitmap(
+    rows: List[Dict],
+    duration_minutes: int,
+    granularity_minutes: int = 15,
+    resolution_minutes: Optional[int] = None
+) -> List[Dict]:
+    """
+    Find slots for many employee-days at once.
+
+    Each row is a dict with 'employee_id', 'start' and 'end' (datetimes bounding
+    the working window on one day) and 'booked' (a list of (start, end) ranges).
+    See bitmap_slot_columns for how slots are found.
+    """
+    _require_numpy()
+    days = [datetime.combine(row['start'].date(), datetime.min.time()) for row in rows]
+    return bitmap_slot_columns(
+        [day.toordinal() for day in days],
+        [row['employee_id'] for row in rows],
+        [(_minutes(row['start'], day), _minutes(row['end'], day)) for row, day in zip(rows, days)],
+        [[(_minutes(start, day), _minutes(end, day)) for start, end in row['booked']] for row, day in zip(rows, days)],
+        duration_minutes,
+        granularity_minutes,
+        resolution_minutes
+    ).to_dicts()
+
+def bitmap_slot_columns(
+    day_ordinals: Sequence[int],
+    employee_ids: Sequence[int],
+    windows: Sequence[Tuple[int, int]],
+    booked: Sequence[Sequence[Tuple[int, int]]],
+    duration_minutes: int,
+    granularity_minutes: int = 15,
+    resolution_minutes: Optional[int] = None
+) -> SlotColumns:
+    """
+    Find slots for many employee-days at once, on minute offsets.
+
+    Row i is the working window (start, end minutes of the day) of employee
+    employee_ids[i] on day day_ordinals[i], with its booked minute ranges.
+    The rows are laid out as an employees x minute-buckets occupancy bitmap and a
+    sliding-window sum finds every bucket where the whole service fits.
+
+    When resolution_minutes is None the greatest common divisor of every time
+    involved is used, which makes the result identical to the interval engine.
+    A coarser resolution is faster but conservative: partly booked buckets count
+    as busy.
+    """
+    _require_numpy()
+    columns = SlotColumns(duration_minutes)
+    if not windows:
+        return columns
+
+    window_start = np.array([start for start, _ in windows], dtype=np.int64)
+    window_end = np.array([end for _, end in windows], dtype=np.int64)
+
+    booking_rows, booking_start, booking_end = [], [], []
+    for index, ranges in enumerate(booked):
+        for start, end in ranges:
+            booking_rows.append(index)
+            booking_start.append(min(max(start, 0), MINUTES_PER_DAY))
+            booking_end.append(min(max(end, 0), MINUTES_PER_DAY))
+    booking_rows = np.array(booking_rows, dtype=np.int64)
+    booking_start = np.array(booking_start, dtype=np.int64)
+    booking_end = np.array(booking_end, dtype=np.int64)
+
+    if resolution_minutes is None:
+        resolution_minutes = gcd(gcd(duration_minutes, granularity_minutes), MINUTES_PER_DAY)
+        for values in (window_start, window_end, booking_start, booking_end):
+            if values.size:
+                resolution_minutes = gcd(resolution_minutes, int(np.gcd.reduce(values)))
+    resolution = resolution_minutes
+    buckets = -(-MINUTES_PER_DAY // resolution)
+    bucket_minutes = np.arange(buckets) * resolution
+
+    # A bucket is inside the working window only if it is covered completely
+    in_window = (
+        (bucket_minutes[None, :] >= window_start[:, None]) &
+        (bucket_minutes[None, :] + resolution <= window_end[:, None])
+    )
+
+    # Mark booked buckets with a difference array: +1 where a booking starts,
+    # -1 where it ends, then a running sum gives the occupancy
+    occupancy = np.zeros((len(windows), buckets + 1), dtype=np.int32)
+    valid = booking_end > booking_start
+    np.add.at(occupancy, (booking_rows[valid], booking_start[valid] // resolution), 1)
+    np.add.at(occupancy, (booking_rows[valid], -(-booking_end[valid] // resolution)), -1)
+    booked = np.cumsum(occupancy, axis=1)[:, :buckets] > 0
+
+    free = in_window & ~booked
+
+    # Sliding-window reduction: a start bucket fits when the next `width`
+    # buckets are all free
+    width = -(-duration_minutes // resolution)
+    if width > buckets:
+        return columns
+    free_count = np.zeros((len(windows), buckets + 1), dtype=np.int32)
+    np.cumsum(free, axis=1, out=free_count[:, 1:])
+    fits = (free_count[:, width:] - free_count[:, :-width]) == width
+
+    # Only keep starts on the schedule-anchored granularity grid
+    starts = bucket_minutes[:fits.shape[1]]
+    offset = starts[None, :] - window_start[:, None]
+    fits &= (offset >= 0) & (offset % granularity_minutes == 0)
+
+    row_index, bucket_index = np.nonzero(fits)
+    day_ordinal = np.asarray(day_ordinals, dtype=np.int32)
+    order = np.lexsort((row_index, bucket_index, day_ordinal[row_index]))
+    row_index, bucket_index = row_index[order], bucket_index[order]
+
+    # The columns are filled straight from the arrays, without per-slot objects
+    columns.days.frombytes(day_ordinal[row_index].tobytes())
+    columns.employee_ids.frombytes(np.asarray(employee_ids, dtype=np.int32)[row_index].tobytes())
+    columns.start_minutes.frombytes((bucket_index * resolution).astype(np.int32).tobytes())
+    return columns
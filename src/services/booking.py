@@ -1,59 +1,115 @@
-from datetime import datetime
-from typing import Dict, Optional
+import functools
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, OperationalError
-from sqlalchemy import text
-from src.core.models import Booking, Service, EmployeeSchedule
-from availability import AvailabilityService
-import time
-import random
+from src.core.models import Booking, Service
+from src.core.values import BookingSpan
+from src.infrastructure.booking_constraints import is_overlap_error
+from src.infrastructure.database import SQLiteWriter, get_writer_for
+from src.infrastructure.schedule_index import effective_schedules
+from src.services.availability import AvailabilityService, _as_date
+from src.services.free_slots import FreeSlotStore
+
+def idempotency_key_for_message(message_id: Optional[str], raw_message: Optional[bytes] = None) -> Optional[str]:
+    """
+    Idempotency key for a booking requested by an email: its Message-ID, or a
+    digest of the raw message when it has none. Processing the same email
+    again yields the same key.
+    """
+    if message_id and message_id.strip().strip('<>').strip():
+        key = f"msgid:{message_id.strip().strip('<>').strip()}"
+        # Keep within the column; long ids are replaced by their digest
+        return key if len(key) <= 255 else f"msgid-sha256:{hashlib.sha256(key.encode()).hexdigest()}"
+    if raw_message:
+        return f"sha256:{hashlib.sha256(raw_message).hexdigest()}"
+    return None
+
+def _through_writer(method):
+    """
+    Run a BookingService write on its SQLite writer's thread and session, when
+    it has one, waiting for the result; the caller's session then ends its
+    read transaction so its next reads see the write.
+    """
+    @functools.wraps(method)
+    def write(self, *args, **kwargs):
+        if self.writer is None or self.writer.is_writer_thread():
+            return method(self, *args, **kwargs)
+        result = self.writer.run(lambda session: method(BookingService(session, self.writer), *args, **kwargs))
+        self.session.commit()
+        return result
+    return write
 
 class BookingService:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, writer: Optional[SQLiteWriter] = None):
         self.session = session
+        # On the process-wide SQLite file database every write goes through
+        # the single writer (see get_writer_for), so concurrent bookings wait
+        # in a queue instead of failing with "database is locked". The
+        # caller's session must not hold uncommitted writes of its own
+        self.writer = writer or get_writer_for(session)
         self.availability_service = AvailabilityService(session)
-        self.max_retries = 3
-        self.retry_delay = 0.1  # seconds
+        self.free_slot_store = FreeSlotStore(session, self.availability_service)
 
-    def _acquire_lock(self, employee_id: int, appointment_time: datetime) -> bool:
-        """Try to acquire a lock for the time slot"""
-        try:
-            # Use advisory lock for PostgreSQL
-            if 'postgresql' in str(self.session.get_bind().url):
-                lock_id = hash(f"{employee_id}_{appointment_time.isoformat()}")
-                result = self.session.execute(
-                    text("SELECT pg_try_advisory_xact_lock(:lock_id)"),
-                    {"lock_id": lock_id}
-                ).scalar()
-                return result
-            return True
-        except Exception:
-            return False
-
-    def _wait_for_lock(self, employee_id: int, appointment_time: datetime) -> bool:
-        """Wait for lock with exponential backoff"""
-        for attempt in range(self.max_retries):
-            if self._acquire_lock(employee_id, appointment_time):
-                return True
-            # Exponential backoff with jitter
-            delay = (self.retry_delay * (2 ** attempt)) + (random.random() * 0.1)
-            time.sleep(delay)
-        return False
+    @staticmethod
+    def _to_dict(booking) -> Dict:
+        return {
+            'id': booking.id,
+            'customer_id': booking.customer_id,
+            'employee_id': booking.employee_id,
+            'service_id': booking.service_id,
+            'appointment_time': booking.appointment_time,
+            'status': booking.status,
+            'notes': booking.notes,
+            'idempotency_key': booking.idempotency_key
+        }
+
+    @staticmethod
+    def _select_bookings():
+        return select(
+            Booking.id, Booking.customer_id, Booking.employee_id, Booking.service_id,
+            Booking.appointment_time, Booking.status, Booking.notes, Booking.idempotency_key
+        )
+
+    def get_booking_by_idempotency_key(self, idempotency_key: str) -> Optional[Dict]:
+        """The booking created with this key, in one lookup on idx_booking_idempotency_key"""
+        row = self.session.execute(
+            self._select_bookings().where(Booking.idempotency_key == idempotency_key)
+        ).first()
+        return self._to_dict(row) if row else None
+
+    def _get_bookings_by_idempotency_keys(self, keys: Sequence[str]) -> Dict[str, Dict]:
+        if not keys:
+            return {}
+        rows = self.session.execute(self._select_bookings().where(Booking.idempotency_key.in_(keys)))
+        return {row.idempotency_key: self._to_dict(row) for row in rows}
 
+    @_through_writer
     def create_booking(
         self,
         customer_id: int,
         employee_id: int,
         service_id: int,
         appointment_time: datetime,
-        notes: Optional[str] = None
+        notes: Optional[str] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """
-        Create a new booking with transaction handling, validation, and lock management.
+        Create a new booking with transaction handling and validation.
         Returns the created booking or raises an exception if validation fails.
+        A concurrent overlapping booking is rejected by the database when the
+        row is inserted (see booking_constraints), so no lock is taken.
+
+        With an idempotency_key, a booking already created with that key is
+        returned as is (whatever the other arguments), so a retried request
+        never books twice.
         """
-        if not self._wait_for_lock(employee_id, appointment_time):
-            raise ValueError("Could not acquire lock for the time slot")
+        if idempotency_key is not None:
+            existing = self.get_booking_by_idempotency_key(idempotency_key)
+            if existing is not None:
+                return existing
 
         try:
             # Start transaction
@@ -64,32 +120,14 @@ class BookingService:
             if not service or not service.is_active:
                 raise ValueError("Invalid or inactive service")
 
-            # Validate employee schedule
-            schedule = self.session.query(EmployeeSchedule).filter(
-                EmployeeSchedule.employee_id == employee_id,
-                EmployeeSchedule.day_of_week == appointment_time.weekday(),
-                EmployeeSchedule.start_date <= appointment_time.date(),
-                EmployeeSchedule.end_date >= appointment_time.date()
-            ).first()
-
+            # Validate employee schedule (from the in-memory schedule index)
+            schedule = self.availability_service._get_employee_schedule(employee_id, appointment_time)
             if not schedule:
                 raise ValueError("No valid schedule found for the specified time")
 
-            # Check if the time slot is still available
-            available_slots = self.availability_service.get_available_slots(
-                appointment_time,
-                service_id,
-                employee_id
-            )
-
-            slot_available = False
-            for slot in available_slots:
-                if (slot['start_time'] <= appointment_time and 
-                    slot['end_time'] >= appointment_time + service.duration_minutes):
-                    slot_available = True
-                    break
-
-            if not slot_available:
+            # Check the time is still free: one indexed overlap query
+            end_time = appointment_time + timedelta(minutes=service.duration_minutes)
+            if not self.availability_service.is_slot_free(employee_id, appointment_time, end_time):
                 raise ValueError("Requested time slot is no longer available")
 
             # Create the booking
@@ -97,33 +135,36 @@ class BookingService:
                 customer_id=customer_id,
                 employee_id=employee_id,
                 service_id=service_id,
-                schedule_id=schedule.id,
+                schedule_id=schedule['id'],
                 appointment_time=appointment_time,
                 status='confirmed',
-                notes=notes
+                notes=notes,
+                idempotency_key=idempotency_key
             )
 
             self.session.add(booking)
             self.session.flush()  # Flush to get the booking ID
 
-            # Clear availability cache for this date
-            self.availability_service.clear_cache()
+            # Keep materialized free intervals in step within the same transaction
+            self.free_slot_store.refresh(employee_id, appointment_time)
 
             # Commit the transaction
             self.session.commit()
 
-            return {
-                'id': booking.id,
-                'customer_id': booking.customer_id,
-                'employee_id': booking.employee_id,
-                'service_id': booking.service_id,
-                'appointment_time': booking.appointment_time,
-                'status': booking.status,
-                'notes': booking.notes
-            }
+            # Evict cached availability for this employee and date
+            self.availability_service.invalidate(appointment_time, employee_id)
+
+            return self._to_dict(booking)
 
         except IntegrityError as e:
             self.session.rollback()
+            if idempotency_key is not None and 'idempotency_key' in str(e.orig):
+                # A concurrent request with the same key committed first
+                existing = self.get_booking_by_idempotency_key(idempotency_key)
+                if existing is not None:
+                    return existing
+            if is_overlap_error(e):
+                raise ValueError("Requested time slot is no longer available")
             raise ValueError(f"Database integrity error: {str(e)}")
         except OperationalError as e:
             self.session.rollback()
@@ -132,9 +173,11 @@ class BookingService:
             self.session.rollback()
             raise ValueError(f"Error creating booking: {str(e)}")
 
+    @_through_writer
     def update_booking_status(self, booking_id: int, status: str) -> Dict:
         """
-        Update booking status with transaction handling and lock management.
+        Update booking status with transaction handling. Confirming a booking
+        whose time has been taken meanwhile is rejected by the database.
         Returns the updated booking or raises an exception if update fails.
         """
         try:
@@ -145,19 +188,18 @@ class BookingService:
             if not booking:
                 raise ValueError("Booking not found")
 
-            # Acquire lock for the booking
-            if not self._wait_for_lock(booking.employee_id, booking.appointment_time):
-                raise ValueError("Could not acquire lock for the booking")
-
             booking.status = status
             self.session.flush()
 
-            # Clear availability cache for this date
-            self.availability_service.clear_cache()
+            # Keep materialized free intervals in step within the same transaction
+            self.free_slot_store.refresh(booking.employee_id, booking.appointment_time)
 
             # Commit the transaction
             self.session.commit()
 
+            # Evict cached availability for this employee and date
+            self.availability_service.invalidate(booking.appointment_time, booking.employee_id)
+
             return {
                 'id': booking.id,
                 'status': booking.status,
@@ -170,7 +212,239 @@ class BookingService:
 
     def cancel_booking(self, booking_id: int) -> Dict:
         """
-        Cancel a booking with transaction handling and lock management.
+        Cancel a booking with transaction handling.
         Returns the cancelled booking or raises an exception if cancellation fails.
         """
-        return self.update_booking_status(booking_id, 'cancelled') 
\ No newline at end of file
+        return self.update_booking_status(booking_id, 'cancelled')
+
+    def _snapshot(self, requests: Sequence[Dict]):
+        """
+        Services, schedules and booked minutes covering every request, read
+        once: one query each, whatever the number of requests.
+        """
+        service_ids = {request['service_id'] for request in requests}
+        services = {
+            row.id: row for row in self.session.execute(
+                select(Service.id, Service.duration_minutes, Service.is_active).where(Service.id.in_(service_ids))
+            )
+        }
+        employee_ids = sorted({request['employee_id'] for request in requests})
+        first_day = min(_as_date(request['appointment_time']) for request in requests)
+        last_day = max(_as_date(request['appointment_time']) for request in requests)
+        availability = self.availability_service
+        schedules = availability.schedule_repo.get_schedules_in_range(first_day, last_day, employee_ids)
+        # Straight from the repository, like the database would see it now
+        booked = availability._group_spans(availability.booking_repo.get_booking_spans(
+            availability._day_bounds(first_day)[0], availability._day_bounds(last_day)[1], employee_ids
+        ))
+        return services, schedules, booked
+
+    @_through_writer
+    def create_bookings(self, requests: Sequence[Dict]) -> List[Dict]:
+        """
+        Create many bookings (e.g. a recurring appointment) in one transaction.
+
+        Each request is a dict of create_booking's arguments. All of them are
+        validated against one snapshot of schedules and bookings (earlier
+        requests of the batch included) and the accepted ones are written
+        with a single multi-row INSERT. Returns one outcome per request, in
+        order: {'status': 'booked' | 'existing' | 'rejected', 'booking', 'error'}.
+        'existing' is a booking already created with the request's
+        idempotency_key.
+        """
+        outcomes = [{'status': 'rejected', 'booking': None, 'error': None} for _ in requests]
+        if not requests:
+            return outcomes
+        try:
+            keys = [request['idempotency_key'] for request in requests if request.get('idempotency_key')]
+            existing = self._get_bookings_by_idempotency_keys(keys)
+            services, schedules, booked = self._snapshot(requests)
+
+            rows, accepted, first_with_key = [], [], {}
+            for index, request in enumerate(requests):
+                key = request.get('idempotency_key')
+                if key in existing:
+                    outcomes[index].update(status='existing', booking=existing[key])
+                    continue
+                if key in first_with_key:
+                    continue  # resolved below, to the booking of the first request with the key
+                schedule = next((
+                    schedule for schedule in effective_schedules(schedules, request['appointment_time'].date())
+                    if schedule['employee_id'] == request['employee_id']
+                ), None)
+                error = self._validate(request, services.get(request['service_id']), schedule, booked)
+                if error:
+                    outcomes[index]['error'] = error
+                    continue
+                if key:
+                    first_with_key[key] = index
+                accepted.append(index)
+                rows.append(self._booking_row(request, schedule))
+
+            if rows:
+                self._insert_bookings(rows, accepted, outcomes)
+                affected = {
+                    (outcomes[index]['booking']['employee_id'], outcomes[index]['booking']['appointment_time'].date())
+                    for index in accepted if outcomes[index]['status'] == 'booked'
+                }
+                # Keep materialized free intervals in step within the same transaction
+                for employee_id, day in affected:
+                    self.free_slot_store.refresh(employee_id, day)
+                self.session.commit()
+                for employee_id, day in affected:
+                    self.availability_service.invalidate(day, employee_id)
+
+            for index, request in enumerate(requests):
+                key = request.get('idempotency_key')
+                if key in first_with_key and first_with_key[key] != index:
+                    first = outcomes[first_with_key[key]]
+                    outcomes[index].update(
+                        status='existing' if first['status'] == 'booked' else first['status'],
+                        booking=first['booking'], error=first['error']
+                    )
+            return outcomes
+
+        except Exception as e:
+            self.session.rollback()
+            raise ValueError(f"Error creating bookings: {str(e)}")
+
+    def _validate(self, request: Dict, service, schedule: Optional[Dict], booked: Dict) -> Optional[str]:
+        """Why a request cannot be booked in the snapshot, or None after reserving its time there"""
+        if service is None or not service.is_active:
+            return "Invalid or inactive service"
+        if schedule is None:
+            return "No valid schedule found for the specified time"
+        span = BookingSpan.from_row(request['employee_id'], request['appointment_time'], service.duration_minutes)
+        window_start, window_end = self.availability_service._window(schedule)
+        busy = booked.setdefault((span.employee_id, span.day_ordinal), [])
+        if span.start_minute < window_start or span.end_minute > window_end or any(
+                span.start_minute < end and start < span.end_minute for start, end in busy):
+            return "Requested time slot is no longer available"
+        busy.append((span.start_minute, span.end_minute))
+        return None
+
+    @staticmethod
+    def _booking_row(request: Dict, schedule: Dict) -> Dict:
+        return {
+            'customer_id': request['customer_id'],
+            'employee_id': request['employee_id'],
+            'service_id': request['service_id'],
+            'schedule_id': schedule['id'],
+            'appointment_time': request['appointment_time'],
+            'status': 'confirmed',
+            'notes': request.get('notes'),
+            'idempotency_key': request.get('idempotency_key')
+        }
+
+    def _insert_bookings(self, rows: List[Dict], accepted: List[int], outcomes: List[Dict]):
+        """
+        Insert the rows in one statement. When a concurrent writer has taken
+        one of the times (or used one of the keys) since the snapshot, the
+        batch is inserted again row by row in savepoints, so only the
+        conflicting requests are rejected.
+        """
+        # Accepted rows never share an employee and start time, which maps the
+        # returned ids back to rows without relying on RETURNING order
+        statement = insert(Booking).returning(Booking.id, Booking.employee_id, Booking.appointment_time)
+        statement = statement.execution_options(render_nulls=True)  # one multi-row INSERT, None values included
+        try:
+            with self.session.begin_nested():
+                ids = {
+                    (employee_id, appointment_time): booking_id
+                    for booking_id, employee_id, appointment_time in self.session.execute(statement, rows)
+                }
+        except IntegrityError:
+            ids = None
+        if ids is not None:
+            for index, row in zip(accepted, rows):
+                booking_id = ids[(row['employee_id'], row['appointment_time'])]
+                outcomes[index].update(status='booked', booking=self._inserted(booking_id, row))
+            return
+
+        for index, row in zip(accepted, rows):
+            try:
+                with self.session.begin_nested():
+                    booking_id = self.session.execute(statement, [row]).first()[0]
+                outcomes[index].update(status='booked', booking=self._inserted(booking_id, row))
+            except IntegrityError as e:
+                if row['idempotency_key'] and 'idempotency_key' in str(e.orig):
+                    existing = self.get_booking_by_idempotency_key(row['idempotency_key'])
+                    outcomes[index].update(status='existing', booking=existing)
+                elif is_overlap_error(e):
+                    outcomes[index]['error'] = "Requested time slot is no longer available"
+                else:
+                    outcomes[index]['error'] = f"Database integrity error: {str(e)}"
+
+    @staticmethod
+    def _inserted(booking_id: int, row: Dict) -> Dict:
+        booking = {'id': booking_id, **row}
+        del booking['schedule_id']
+        return booking
+
+    @_through_writer
+    def cancel_bookings(
+        self,
+        booking_ids: Optional[Sequence[int]] = None,
+        employee_id: Optional[int] = None,
+        customer_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Cancel every confirmed booking matching all the given criteria (e.g. an
+        employee's bookings from start to end, inclusive) with one UPDATE.
+        Returns one outcome per matching booking, and per requested id:
+        {'id', 'status': 'cancelled' | 'unchanged' | 'not_found', 'employee_id',
+        'appointment_time'}; 'unchanged' bookings were not confirmed.
+        """
+        if booking_ids is None and employee_id is None and customer_id is None and start is None and end is None:
+            raise ValueError("cancel_bookings needs at least one criterion")
+        try:
+            statement = select(Booking.id, Booking.employee_id, Booking.appointment_time, Booking.status)
+            if booking_ids is not None:
+                statement = statement.where(Booking.id.in_(booking_ids))
+            if employee_id is not None:
+                statement = statement.where(Booking.employee_id == employee_id)
+            if customer_id is not None:
+                statement = statement.where(Booking.customer_id == customer_id)
+            if start is not None:
+                statement = statement.where(Booking.appointment_time >= start)
+            if end is not None:
+                statement = statement.where(Booking.appointment_time <= end)
+            rows = self.session.execute(statement.order_by(Booking.appointment_time, Booking.id)).all()
+
+            confirmed = [row for row in rows if row.status == 'confirmed']
+            cancelled = set()
+            if confirmed:
+                result = self.session.execute(
+                    update(Booking).where(
+                        Booking.id.in_([row.id for row in confirmed]), Booking.status == 'confirmed'
+                    ).values(status='cancelled').returning(Booking.id)
+                )
+                cancelled = set(result.scalars())
+                affected = {(row.employee_id, row.appointment_time.date()) for row in confirmed if row.id in cancelled}
+                # Keep materialized free intervals in step within the same transaction
+                for affected_employee, day in affected:
+                    self.free_slot_store.refresh(affected_employee, day)
+                self.session.commit()
+                for affected_employee, day in affected:
+                    self.availability_service.invalidate(day, affected_employee)
+            else:
+                self.session.commit()
+
+            outcomes = [{
+                'id': row.id,
+                'status': 'cancelled' if row.id in cancelled else 'unchanged',
+                'employee_id': row.employee_id,
+                'appointment_time': row.appointment_time
+            } for row in rows]
+            found = {row.id for row in rows}
+            outcomes.extend(
+                {'id': booking_id, 'status': 'not_found', 'employee_id': None, 'appointment_time': None}
+                for booking_id in booking_ids or () if booking_id not in found
+            )
+            return outcomes
+
+        except Exception as e:
+            self.session.rollback()
+            raise ValueError(f"Error cancelling bookings: {str(e)}")
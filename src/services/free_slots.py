@@ -0,0 +1,196 @@
+from datetime import datetime, date, time, timedelta, timezone
+from typing import List, Dict, Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from src.core.models import MaterializedDay, FreeInterval, Service
+from src.core.values import SlotColumns, minute_of_day
+from src.services.intervals import merge_intervals, subtract_intervals, slot_start_minutes
+
+class FreeSlotStore:
+    """
+    Materialized per-employee-day free intervals.
+
+    Rows hold the gaps left in each schedule after confirmed bookings, so
+    availability for a materialized day is a single indexed range read.
+    Only days listed in materialized_days are maintained; BookingService
+    refreshes the affected employee-day inside its booking transaction.
+    """
+
+    def __init__(self, session: Session, availability_service=None):
+        # Imported here to avoid a circular import with AvailabilityService
+        from src.services.availability import AvailabilityService
+        self.session = session
+        self.availability_service = availability_service or AvailabilityService(session)
+
+    def _compute_rows(self, day: date, employee_id: Optional[int] = None) -> List[FreeInterval]:
+        """Compute free interval rows for a day from schedules and bookings"""
+        availability = self.availability_service
+        if employee_id:
+            schedules = [availability.schedule_repo.get_employee_schedule(employee_id, day.weekday(), day)]
+        else:
+            schedules = availability.schedule_repo.get_all_schedules_for_day(day.weekday(), day)
+        # Read straight from the repository: this runs inside booking
+        # transactions, before the cached spans are invalidated
+        booked = availability._group_spans(availability.booking_repo.get_booking_spans(
+            datetime.combine(day, time.min),
+            datetime.combine(day, time.max),
+            [employee_id] if employee_id else None
+        ))
+
+        midnight = datetime.combine(day, time.min)
+        rows = []
+        for schedule in schedules:
+            if not schedule:
+                continue
+            window = availability._window(schedule)
+            busy = merge_intervals(booked.get((schedule['employee_id'], day.toordinal()), []))
+            for gap_start, gap_end in subtract_intervals(window, busy):
+                rows.append(FreeInterval(
+                    employee_id=schedule['employee_id'],
+                    date=day,
+                    anchor_time=midnight + timedelta(minutes=window[0]),
+                    start_time=midnight + timedelta(minutes=gap_start),
+                    end_time=midnight + timedelta(minutes=gap_end)
+                ))
+        return rows
+
+    def is_materialized(self, day: date) -> bool:
+        return self.session.get(MaterializedDay, day) is not None
+
+    def refresh(self, employee_id: int, when: datetime):
+        """
+        Recompute the free intervals of one employee-day after a booking write.
+        Does nothing for days that are not materialized. Runs in the caller's
+        transaction and does not commit.
+        """
+        day = when.date() if isinstance(when, datetime) else when
+        if not self.is_materialized(day):
+            return
+        self.session.query(FreeInterval).filter(
+            FreeInterval.date == day,
+            FreeInterval.employee_id == employee_id
+        ).delete(synchronize_session=False)
+        self.session.add_all(self._compute_rows(day, employee_id))
+        self.session.flush()
+
+    def rebuild(self, start_date: date, end_date: date) -> int:
+        """Rebuild the free intervals of every employee for each day in the range. Returns rows written."""
+        written = 0
+        day = start_date
+        while day <= end_date:
+            self.session.query(FreeInterval).filter(
+                FreeInterval.date == day
+            ).delete(synchronize_session=False)
+            materialized = self.session.get(MaterializedDay, day)
+            if materialized is None:
+                self.session.add(MaterializedDay(date=day))
+            else:
+                materialized.built_at = datetime.now(timezone.utc)
+            self.session.flush()
+            rows = self._compute_rows(day)
+            self.session.add_all(rows)
+            written += len(rows)
+            day += timedelta(days=1)
+        self.session.commit()
+        return written
+
+    def drop(self, start_date: date, end_date: date):
+        """Stop maintaining the days in the range and delete their intervals"""
+        self.session.query(FreeInterval).filter(
+            FreeInterval.date >= start_date,
+            FreeInterval.date <= end_date
+        ).delete(synchronize_session=False)
+        self.session.query(MaterializedDay).filter(
+            MaterializedDay.date >= start_date,
+            MaterializedDay.date <= end_date
+        ).delete(synchronize_session=False)
+        self.session.commit()
+
+    def get_free_intervals(self, day: date, employee_id: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Read the free intervals of a day in one statement.
+        Returns None when the day is not materialized.
+        """
+        interval_filter = FreeInterval.date == MaterializedDay.date
+        if employee_id:
+            interval_filter = and_(interval_filter, FreeInterval.employee_id == employee_id)
+        rows = self.session.query(
+            MaterializedDay.date,
+            FreeInterval.employee_id,
+            FreeInterval.anchor_time,
+            FreeInterval.start_time,
+            FreeInterval.end_time
+        ).outerjoin(FreeInterval, interval_filter).filter(
+            MaterializedDay.date == day
+        ).order_by(FreeInterval.employee_id, FreeInterval.start_time).all()
+
+        if not rows:
+            return None
+        return [{
+            'employee_id': row.employee_id,
+            'anchor_time': row.anchor_time,
+            'start_time': row.start_time,
+            'end_time': row.end_time
+        } for row in rows if row.employee_id is not None]
+
+    def get_slot_columns(
+        self,
+        day: date,
+        service_duration: int,
+        employee_id: Optional[int] = None,
+        granularity_minutes: int = 15
+    ) -> Optional[SlotColumns]:
+        """Slots for a materialized day, or None when it has to be computed on the fly"""
+        intervals = self.get_free_intervals(day, employee_id)
+        if intervals is None:
+            return None
+        columns = SlotColumns(service_duration)
+        ordinal = day.toordinal()
+        for interval in intervals:
+            gap = (minute_of_day(interval['start_time']), minute_of_day(interval['end_time']))
+            columns.add(ordinal, interval['employee_id'], slot_start_minutes(
+                [gap], service_duration, granularity_minutes, minute_of_day(interval['anchor_time'])
+            ))
+        return columns.sorted()
+
+    def get_available_slots(
+        self,
+        day: date,
+        service_duration: int,
+        employee_id: Optional[int] = None,
+        granularity_minutes: int = 15
+    ) -> Optional[List[Dict]]:
+        """Slots for a materialized day as dicts, or None when it is not materialized"""
+        columns = self.get_slot_columns(day, service_duration, employee_id, granularity_minutes)
+        return columns.to_dicts() if columns is not None else None
+
+    def check_consistency(self, start_date: date, end_date: date, service_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Compare materialized availability with the on-the-fly computation for
+        every materialized day in the range. Returns one entry per mismatch.
+        """
+        availability = self.availability_service
+        durations = availability._get_service_durations()
+        if service_ids is None:
+            service_ids = [service_id for service_id, in self.session.query(Service.id).filter(Service.is_active.is_(True))]
+
+        order = lambda slot: (slot['start_time'], slot['employee_id'])
+        mismatches = []
+        days = [row.date for row in self.session.query(MaterializedDay).filter(
+            MaterializedDay.date >= start_date,
+            MaterializedDay.date <= end_date
+        ).order_by(MaterializedDay.date)]
+        for day in days:
+            for service_id in service_ids:
+                materialized = sorted(self.get_available_slots(
+                    day, durations[service_id], granularity_minutes=availability.slot_granularity_minutes
+                ), key=order)
+                expected = sorted(availability.compute_available_slots(day, service_id), key=order)
+                if materialized != expected:
+                    mismatches.append({
+                        'date': day,
+                        'service_id': service_id,
+                        'missing': [slot for slot in expected if slot not in materialized],
+                        'unexpected': [slot for slot in materialized if slot not in expected]
+                    })
+        return mismatches
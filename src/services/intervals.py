@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import List, Tuple, Iterable
+
+Interval = Tuple[datetime, datetime]
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge any that overlap or touch"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(window: Interval, busy: List[Interval]) -> List[Interval]:
+    """Return the free gaps left in window after removing merged busy intervals"""
+    window_start, window_end = window
+    gaps: List[Interval] = []
+    cursor = window_start
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        if busy_start >= window_end:
+            break
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    return gaps
+
+def slot_start_minutes(
+    gaps: List[Tuple[int, int]],
+    duration_minutes: int,
+    granularity_minutes: int,
+    anchor: int
+) -> List[int]:
+    """
+    Start minute of every slot of duration_minutes inside each gap.
+    Slot starts stay on the anchor + k * granularity grid, so the result matches
+    stepping through the whole schedule and testing every candidate.
+    """
+    starts: List[int] = []
+    for gap_start, gap_end in gaps:
+        first = anchor - ((anchor - gap_start) // granularity_minutes) * granularity_minutes
+        starts.extend(range(first, gap_end - duration_minutes + 1, granularity_minutes))
+    return starts
@@ -0,0 +1,72 @@
+import os
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+from src.core.models import Service
+from src.infrastructure.archiver import BookingArchiver
+from src.infrastructure.database import get_engine, get_router, get_session, get_session_factory
+from src.infrastructure.jobs import JobScheduler
+from src.infrastructure.partitioning import maintain_partitions
+from src.services.availability import AvailabilityService
+
+def _with_session(work: Callable, session_factory: Callable = get_session):
+    """A job running work(session) on a session of its own, closed afterwards"""
+    def job():
+        session = session_factory()
+        try:
+            return work(session)
+        finally:
+            session.close()
+    return job
+
+def archive_bookings(session, batch_size: int = 1000, sleep_seconds: float = 0.1):
+    return BookingArchiver(session, batch_size=batch_size, sleep_seconds=sleep_seconds).run()
+
+def warm_availability_cache(session, days: int = 2, today: Optional[date] = None) -> int:
+    """Compute (and so cache) every active service's availability for the next days. Returns entries warmed."""
+    availability = AvailabilityService(session)
+    service_ids = [service_id for (service_id,) in session.query(Service.id).filter(Service.is_active.is_(True))]
+    first = today or date.today()
+    for offset in range(days):
+        for service_id in service_ids:
+            availability.get_slot_columns(first + timedelta(days=offset), service_id)
+    return days * len(service_ids)
+
+def checkpoint_sqlite(engine=None):
+    """Fold the SQLite write-ahead log back into the database file, so it stays short"""
+    engine = engine or get_engine()
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").first()
+
+def register_default_jobs(scheduler: JobScheduler, engine=None) -> List[str]:
+    """
+    The application's periodic jobs: archiving at 02:00, partition
+    maintenance at 03:00, availability cache warming every 5 minutes, a SQLite
+    WAL checkpoint every 10 minutes and, with replicas, the replication
+    heartbeat every second.
+
+    The default availability cache lives in each process, so every process
+    warms its own; only the shared AVAILABILITY_CACHE_PATH cache is warmed by
+    one worker under a lease.
+    """
+    engine = engine or get_engine()
+    scheduler.add_job('archive_bookings', _with_session(archive_bookings), '0 2 * * *', lease_seconds=4 * 3600)
+    scheduler.add_job('warm_availability_cache', _with_session(warm_availability_cache), 300,
+                      lease_seconds=300, exclusive=bool(os.getenv('AVAILABILITY_CACHE_PATH')), run_immediately=True)
+    if engine.dialect.name == 'postgresql':
+        scheduler.add_job('maintain_partitions', lambda: maintain_partitions(engine), '0 3 * * *',
+                          run_immediately=True)
+    if engine.dialect.name == 'sqlite':
+        scheduler.add_job('checkpoint_sqlite', lambda: checkpoint_sqlite(engine), 600, exclusive=False)
+    router = get_router()
+    if router.replicas:
+        scheduler.add_job('replica_heartbeat', router.heartbeat, 1, exclusive=False)
+    return list(scheduler.metrics())
+
+def start_job_scheduler(use_leases: bool = True) -> JobScheduler:
+    """Start a JobScheduler running the default jobs; call stop() on it at shutdown"""
+    scheduler = JobScheduler(get_session_factory() if use_leases else None)
+    register_default_jobs(scheduler)
+    scheduler.start()
+    return scheduler
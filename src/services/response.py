@@ -15,10 +15,10 @@ class EmailResponseHandler(ResponseHandler):
             emp_id = slot['employee_id']
             if emp_id not in employee_slots:
                 employee_slots[emp_id] = {
-                    'name': slot['employee_name'],
+                    'name': slot.get('employee_name') or f"employee #{emp_id}",
                     'slots': []
                 }
-            employee_slots[emp_id]['slots'].append(slot['time'])
+            employee_slots[emp_id]['slots'].append(slot['start_time'])
         
         # Format response by employee
         for emp_id, data in employee_slots.items():
@@ -4,23 +4,45 @@ import pytest
 from pathlib import Path
 from datetime import datetime
 import uuid
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 # Add the project root directory to Python path
 project_root = str(Path(__file__).parent.parent)
 sys.path.insert(0, project_root)
 
 # Import after path setup
-from src.infrastructure.database import get_session
-from src.core.models import Customer, Service
+from src.infrastructure.database import init_db, get_session, dispose_engine
+from src.core.models import Base, Customer, Service
 from src.services.ai_responder import AIResponder
 from src.api.email_handler import EmailHandler
 
 @pytest.fixture(scope="session")
-def db_session():
-    """Database session fixture"""
+def db_session(tmp_path_factory):
+    """Database session fixture backed by a throwaway SQLite file"""
+    previous_url = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'appointments.db'}"
+    dispose_engine()
+    init_db()
     session = get_session()
     yield session
     session.close()
+    dispose_engine()
+    if previous_url is None:
+        os.environ.pop('DATABASE_URL', None)
+    else:
+        os.environ['DATABASE_URL'] = previous_url
+
+@pytest.fixture(scope="function")
+def memory_session():
+    """Isolated in-memory SQLite session with the full schema"""
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
 
 @pytest.fixture(autouse=True)
 def cleanup_database(db_session):
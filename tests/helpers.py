@@ -0,0 +1,55 @@
+"""Shared helpers for the database-backed tests."""
+from contextlib import contextmanager
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import event
+
+from src.core.models import Customer, Service, Employee, EmployeeSchedule, Booking
+
+DAY = date(2024, 6, 3)  # a Monday
+
+@contextmanager
+def count_queries(session):
+    """Count the SQL statements executed on the session's engine"""
+    statements = []
+    engine = session.get_bind()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def seed_day(session, employees, bookings_per_employee):
+    """Create employees working 09:00-17:00 on DAY, each with back-to-back bookings"""
+    offset = session.query(Employee).count()
+    services = [
+        Service(name='Haircut', duration_minutes=30, price=35),
+        Service(name='Manicure', duration_minutes=45, price=25),
+    ]
+    customer = Customer(email=f'seed{offset}@example.com', first_name='Seed', last_name='Customer')
+    session.add_all(services + [customer])
+    session.flush()
+    for index in range(offset, offset + employees):
+        employee = Employee(first_name='Employee', last_name=str(index), email=f'employee{index}@example.com')
+        session.add(employee)
+        session.flush()
+        schedule = EmployeeSchedule(
+            employee_id=employee.id, day_of_week=DAY.weekday(),
+            start_time=time(9, 0), end_time=time(17, 0),
+            start_date=DAY, end_date=DAY + timedelta(days=30)
+        )
+        session.add(schedule)
+        session.flush()
+        appointment_time = datetime.combine(DAY, time(9, 0))
+        for number in range(bookings_per_employee):
+            service = services[number % len(services)]
+            session.add(Booking(
+                customer_id=customer.id, employee_id=employee.id, service_id=service.id,
+                schedule_id=schedule.id, appointment_time=appointment_time, status='confirmed'
+            ))
+            appointment_time += timedelta(minutes=service.duration_minutes + 15)
+    session.commit()
+    return services
@@ -0,0 +1,53 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import insert
+
+from src.core.models import ArchivedBooking, ArchiveLog, Booking, Customer
+from src.infrastructure.archiver import BookingArchiver
+from src.services.availability import AvailabilityService
+from tests.helpers import DAY, seed_day
+
+def add_history(session, services, days, statuses=('completed', 'cancelled', 'confirmed')):
+    """One booking per status on each of the given days before DAY, at 09:00, 10:00, ..."""
+    customer_id = session.query(Customer.id).scalar()
+    session.execute(insert(Booking), [
+        {'customer_id': customer_id, 'employee_id': 1, 'service_id': services[0].id, 'schedule_id': 1,
+         'appointment_time': datetime.combine(DAY - timedelta(days=day), time(9 + number)), 'status': status}
+        for day in days for number, status in enumerate(statuses)
+    ])
+    session.commit()
+
+def test_archiver_moves_old_finished_bookings_in_batches(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=3)
+    add_history(memory_session, services, days=range(100, 110))
+    add_history(memory_session, services, days=[10])  # too recent
+    moved = {row.id: row for row in memory_session.query(Booking).filter(
+        Booking.appointment_time < datetime.combine(DAY, time.min) - timedelta(days=90),
+        Booking.status != 'confirmed'
+    )}
+    pauses = []
+    archiver = BookingArchiver(memory_session, batch_size=6, sleep_seconds=0.5, sleep=pauses.append)
+
+    report = archiver.run(before=datetime.combine(DAY, time.min) - timedelta(days=90))
+    assert report.rows_moved == len(moved) == 20 and report.batches == 4
+    assert pauses == [0.5] * 3
+    assert report.rows_per_second > 0
+    archived = memory_session.query(ArchivedBooking).order_by(ArchivedBooking.id).all()
+    assert [row.id for row in archived] == sorted(moved)
+    assert all(row.status in ('completed', 'cancelled') and row.customer_id for row in archived)
+    # Confirmed, recent and today's bookings stay
+    assert memory_session.query(Booking).count() == 3 + 10 + 3
+    assert memory_session.query(Booking).filter(Booking.id.in_(list(moved))).count() == 0
+    log = memory_session.query(ArchiveLog).one()
+    assert log.records_moved == 20 and log.error_message is None
+
+    # Nothing left to move; availability is unaffected
+    assert archiver.run(before=datetime.combine(DAY, time.min) - timedelta(days=90)).rows_moved == 0
+    assert AvailabilityService(memory_session).get_available_slots(DAY, services[0].id, 1)
+
+def test_archiver_stops_after_max_batches(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    add_history(memory_session, services, days=range(100, 105), statuses=('completed',))
+    archiver = BookingArchiver(memory_session, older_than=timedelta(days=90), batch_size=2)
+    assert archiver.run(before=datetime.combine(DAY, time.min), max_batches=2).rows_moved == 4
+    assert archiver.run(before=datetime.combine(DAY, time.min)).rows_moved == 1
+    assert memory_session.query(ArchiveLog).count() == 2
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from datetime import datetime, time, timedelta
+
+pytest.importorskip('aiosqlite')
+
+from src.core.models import Booking
+from src.infrastructure import database
+from src.services.async_availability import AsyncAvailabilityService
+from src.services.availability import AvailabilityService
+from tests.helpers import DAY, seed_day
+
+@pytest.fixture
+def seeded_database(tmp_path, monkeypatch):
+    """A SQLite file seeded through the synchronous engine, read through the async one"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    database.dispose_engine()
+    database.init_db()
+    session = database.get_session()
+    services = seed_day(session, employees=3, bookings_per_employee=4)
+    yield session, [service.id for service in services]
+    session.close()
+    asyncio.run(database.dispose_async_engine())
+    database.dispose_engine()
+
+def test_async_database_url_uses_async_drivers():
+    assert database.async_database_url('sqlite:///app.db') == 'sqlite+aiosqlite:///app.db'
+    assert database.async_database_url('postgresql://u:p@db/app') == 'postgresql+asyncpg://u:p@db/app'
+    assert database.async_database_url('postgresql+asyncpg://u:p@db/app') == 'postgresql+asyncpg://u:p@db/app'
+
+def test_async_service_matches_sync_service(seeded_database):
+    session, service_ids = seeded_database
+    sync = AvailabilityService(session)
+    expected = {
+        'day': sync.get_available_slots(DAY, service_ids[0]),
+        'employee': sync.get_available_slots(DAY, service_ids[1], 2),
+        'range': sync.get_available_slots_range(DAY, DAY + timedelta(days=7), service_ids[0]),
+        'next': sync.find_next_available(service_ids[0], datetime.combine(DAY, time(12, 0)), limit=4),
+        'free': [sync.is_slot_free(1, datetime.combine(DAY, time(hour)), datetime.combine(DAY, time(hour, 30)))
+                 for hour in range(8, 18)],
+    }
+
+    async def run():
+        async with database.get_async_session() as async_session:
+            availability = AsyncAvailabilityService(async_session)
+            return {
+                'day': await availability.get_available_slots(DAY, service_ids[0]),
+                'employee': await availability.get_available_slots(DAY, service_ids[1], 2),
+                'range': await availability.get_available_slots_range(DAY, DAY + timedelta(days=7), service_ids[0]),
+                'next': await availability.find_next_available(
+                    service_ids[0], datetime.combine(DAY, time(12, 0)), limit=4
+                ),
+                'computed': await availability.compute_available_slots(DAY, service_ids[0]),
+                'free': [await availability.is_slot_free(
+                    1, datetime.combine(DAY, time(hour)), datetime.combine(DAY, time(hour, 30))
+                ) for hour in range(8, 18)],
+            }
+
+    results = asyncio.run(run())
+    assert expected['day'] and expected['range'] and len(expected['next']) == 4
+    assert True in expected['free'] and False in expected['free']
+    for name, slots in expected.items():
+        assert results[name] == slots
+    assert results['computed'] == expected['day']
+
+def test_concurrent_requests_share_one_event_loop(seeded_database):
+    _, service_ids = seeded_database
+
+    async def request(employee_id):
+        async with database.get_async_session() as async_session:
+            # Uncached, so every request awaits its queries
+            return await AsyncAvailabilityService(async_session).compute_available_slots(DAY, service_ids[0], employee_id)
+
+    async def run():
+        return await asyncio.gather(*(request(employee_id) for employee_id in [1, 2, 3] * 10))
+
+    results = asyncio.run(run())
+    assert all(slots and slots == results[index % 3] for index, slots in enumerate(results))
+
+def test_sync_writes_invalidate_async_readers(seeded_database):
+    from src.services.booking import BookingService
+
+    session, service_ids = seeded_database
+    nine = datetime.combine(DAY, time(9, 0))
+
+    async def starts():
+        async with database.get_async_session() as async_session:
+            slots = await AsyncAvailabilityService(async_session).get_available_slots(DAY, service_ids[0], 1)
+            return [slot['start_time'] for slot in slots]
+
+    assert nine not in asyncio.run(starts())
+    booking = session.query(Booking).filter_by(employee_id=1, appointment_time=nine).one()
+    BookingService(session).cancel_booking(booking.id)
+    # Cached on the async engine, invalidated through the synchronous one
+    assert nine in asyncio.run(starts())
@@ -0,0 +1,444 @@
+import random
+import pytest
+from datetime import datetime, time, timedelta
+
+from src.core.models import Booking
+from src.services.availability import AvailabilityService
+from src.services.response import EmailResponseHandler
+from src.core.values import minute_of_day
+from src.services.intervals import merge_intervals, subtract_intervals, slot_start_minutes
+from tests.helpers import DAY, count_queries, seed_day
+
+def scan_slots(window, booked, duration_minutes, granularity_minutes=15):
+    """Reference implementation: step through the schedule and test every booking"""
+    start_time, end_time = window
+    slots = []
+    current_time = start_time
+    while current_time + timedelta(minutes=duration_minutes) <= end_time:
+        slot_end = current_time + timedelta(minutes=duration_minutes)
+        if not any(current_time < b_end and slot_end > b_start for b_start, b_end in booked):
+            slots.append({
+                'start_time': current_time,
+                'end_time': slot_end,
+                'duration_minutes': duration_minutes
+            })
+        current_time += timedelta(minutes=granularity_minutes)
+    return slots
+
+def interval_slots(window, booked, duration_minutes, granularity_minutes=15):
+    """The interval engine as get_slot_columns runs it: minute offsets of one day"""
+    day = window[0].replace(hour=0, minute=0)
+    minutes = lambda interval: (minute_of_day(interval[0]), minute_of_day(interval[1]))
+    gaps = subtract_intervals(minutes(window), merge_intervals(minutes(b) for b in booked))
+    return [{
+        'start_time': day + timedelta(minutes=start),
+        'end_time': day + timedelta(minutes=start + duration_minutes),
+        'duration_minutes': duration_minutes
+    } for start in slot_start_minutes(gaps, duration_minutes, granularity_minutes, minute_of_day(window[0]))]
+
+def test_merge_intervals_combines_overlapping_and_touching_ranges():
+    day = datetime(2024, 6, 3)
+    h = lambda hour, minute=0: day.replace(hour=hour, minute=minute)
+    merged = merge_intervals([(h(11), h(12)), (h(9), h(10)), (h(9, 30), h(10, 30)), (h(12), h(13))])
+    assert merged == [(h(9), h(10, 30)), (h(11), h(13))]
+
+def test_subtract_intervals_clips_to_window():
+    day = datetime(2024, 6, 3)
+    h = lambda hour, minute=0: day.replace(hour=hour, minute=minute)
+    gaps = subtract_intervals((h(9), h(17)), [(h(8), h(9, 30)), (h(12), h(13)), (h(16, 30), h(18))])
+    assert gaps == [(h(9, 30), h(12)), (h(13), h(16, 30))]
+
+@pytest.mark.parametrize("granularity", [5, 15, 30])
+def test_slot_start_minutes_matches_scan(granularity):
+    rng = random.Random(granularity)
+    day = datetime(2024, 6, 3)
+    for _ in range(200):
+        window = (day.replace(hour=rng.randint(6, 10), minute=rng.choice([0, 10, 15, 30])),
+                  day.replace(hour=rng.randint(14, 20), minute=rng.choice([0, 20, 45])))
+        booked = []
+        for _ in range(rng.randint(0, 12)):
+            start = day + timedelta(minutes=rng.randrange(5 * 60, 21 * 60, 5))
+            booked.append((start, start + timedelta(minutes=rng.choice([15, 30, 45, 60, 120]))))
+        duration = rng.choice([15, 30, 45, 60, 90])
+        assert interval_slots(window, booked, duration, granularity) == \
+            scan_slots(window, booked, duration, granularity)
+
+def test_bitmap_engine_matches_interval_engine_across_employees_and_days():
+    pytest.importorskip("numpy")
+    from src.services.availability_bitmap import find_slots_bitmap
+
+    rng = random.Random(7)
+    rows = []
+    for offset in range(7):
+        day = datetime(2024, 6, 3) + timedelta(days=offset)
+        for employee_id in range(1, 21):
+            start = day.replace(hour=rng.randint(7, 10), minute=rng.choice([0, 30]))
+            end = day.replace(hour=rng.randint(15, 19), minute=rng.choice([0, 15, 45]))
+            booked = []
+            for _ in range(rng.randint(0, 8)):
+                booking_start = day + timedelta(minutes=rng.randrange(6 * 60, 20 * 60, 5))
+                booked.append((booking_start, booking_start + timedelta(minutes=rng.choice([15, 30, 45, 60]))))
+            rows.append({'employee_id': employee_id, 'start': start, 'end': end, 'booked': booked})
+
+    expected = []
+    for row in rows:
+        for slot in interval_slots((row['start'], row['end']), row['booked'], 45, 15):
+            slot['employee_id'] = row['employee_id']
+            expected.append(slot)
+    expected.sort(key=lambda slot: slot['start_time'])
+
+    assert find_slots_bitmap(rows, 45, 15) == expected
+
+def test_bitmap_engine_with_coarse_resolution_never_offers_booked_time():
+    pytest.importorskip("numpy")
+    from src.services.availability_bitmap import find_slots_bitmap
+
+    day = datetime(2024, 6, 3)
+    booked = [(day.replace(hour=10, minute=7), day.replace(hour=10, minute=52))]
+    rows = [{'employee_id': 1, 'start': day.replace(hour=9), 'end': day.replace(hour=12), 'booked': booked}]
+    slots = find_slots_bitmap(rows, 30, 15, resolution_minutes=15)
+    assert [slot['start_time'].strftime('%H:%M') for slot in slots] == ['09:00', '09:15', '09:30', '11:00', '11:15', '11:30']
+
+@pytest.mark.parametrize("single_employee", [False, True])
+def test_availability_for_a_day_costs_a_constant_number_of_queries(memory_session, single_employee):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=1)
+    service_id = services[0].id
+    availability = AvailabilityService(memory_session)
+    with count_queries(memory_session) as light:
+        availability.get_available_slots(DAY, service_id, 1 if single_employee else None)
+
+    # Seeding bypasses BookingService, so invalidate the shared cache by hand
+    seed_day(memory_session, employees=20, bookings_per_employee=8)
+    availability.invalidate(DAY)
+    with count_queries(memory_session) as heavy:
+        slots = AvailabilityService(memory_session).get_available_slots(DAY, service_id, 3 if single_employee else None)
+
+    assert slots
+    # services, schedules and bookings: one statement each regardless of
+    # how many employees and bookings there are
+    assert len(heavy) == len(light) == 3
+
+def test_is_slot_free_is_one_indexed_overlap_query(memory_session):
+    seed_day(memory_session, employees=2, bookings_per_employee=3)  # 09:00-09:30, 09:45-10:30, 10:45-11:15
+    availability = AvailabilityService(memory_session, slot_granularity_minutes=1)
+    at = lambda hour, minute=0: datetime.combine(DAY, time(hour, minute))
+    assert availability.is_slot_free(1, at(9, 30), at(9, 45))
+    assert not availability.is_slot_free(1, at(9, 30), at(9, 50))
+    assert not availability.is_slot_free(1, at(10, 0), at(10, 15))    # inside the 45 minute booking
+    assert not availability.is_slot_free(1, at(8, 45), at(9, 0))      # before the working day
+    assert not availability.is_slot_free(1, at(16, 45), at(17, 15))   # after it
+    assert not availability.is_slot_free(1, at(12, 0) + timedelta(days=1), at(12, 30) + timedelta(days=1))
+    memory_session.query(Booking).filter_by(employee_id=1).update({'status': 'cancelled'})
+    memory_session.commit()
+
+    with count_queries(memory_session) as statements:
+        assert availability.is_slot_free(1, at(9, 0), at(10, 0))
+    assert len(statements) == 1
+    plan = memory_session.connection().exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + statements[0], (None,) * statements[0].count('?')
+    ).all()
+    assert 'idx_booking_employee_date' in str(plan)
+
+def test_booked_time_is_excluded_using_joined_durations(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=2)
+    slots = AvailabilityService(memory_session).get_available_slots(DAY, services[0].id, 1)
+    starts = [slot['start_time'].strftime('%H:%M') for slot in slots]
+    # 09:00-09:30 haircut, 09:45-10:30 manicure
+    assert starts[:3] == ['10:30', '10:45', '11:00']
+    assert all(slot['employee_id'] == 1 for slot in slots)
+
+def test_cache_is_keyed_by_service(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    availability = AvailabilityService(memory_session)
+    haircut = availability.get_available_slots(DAY, services[0].id, 1)
+    manicure = availability.get_available_slots(DAY, services[1].id, 1)
+    assert haircut[0]['duration_minutes'] == 30
+    assert manicure[0]['duration_minutes'] == 45
+
+def test_long_lived_service_sees_new_and_edited_services(memory_session):
+    from src.core.models import Service
+
+    seed_day(memory_session, employees=1, bookings_per_employee=0)
+    availability = AvailabilityService(memory_session)
+    assert availability.get_available_slots(DAY, 999, 1) == []
+
+    # A service added after the durations were loaded is found
+    massage = Service(id=999, name='Massage', duration_minutes=90, price=70)
+    memory_session.add(massage)
+    memory_session.commit()
+    slots = availability.get_available_slots(DAY, massage.id, 1)
+    assert len(slots) == len(AvailabilityService(memory_session).get_available_slots(DAY, massage.id, 1)) > 0
+
+    # An edited duration is used once the cached availability of the day is invalidated
+    massage.duration_minutes = 120
+    memory_session.commit()
+    availability.invalidate(DAY)
+    assert {slot['duration_minutes'] for slot in availability.get_available_slots(DAY, massage.id, 1)} == {120}
+
+def test_booking_change_only_evicts_overlapping_cache_entries(memory_session):
+    from src.services.booking import BookingService
+
+    services = seed_day(memory_session, employees=2, bookings_per_employee=1)
+    service_ids = [service.id for service in services]
+    booking_service = BookingService(memory_session)
+    availability = booking_service.availability_service
+    next_week = DAY + timedelta(days=7)
+    for service_id in service_ids:
+        for employee_id in (1, 2, None):
+            availability.get_available_slots(DAY, service_id, employee_id)
+        availability.get_available_slots(next_week, service_id, 1)
+
+    booking = memory_session.query(Booking).filter_by(employee_id=1).first()
+    booking_service.cancel_booking(booking.id)
+
+    cached = lambda key: availability._get_cached_availability(key) is not None
+    for service_id in service_ids:
+        assert not cached((DAY, 1, service_id))
+        assert not cached((DAY, None, service_id))
+        assert cached((DAY, 2, service_id))
+        assert cached((next_week, 1, service_id))
+
+    # The evicted entries are recomputed with the cancelled booking freed up
+    starts = [slot['start_time'] for slot in availability.get_available_slots(DAY, service_ids[0], 1)]
+    assert datetime.combine(DAY, time(9, 0)) in starts
+
+def test_services_in_one_process_share_cache_invalidation(memory_session):
+    from src.services.booking import BookingService
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=1)
+    service_id = services[0].id
+    # Stands in for the EmailHandler's service, created separately from BookingService's
+    availability = AvailabilityService(memory_session)
+    booking_service = BookingService(memory_session)
+    assert datetime.combine(DAY, time(9, 0)) not in \
+        [slot['start_time'] for slot in availability.get_available_slots(DAY, service_id, 1)]
+
+    booking = memory_session.query(Booking).filter_by(employee_id=1).first()
+    booking_service.cancel_booking(booking.id)
+    assert datetime.combine(DAY, time(9, 0)) in \
+        [slot['start_time'] for slot in availability.get_available_slots(DAY, service_id, 1)]
+
+def test_ttl_cache_bounds_expiry_and_metrics():
+    from src.infrastructure.cache import TTLCache
+
+    now = [0.0]
+    evicted = []
+    cache = TTLCache(maxsize=2, ttl_seconds=10, on_evict=evicted.append, clock=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # 'b' is least recently used
+    assert evicted == ['b']
+    assert cache.get('b') is None
+    now[0] = 11
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (1, 2, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+def test_availability_services_do_not_pin_sessions(memory_session):
+    import gc
+    import weakref
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=1)
+    availability = AvailabilityService(memory_session)
+    availability.get_available_slots(DAY, services[0].id, 1)
+    assert availability.cache_stats()['bookings']['misses'] == 1
+    reference = weakref.ref(availability)
+    del availability
+    gc.collect()
+    assert reference() is None
+
+def test_sqlite_cache_backend_is_shared_and_invalidated_across_instances(memory_session, tmp_path):
+    from src.infrastructure.cache import SQLiteCacheBackend
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=1)
+    path = str(tmp_path / 'availability_cache.db')
+    # Two services with their own backend objects stand in for two worker processes
+    first = AvailabilityService(memory_session, cache_backend=SQLiteCacheBackend(path))
+    second = AvailabilityService(memory_session, cache_backend=SQLiteCacheBackend(path))
+
+    slots = first.get_available_slots(DAY, services[0].id, 1)
+    assert second.get_available_slots(DAY, services[0].id, 1) == slots
+    assert second.cache_stats()['slots']['hits'] == 1
+
+    first.invalidate(DAY, 1)
+    second.get_available_slots(DAY, services[0].id, 1)
+    stats = second.cache_stats()['slots']
+    assert (stats['hits'], stats['misses'], stats['stale']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+def test_cache_versions_are_forgotten_once_their_entries_expired(tmp_path):
+    import sqlite3
+    from src.infrastructure.cache import MemoryCacheBackend, SQLiteCacheBackend
+
+    now = [0.0]
+    backend = MemoryCacheBackend(ttl_seconds=10, clock=lambda: now[0])
+    backend.set(('old day', 1, 5), 'slots', backend.versions([('old day', 1)]))
+    backend.bump([('old day', 1)])
+    now[0] = 5
+    backend.bump([('today', 1)])
+    assert backend.versions([('old day', 1), ('today', 1)]) == (1, 1)
+    now[0] = 11
+    backend.bump([('today', 2)])
+    # The entry recorded at version 0 expired along with the reason to keep version 1
+    assert backend._versions == {('today', 1): 1, ('today', 2): 1}
+    assert backend.get(('old day', 1, 5), [('old day', 1)]) is None
+
+    path = str(tmp_path / 'availability_cache.db')
+    backend = SQLiteCacheBackend(path, ttl_seconds=0)
+    backend.bump([('old day', 1)])
+    backend._prune(backend._connection())
+    assert backend.versions([('old day', 1)]) == (0,)
+    # Cache files from before bumped_at get the column and are pruned from now on
+    with sqlite3.connect(str(tmp_path / 'old_cache.db')) as conn:
+        conn.execute("CREATE TABLE cache_versions (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("INSERT INTO cache_versions VALUES ('scope', 3)")
+    backend = SQLiteCacheBackend(str(tmp_path / 'old_cache.db'), ttl_seconds=0)
+    backend._prune(backend._connection())
+    assert backend._connection().execute("SELECT COUNT(*) FROM cache_versions").fetchone()[0] == 0
+
+def test_find_next_available_skips_fully_booked_weeks(memory_session):
+    from src.core.models import Customer, EmployeeSchedule
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    schedule = memory_session.query(EmployeeSchedule).one()
+    schedule.end_date = DAY + timedelta(days=60)
+    customer = memory_session.query(Customer).one()
+    # Fill the working day of the next three Mondays with an eight hour booking
+    blocker = services[0].__class__(name='Full day', duration_minutes=8 * 60, price=0)
+    memory_session.add(blocker)
+    memory_session.flush()
+    for week in range(3):
+        memory_session.add(Booking(
+            customer_id=customer.id, employee_id=1, service_id=blocker.id, schedule_id=schedule.id,
+            appointment_time=datetime.combine(DAY + timedelta(weeks=week), time(9, 0)), status='confirmed'
+        ))
+    memory_session.commit()
+    service_id = services[0].id
+
+    availability = AvailabilityService(memory_session)
+    with count_queries(memory_session) as statements:
+        slots = availability.find_next_available(service_id, datetime.combine(DAY, time(12, 0)), limit=3)
+
+    first_free = datetime.combine(DAY + timedelta(weeks=3), time(9, 0))
+    assert [slot['start_time'] for slot in slots] == [
+        first_free, first_free + timedelta(minutes=15), first_free + timedelta(minutes=30)
+    ]
+    # Durations, the schedule index load, then bookings for the 7, 14 and 28 day windows
+    assert len(statements) == 5
+
+def test_find_next_available_respects_after_and_limit(memory_session):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=0)
+    availability = AvailabilityService(memory_session)
+    slots = availability.find_next_available(services[0].id, datetime.combine(DAY, time(16, 20)), limit=3)
+    assert [(slot['start_time'].strftime('%H:%M'), slot['employee_id']) for slot in slots] == [
+        ('16:30', 1), ('16:30', 2), ('09:00', 1)
+    ]
+    assert slots[2]['start_time'].date() == DAY + timedelta(weeks=1)
+
+@pytest.mark.parametrize("slot_engine", ['interval', 'bitmap'])
+def test_range_matches_per_day_queries_in_two_statements(memory_session, slot_engine):
+    if slot_engine == 'bitmap':
+        pytest.importorskip("numpy")
+    from src.core.models import EmployeeSchedule
+
+    services = seed_day(memory_session, employees=4, bookings_per_employee=5)
+    # Employee 4 only works the first two weeks
+    memory_session.query(EmployeeSchedule).filter_by(employee_id=4).update({'end_date': DAY + timedelta(days=13)})
+    memory_session.commit()
+    service_id = services[1].id
+    availability = AvailabilityService(memory_session, slot_engine=slot_engine)
+    availability._get_service_durations()
+    last_day = DAY + timedelta(days=27)
+
+    with count_queries(memory_session) as statements:
+        slots = availability.get_available_slots_range(DAY, last_day, service_id)
+    assert len(statements) == 2
+
+    expected = []
+    for offset in range(28):
+        day = DAY + timedelta(days=offset)
+        employees = [1, 2, 3] + ([4] if offset < 14 else [])
+        if day.weekday() == DAY.weekday():
+            for employee_id in employees:
+                expected.extend(availability.compute_available_slots(day, service_id, employee_id))
+    order = lambda slot: (slot['start_time'], slot['employee_id'])
+    assert slots == sorted(expected, key=order)
+    assert not [slot for slot in slots if slot['employee_id'] == 4 and slot['start_time'].date() >= DAY + timedelta(days=14)]
+
+def test_schedule_lookups_respect_validity_and_skip_sql_once_indexed(memory_session):
+    from src.core.models import EmployeeSchedule
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    service_id = services[0].id
+    # A temporary change for the second week, and an expired row that must be ignored
+    memory_session.add_all([
+        EmployeeSchedule(employee_id=1, day_of_week=DAY.weekday(), start_time=time(12, 0), end_time=time(14, 0),
+                         start_date=DAY + timedelta(days=7), end_date=DAY + timedelta(days=7)),
+        EmployeeSchedule(employee_id=1, day_of_week=DAY.weekday(), start_time=time(6, 0), end_time=time(7, 0),
+                         start_date=DAY - timedelta(days=60), end_date=DAY - timedelta(days=1)),
+    ])
+    memory_session.commit()
+    availability = AvailabilityService(memory_session)
+    availability._get_service_durations()
+
+    first_slot = lambda day, employee_id=None: availability.compute_available_slots(day, service_id, employee_id)[0]['start_time']
+    assert first_slot(DAY) == datetime.combine(DAY, time(9, 0))
+    with count_queries(memory_session) as statements:
+        assert first_slot(DAY + timedelta(days=7), 1) == datetime.combine(DAY + timedelta(days=7), time(12, 0))
+        assert first_slot(DAY + timedelta(days=14)) == datetime.combine(DAY + timedelta(days=14), time(9, 0))
+    # Only the bookings were read; schedules came from the index
+    assert all('employee_schedules' not in statement for statement in statements)
+
+    # Schedule writes in this process refresh the index
+    memory_session.query(EmployeeSchedule).filter_by(start_time=time(9, 0)).update({'start_time': time(10, 0)})
+    memory_session.commit()
+    assert first_slot(DAY) == datetime.combine(DAY, time(10, 0))
+
+def test_slot_columns_round_trip_and_stay_compact(memory_session):
+    import pickle
+    from src.core.values import BookingSpan, SlotColumns
+
+    services = seed_day(memory_session, employees=4, bookings_per_employee=5)
+    availability = AvailabilityService(memory_session)
+    columns = availability.get_slot_columns(DAY, services[0].id)
+    slots = availability.get_available_slots(DAY, services[0].id)
+
+    assert isinstance(columns, SlotColumns) and len(columns) == len(slots)
+    assert [slot.to_dict() for slot in columns] == slots
+    assert columns.since(datetime.combine(DAY, time(12, 0))).to_dicts() == \
+        [slot for slot in slots if slot['start_time'] >= datetime.combine(DAY, time(12, 0))]
+    assert pickle.loads(pickle.dumps(columns)) == columns
+    # Changing a returned result leaves the cached entry alone
+    columns.extend(columns)
+    assert availability.get_slot_columns(DAY, services[0].id).to_dicts() == slots
+    # Three 4-byte ints per slot
+    assert columns.start_minutes.itemsize * 3 * len(columns) < len(pickle.dumps(slots))
+
+    # Partial minutes count as booked
+    span = BookingSpan.from_row(1, datetime.combine(DAY, time(9, 0, 30)), 30)
+    assert (span.start_minute, span.end_minute) == (9 * 60, 9 * 60 + 31)
+
+def test_schedule_index_forgets_rolled_back_rows(memory_session):
+    from src.core.models import EmployeeSchedule
+
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    service_id = services[0].id
+    availability = AvailabilityService(memory_session)
+    tuesday = DAY + timedelta(days=1)
+    assert availability.compute_available_slots(tuesday, service_id) == []
+
+    memory_session.add(EmployeeSchedule(employee_id=1, day_of_week=tuesday.weekday(), start_time=time(9, 0),
+                                        end_time=time(12, 0), start_date=DAY, end_date=DAY + timedelta(days=30)))
+    memory_session.flush()
+    # The reload runs inside the uncommitted transaction and sees the row
+    assert availability.compute_available_slots(tuesday, service_id)
+    memory_session.rollback()
+    assert availability.compute_available_slots(tuesday, service_id) == []
+
+def test_availability_reply_lists_the_slots_by_employee(memory_session):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=0)
+    slots = AvailabilityService(memory_session).get_available_slots(DAY, services[0].id)
+    reply = EmailResponseHandler().handle_availability_request(DAY, slots)
+    assert "With employee #1:\n- 09:00\n" in reply and "With employee #2:\n" in reply
@@ -0,0 +1,235 @@
+import pytest
+from datetime import datetime, time, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+
+from src.core.models import Booking, Customer, Service
+from src.infrastructure.booking_constraints import install_booking_constraints, is_overlap_error
+from src.services.booking import BookingService, idempotency_key_for_message
+from tests.helpers import DAY, count_queries, seed_day
+
+def add_booking(session, services, start, service=0, employee_id=1, status='confirmed'):
+    booking = Booking(
+        customer_id=session.query(Customer.id).scalar(), employee_id=employee_id,
+        service_id=services[service].id, schedule_id=employee_id,
+        appointment_time=start, status=status
+    )
+    session.add(booking)
+    session.flush()
+    return booking
+
+def test_database_rejects_overlapping_confirmed_bookings(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    two_pm = datetime.combine(DAY, time(14, 0))
+    first = add_booking(memory_session, services, two_pm)
+    memory_session.commit()
+    memory_session.refresh(first)
+    assert first.end_time == two_pm + timedelta(minutes=30)
+
+    # Overlapping, including a 45 minute booking starting before it
+    for start, service in ((two_pm + timedelta(minutes=15), 0), (two_pm - timedelta(minutes=30), 1)):
+        with pytest.raises(IntegrityError) as error:
+            add_booking(memory_session, services, start, service)
+        assert is_overlap_error(error.value)
+        memory_session.rollback()
+
+    # Back to back, another employee, or not confirmed: accepted
+    add_booking(memory_session, services, two_pm + timedelta(minutes=30))
+    add_booking(memory_session, services, two_pm - timedelta(minutes=45), service=1)
+    add_booking(memory_session, services, two_pm, status='cancelled')
+    memory_session.commit()
+
+    # Cancelling frees the time; confirming again conflicts with its replacement
+    first.status = 'cancelled'
+    memory_session.commit()
+    replacement = add_booking(memory_session, services, two_pm)
+    memory_session.commit()
+    first.status = 'confirmed'
+    with pytest.raises(IntegrityError):
+        memory_session.flush()
+    memory_session.rollback()
+    assert replacement.status == 'confirmed'
+
+def test_create_booking_fails_fast_when_the_slot_was_just_taken(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    customer_id = memory_session.query(Customer.id).scalar()
+    two_pm = datetime.combine(DAY, time(14, 0))
+    booking_service = BookingService(memory_session)
+    # Cache the day's availability, then take 14:00 behind the cache's back
+    booking_service.availability_service.get_available_slots(DAY, services[0].id, 1)
+    memory_session.execute(insert(Booking), [{
+        'customer_id': customer_id, 'employee_id': 1, 'service_id': services[0].id, 'schedule_id': 1,
+        'appointment_time': two_pm, 'status': 'confirmed'
+    }])
+    memory_session.commit()
+
+    with pytest.raises(ValueError, match="no longer available"):
+        booking_service.create_booking(customer_id, 1, services[0].id, two_pm)
+    assert memory_session.query(Booking).count() == 1
+
+def test_install_backfills_existing_bookings(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=2)
+    # A database created before the constraints existed
+    for trigger in ('bookings_reserve_insert', 'bookings_reserve_update', 'bookings_reserve_delete'):
+        memory_session.execute(text(f"DROP TRIGGER {trigger}"))
+    memory_session.execute(text("DELETE FROM booking_cells"))
+    memory_session.execute(text("UPDATE bookings SET end_time = NULL"))
+    memory_session.commit()
+
+    install_booking_constraints(memory_session.connection())
+    memory_session.commit()
+    assert memory_session.query(Booking).filter(Booking.end_time.is_(None)).count() == 0
+    with pytest.raises(IntegrityError):
+        add_booking(memory_session, services, datetime.combine(DAY, time(9, 15)))
+    memory_session.rollback()
+
+def test_same_idempotency_key_returns_the_existing_booking(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    customer_id = memory_session.query(Customer.id).scalar()
+    two_pm = datetime.combine(DAY, time(14, 0))
+    booking_service = BookingService(memory_session)
+    service_id = services[0].id
+    key = idempotency_key_for_message('<CAF123@mail.example.com>')
+    first = booking_service.create_booking(customer_id, 1, service_id, two_pm, idempotency_key=key)
+
+    # A reprocessed email: one indexed lookup, no second booking
+    with count_queries(memory_session) as statements:
+        again = booking_service.create_booking(customer_id, 1, service_id, two_pm, idempotency_key=key)
+    assert again == first and len(statements) == 1
+    assert memory_session.query(Booking).count() == 1
+
+def test_concurrent_request_with_the_same_key_returns_the_winner(memory_session, monkeypatch):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    customer_id = memory_session.query(Customer.id).scalar()
+    booking_service = BookingService(memory_session)
+    key = idempotency_key_for_message(None, b'raw message without a Message-ID')
+    winner = booking_service.create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(14, 0)),
+                                            idempotency_key=key)
+    # The other request looked the key up before the winner committed
+    lookup = booking_service.get_booking_by_idempotency_key
+    results = iter([None])
+    monkeypatch.setattr(booking_service, 'get_booking_by_idempotency_key',
+                        lambda k: next(results, None) or lookup(k))
+    loser = booking_service.create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(15, 0)),
+                                           idempotency_key=key)
+    assert loser == winner
+    assert memory_session.query(Booking).count() == 1
+
+def test_idempotency_key_for_message():
+    assert idempotency_key_for_message(' <abc@example.com> ') == 'msgid:abc@example.com'
+    assert idempotency_key_for_message(None, b'raw') == idempotency_key_for_message('', b'raw')
+    assert idempotency_key_for_message(None) is None
+    assert len(idempotency_key_for_message('<' + 'x' * 400 + '@example.com>')) <= 255
+
+def test_create_bookings_validates_a_batch_against_one_snapshot(memory_session):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=2)  # 09:00-09:30, 09:45-10:30
+    customer_id = memory_session.query(Customer.id).scalar()
+    haircut, manicure = services[0].id, services[1].id
+    memory_session.query(Service).filter(Service.id == manicure).update({'is_active': False})
+    memory_session.commit()
+    request = lambda when, service=haircut, employee=1, **extra: dict(
+        customer_id=customer_id, employee_id=employee, service_id=service, appointment_time=when, **extra
+    )
+    two_pm = datetime.combine(DAY, time(14, 0))
+    weekly = [request(two_pm + timedelta(weeks=week), idempotency_key=f'weekly-{week}') for week in range(4)]
+    requests = weekly + [
+        request(datetime.combine(DAY, time(9, 15))),                   # overlaps a seeded booking
+        request(two_pm + timedelta(minutes=15), employee=1),           # overlaps the first of the batch
+        request(two_pm + timedelta(minutes=15), employee=2),           # another employee: fine
+        request(datetime.combine(DAY, time(16, 45))),                  # ends after the working day
+        request(two_pm + timedelta(days=1)),                           # no schedule on Tuesdays
+        request(datetime.combine(DAY, time(11, 0)), service=manicure),  # inactive service
+        request(two_pm, idempotency_key='weekly-0'),                   # repeats the first request
+    ]
+    booking_service = BookingService(memory_session)
+    with count_queries(memory_session) as statements:
+        outcomes = booking_service.create_bookings(requests)
+    assert [outcome['status'] for outcome in outcomes] == ['booked'] * 4 + [
+        'rejected', 'rejected', 'booked', 'rejected', 'rejected', 'rejected', 'existing'
+    ]
+    assert outcomes[4]['error'] == outcomes[5]['error'] == "Requested time slot is no longer available"
+    assert outcomes[8]['error'] == "No valid schedule found for the specified time"
+    assert outcomes[9]['error'] == "Invalid or inactive service"
+    assert outcomes[-1]['booking'] == outcomes[0]['booking']
+    assert sum(statement.startswith('INSERT INTO bookings') for statement in statements) == 1
+    assert memory_session.query(Booking).count() == 4 + 5
+
+    # Replaying the batch books nothing new
+    again = booking_service.create_bookings(weekly)
+    assert [outcome['booking'] for outcome in again] == [outcome['booking'] for outcome in outcomes[:4]]
+    assert {outcome['status'] for outcome in again} == {'existing'}
+
+def test_create_bookings_rejects_only_items_taken_since_the_snapshot(memory_session, monkeypatch):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    customer_id = memory_session.query(Customer.id).scalar()
+    two_pm = datetime.combine(DAY, time(14, 0))
+    add_booking(memory_session, services, two_pm)
+    memory_session.commit()
+    booking_service = BookingService(memory_session)
+    # A snapshot taken before the 14:00 booking was committed
+    monkeypatch.setattr(booking_service.availability_service.booking_repo, 'get_booking_spans', lambda *args: [])
+    outcomes = booking_service.create_bookings([
+        dict(customer_id=customer_id, employee_id=1, service_id=services[0].id, appointment_time=when)
+        for when in (two_pm - timedelta(hours=1), two_pm, two_pm + timedelta(hours=1))
+    ])
+    assert [outcome['status'] for outcome in outcomes] == ['booked', 'rejected', 'booked']
+    assert memory_session.query(Booking).count() == 3
+
+def test_cancel_bookings_cancels_matching_bookings_in_one_update(memory_session):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=3)
+    booking_service = BookingService(memory_session)
+    morning = booking_service.availability_service.get_available_slots(DAY, services[0].id, 1)
+    first_id, second_id = [booking.id for booking in memory_session.query(Booking).filter_by(employee_id=1)][:2]
+    booking_service.cancel_booking(first_id)
+
+    # Employee 1 calls in sick for the day
+    with count_queries(memory_session) as statements:
+        outcomes = booking_service.cancel_bookings(
+            employee_id=1, start=datetime.combine(DAY, time.min), end=datetime.combine(DAY, time.max)
+        )
+    assert [outcome['status'] for outcome in outcomes] == ['unchanged', 'cancelled', 'cancelled']
+    assert sum(statement.startswith('UPDATE bookings') for statement in statements) == 1
+    assert memory_session.query(Booking).filter_by(employee_id=1, status='confirmed').count() == 0
+    assert memory_session.query(Booking).filter_by(employee_id=2, status='confirmed').count() == 3
+    # The cached availability was invalidated
+    assert len(booking_service.availability_service.get_available_slots(DAY, services[0].id, 1)) > len(morning)
+
+    outcomes = booking_service.cancel_bookings(booking_ids=[second_id, 999])
+    assert [(outcome['id'], outcome['status']) for outcome in outcomes] == [(second_id, 'unchanged'), (999, 'not_found')]
+    with pytest.raises(ValueError):
+        booking_service.cancel_bookings()
+
+def test_email_pipeline_derives_the_same_key_for_the_same_message(monkeypatch):
+    from email.message import EmailMessage
+    from unittest.mock import patch
+    from src.api.email_handler import EmailHandler
+
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    handler = EmailHandler()
+    message = EmailMessage()
+    message['From'] = 'customer@example.com'
+    message['Subject'] = 'Booking'
+    message['Message-ID'] = '<CAF123@mail.example.com>'
+    message.set_content("I'd like to book an appointment on 2099-01-05 at 14:00")
+
+    # The same message fetched twice, as after a crash before it was marked seen
+    with patch('src.api.email_handler.IMAPClient') as imap_client:
+        server = imap_client.return_value.__enter__.return_value
+        server.search.return_value = [7]
+        server.fetch.return_value = {7: {b'RFC822': bytes(message)}}
+        emails = handler.fetch_unread_emails() + handler.fetch_unread_emails()
+    key = idempotency_key_for_message('<CAF123@mail.example.com>')
+    assert [email['idempotency_key'] for email in emails] == [key, key]
+
+    # process_email passes that key on with the booking it requests
+    booked = []
+    monkeypatch.setattr(handler.ai_responder, 'analyze_sentiment', lambda body: {})
+    monkeypatch.setattr(handler.ai_responder, 'extract_key_information', lambda body: {})
+    monkeypatch.setattr(handler.ai_responder, 'generate_response', lambda **kwargs: 'Thanks')
+    monkeypatch.setattr(handler.response_handler, 'handle_booking_request', lambda data: booked.append(data) or '')
+    monkeypatch.setattr(handler, '_log_interaction', lambda *args: None)
+    for email in emails:
+        handler.process_email(email['body'], email['from'], 'customer', email['idempotency_key'])
+    assert [data['idempotency_key'] for data in booked] == [key, key]
+    handler.session.close()
+    handler.read_session.close()
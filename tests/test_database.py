@@ -0,0 +1,141 @@
+import threading
+import pytest
+from sqlalchemy import event, inspect, text
+
+from src.infrastructure import database
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    """Point DATABASE_URL at a fresh SQLite file and reset the engine singleton around the test"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    database.dispose_engine()
+    yield
+    database.dispose_engine()
+
+def test_sessions_share_one_engine_and_skip_schema_creation(database_url):
+    first, second = database.get_session(), database.get_session()
+    assert first is not second
+    assert first.get_bind() is second.get_bind() is database.get_engine()
+    # Schema creation is the explicit bootstrap step
+    assert inspect(database.get_engine()).get_table_names() == []
+    database.init_db()
+    assert 'bookings' in inspect(database.get_engine()).get_table_names()
+    first.close()
+    second.close()
+
+    # Later sessions reuse the engine and run no DDL
+    statements = []
+    engine = database.get_engine()
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    for _ in range(10):
+        session = database.get_session()
+        assert session.get_bind() is engine
+        session.execute(text('SELECT 1'))
+        session.close()
+    assert database.get_engine() is engine
+    assert statements == ['SELECT 1'] * 10
+
+def test_pool_settings_come_from_the_environment(database_url, monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '3')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '2')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '60')
+    pool = database.get_engine().pool
+    assert (pool.size(), pool._max_overflow, pool._recycle, pool._pre_ping) == (3, 2, 60, True)
+
+def test_scoped_session_is_per_thread(database_url):
+    registry = database.get_scoped_session()
+    assert registry() is registry()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(registry()))
+    thread.start()
+    thread.join()
+    assert other[0] is not registry()
+    registry.remove()
+
+def test_sqlite_file_connections_use_the_performance_profile(database_url):
+    with database.get_engine().connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('busy_timeout') == 5000
+        assert pragma('cache_size') == -64 * 1024
+
+def test_writer_runs_work_in_order_and_rolls_back_failures(database_url):
+    from src.core.models import Customer
+
+    database.init_db()
+    writer = database.get_writer()
+    add = lambda number: lambda session: session.add(
+        Customer(email=f'writer{number}@example.com', first_name='Writer', last_name=str(number))
+    )
+    futures = [writer.submit(add(number)) for number in range(20)]
+    for future in futures:
+        future.result(timeout=10)
+
+    def failing(session):
+        add(99)(session)
+        session.flush()
+        raise ValueError("rejected")
+
+    with pytest.raises(ValueError):
+        writer.run(failing, timeout=10)
+    names = writer.run(lambda session: [c.last_name for c in session.query(Customer).order_by(Customer.id)], timeout=10)
+    assert names == [str(number) for number in range(20)]
+
+def test_booking_writes_on_the_sqlite_file_go_through_the_writer(database_url, memory_session, monkeypatch):
+    from datetime import datetime, time
+    from src.core.models import Booking, Customer
+    from src.services.booking import BookingService
+    from tests.helpers import DAY, seed_day
+
+    database.init_db()
+    session = database.get_session()
+    services = seed_day(session, employees=1, bookings_per_employee=0)
+    customer_id = session.query(Customer.id).scalar()
+    booking_service = BookingService(session)
+    assert booking_service.writer is database.get_writer()
+
+    inserting_threads = []
+    event.listen(database.get_engine(), "before_cursor_execute", lambda conn, cursor, statement, *args:
+                 statement.startswith('INSERT INTO bookings') and inserting_threads.append(threading.current_thread().name))
+    booking = booking_service.create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(14, 0)))
+    booking_service.cancel_booking(booking['id'])
+    assert inserting_threads == ['sqlite-writer']
+    # The caller's session sees the writes
+    assert session.get(Booking, booking['id']).status == 'cancelled'
+    session.close()
+
+    # Other engines, and SQLITE_WRITER=off, write in place
+    assert BookingService(memory_session).writer is None
+    monkeypatch.setenv('SQLITE_WRITER', 'off')
+    assert database.get_writer_for(database.get_session()) is None
+
+def test_dispose_engine_disposes_the_async_engine(database_url):
+    import asyncio
+
+    async def select_one():
+        async with database.get_async_session() as session:
+            return (await session.execute(text('SELECT 1'))).scalar()
+
+    assert asyncio.run(select_one()) == 1
+    pool = database.get_async_engine().sync_engine.pool
+    assert pool.checkedin() == 1
+    database.dispose_engine()
+    assert pool.checkedin() == 0
+    assert database._async_engine is None and database._async_session_factory is None
+
+def test_init_db_upgrades_an_existing_bookings_table(database_url):
+    engine = database.get_engine()
+    with engine.begin() as conn:
+        # The bookings table as created before end_time existed
+        conn.exec_driver_sql(
+            "CREATE TABLE bookings (id INTEGER PRIMARY KEY, customer_id INTEGER NOT NULL, employee_id INTEGER NOT NULL, "
+            "service_id INTEGER NOT NULL, schedule_id INTEGER NOT NULL, appointment_time DATETIME NOT NULL, "
+            "status VARCHAR(20), notes TEXT, created_at DATETIME, updated_at DATETIME)"
+        )
+    database.init_db()
+    columns = {column['name'] for column in inspect(engine).get_columns('bookings')}
+    assert 'end_time' in columns
+    with engine.connect() as conn:
+        triggers = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars().all()
+    assert 'bookings_reserve_insert' in triggers
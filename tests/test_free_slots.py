@@ -0,0 +1,62 @@
+from datetime import datetime, time, timedelta
+
+from src.core.models import Booking, Customer, FreeInterval
+from src.services.availability import AvailabilityService
+from src.services.booking import BookingService
+from src.services.free_slots import FreeSlotStore
+from tests.helpers import DAY, count_queries, seed_day
+
+def test_rebuild_matches_on_the_fly_availability(memory_session):
+    seed_day(memory_session, employees=3, bookings_per_employee=4)
+    store = FreeSlotStore(memory_session)
+    assert store.rebuild(DAY, DAY + timedelta(days=6)) > 0
+    assert store.check_consistency(DAY, DAY + timedelta(days=6)) == []
+
+def test_materialized_day_is_a_single_read(memory_session):
+    services = seed_day(memory_session, employees=3, bookings_per_employee=4)
+    service_id = services[0].id
+    FreeSlotStore(memory_session).rebuild(DAY, DAY)
+
+    availability = AvailabilityService(memory_session, use_materialized=True)
+    availability._get_service_durations()
+    with count_queries(memory_session) as statements:
+        slots = availability.get_available_slots(DAY, service_id)
+    assert len(statements) == 1
+    expected = availability.compute_available_slots(DAY, service_id)
+    order = lambda slot: (slot['start_time'], slot['employee_id'])
+    assert sorted(slots, key=order) == sorted(expected, key=order)
+
+def test_unmaterialized_day_falls_back_to_computation(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=1)
+    availability = AvailabilityService(memory_session, use_materialized=True)
+    assert availability.get_available_slots(DAY, services[0].id) == \
+        availability.compute_available_slots(DAY, services[0].id)
+
+def test_booking_writes_keep_the_store_consistent(memory_session):
+    seed_day(memory_session, employees=2, bookings_per_employee=3)
+    store = FreeSlotStore(memory_session)
+    store.rebuild(DAY, DAY)
+
+    booking = memory_session.query(Booking).filter_by(employee_id=1).first()
+    BookingService(memory_session).cancel_booking(booking.id)
+    assert store.check_consistency(DAY, DAY) == []
+    starts = [row.start_time for row in memory_session.query(FreeInterval).filter_by(employee_id=1)]
+    assert datetime.combine(DAY, time(9, 0)) in starts
+
+    # A write that bypasses BookingService is reported by the checker
+    memory_session.query(Booking).filter_by(employee_id=2).update({'status': 'cancelled'})
+    memory_session.commit()
+    mismatches = store.check_consistency(DAY, DAY)
+    assert mismatches and all(mismatch['missing'] for mismatch in mismatches)
+
+def test_created_booking_removes_its_free_interval(memory_session):
+    services = seed_day(memory_session, employees=1, bookings_per_employee=0)
+    customer_id = memory_session.query(Customer.id).scalar()
+    store = FreeSlotStore(memory_session)
+    store.rebuild(DAY, DAY)
+
+    BookingService(memory_session).create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(10, 0)))
+    intervals = [(row.start_time.time(), row.end_time.time())
+                 for row in memory_session.query(FreeInterval).filter_by(employee_id=1).order_by(FreeInterval.start_time)]
+    assert intervals == [(time(9, 0), time(10, 0)), (time(10, 30), time(17, 0))]
+    assert store.check_consistency(DAY, DAY) == []
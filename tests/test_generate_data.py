@@ -0,0 +1,66 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.core.models import Base, Booking, Employee, EmployeeSchedule, Service
+from src.scripts.generate_data import Scale, generate
+from src.services.booking import BookingService
+
+SCALE = Scale(employees=5, customers=50, days=14, density=0.7, first_day=date(2024, 6, 3), seed=7,
+              completed_before=date(2024, 6, 10), batch_size=100)
+
+def generated_engine(scale=SCALE):
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine, generate(engine, scale)
+
+def booking_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(
+            Booking.id, Booking.customer_id, Booking.employee_id, Booking.service_id, Booking.appointment_time,
+            Booking.end_time, Booking.status
+        ).order_by(Booking.id)).all()
+
+def test_generated_data_is_reproducible_and_realistic():
+    engine, counts = generated_engine()
+    rows = booking_rows(engine)
+    assert rows == booking_rows(generated_engine()[0])
+    assert rows != booking_rows(generated_engine(Scale(**{**SCALE.__dict__, 'seed': 8}))[0])
+    assert counts['bookings'] == len(rows)
+    assert counts['bookings'] == pytest.approx(SCALE.expected_bookings(), rel=0.25)
+    assert counts['schedules'] == 5 * 5  # two days off a week
+
+    session = sessionmaker(bind=engine)()
+    durations = dict(session.query(Service.id, Service.duration_minutes))
+    schedules = {(schedule.employee_id, schedule.day_of_week): schedule for schedule in session.query(EmployeeSchedule)}
+    for booking in rows:
+        schedule = schedules[booking.employee_id, booking.appointment_time.weekday()]
+        assert booking.end_time == booking.appointment_time + timedelta(minutes=durations[booking.service_id])
+        assert schedule.start_time <= booking.appointment_time.time() and booking.end_time.time() <= schedule.end_time
+        finished = booking.appointment_time.date() < SCALE.completed_before
+        assert booking.status in (('cancelled', 'completed') if finished else ('cancelled', 'confirmed'))
+    assert {booking.status for booking in rows} == {'cancelled', 'completed', 'confirmed'}
+
+def test_generated_bookings_are_reserved_and_more_data_can_be_added():
+    engine, counts = generated_engine()
+    session = sessionmaker(bind=engine)()
+    taken = session.query(Booking).filter_by(status='confirmed').first()
+
+    # The triggers are back: the database rejects an overlapping booking
+    session.add(Booking(customer_id=taken.customer_id, employee_id=taken.employee_id, service_id=taken.service_id,
+                        schedule_id=taken.schedule_id, appointment_time=taken.appointment_time))
+    with pytest.raises(IntegrityError):
+        session.flush()
+    session.rollback()
+    assert not BookingService(session).availability_service.is_slot_free(
+        taken.employee_id, taken.appointment_time, taken.end_time
+    )
+
+    # A second run appends after the existing ids
+    more = generate(engine, Scale(**{**SCALE.__dict__, 'seed': 8}))
+    assert session.query(Employee).count() == 10
+    assert session.query(func.count(Booking.id), func.max(Booking.id)).one() == (
+        counts['bookings'] + more['bookings'],) * 2
@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.models import Base
+from src.infrastructure.jobs import CronSchedule, JobScheduler
+from src.services.maintenance import register_default_jobs, warm_availability_cache
+from tests.helpers import DAY, seed_day
+
+class Clock:
+    def __init__(self):
+        self.moment = datetime(2024, 6, 3, 1, 30)  # a Monday
+
+    def now(self):
+        return self.moment
+
+    def time(self):
+        return self.moment.timestamp()
+
+def wait_idle(scheduler, *names):
+    for _ in range(500):
+        if not any(job['running'] for name, job in scheduler.metrics().items() if not names or name in names):
+            return
+        time.sleep(0.01)
+    raise AssertionError('jobs still running')
+
+def test_cron_schedule_next_run():
+    monday = datetime(2024, 6, 3, 1, 30)
+    assert CronSchedule('0 2 * * *').next_after(monday) == datetime(2024, 6, 3, 2, 0)
+    assert CronSchedule('0 2 * * *').next_after(datetime(2024, 6, 3, 2, 0)) == datetime(2024, 6, 4, 2, 0)
+    # Every quarter hour of working hours on weekdays, from Friday evening
+    assert CronSchedule('*/15 9-17 * * 1-5').next_after(datetime(2024, 6, 7, 17, 50)) == datetime(2024, 6, 10, 9, 0)
+    # Either day field may match: the 1st of the month or a Sunday
+    assert CronSchedule('30 8 1 * 0,7').next_after(monday) == datetime(2024, 6, 9, 8, 30)
+    assert CronSchedule('30 8 1 * 0').next_after(datetime(2024, 6, 30, 9, 0)) == datetime(2024, 7, 1, 8, 30)
+
+def test_jobs_run_when_due_without_overlapping():
+    clock = Clock()
+    scheduler = JobScheduler(now=clock.now)
+    release, calls = threading.Event(), []
+    scheduler.add_job('slow', lambda: calls.append('slow') or release.wait(5), 60)
+    scheduler.add_job('nightly', lambda: calls.append('nightly'), '0 2 * * *')
+    scheduler.add_job('broken', lambda: 1 / 0, 60, run_immediately=True)
+
+    assert scheduler.run_pending() == ['broken']
+    wait_idle(scheduler)
+    clock.moment += timedelta(minutes=1)
+    assert scheduler.run_pending() == ['slow', 'broken']
+    wait_idle(scheduler, 'broken')
+    clock.moment += timedelta(minutes=1)
+    assert scheduler.run_pending() == ['broken']  # slow is still running
+    release.set()
+    wait_idle(scheduler)
+    clock.moment = datetime(2024, 6, 3, 2, 0)
+    assert scheduler.run_pending() == ['slow', 'nightly', 'broken']
+    assert scheduler.stop(timeout=5)
+
+    metrics = scheduler.metrics()
+    assert calls.count('slow') == 2 and calls.count('nightly') == 1
+    assert metrics['slow']['runs'] == 2 and metrics['slow']['skipped'] == 1
+    assert metrics['broken']['failures'] == 4 and 'ZeroDivisionError' in metrics['broken']['last_error']
+    assert metrics['nightly']['next_run'] == datetime(2024, 6, 4, 2, 0)
+    assert metrics['nightly']['mean_duration'] is not None
+
+def test_leases_keep_workers_from_running_a_job_at_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'leases.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    clock = Clock()
+    workers = [JobScheduler(factory, worker_id=name, now=clock.now, clock=clock.time) for name in ('a', 'b')]
+    inside = threading.Event()
+    release = threading.Event()
+    ran = []
+    for worker in workers:
+        worker.add_job('archive', lambda name=worker.worker_id: ran.append(name) or inside.set() or release.wait(5),
+                       60, lease_seconds=600)
+        worker.add_job('local', lambda: None, 60, exclusive=False)
+
+    clock.moment += timedelta(minutes=1)
+    workers[0].run_pending()
+    assert inside.wait(5)
+    # b finds the lease taken while a runs; both run the non-exclusive job
+    assert workers[1].run_job('archive')['skipped'] == 1
+    assert workers[1].run_job('local')['runs'] == 1
+    release.set()
+    assert workers[0].stop(timeout=5)
+    # Released at the end of the run: b can take it
+    assert workers[1].run_job('archive')['runs'] == 1
+    assert ran == ['a', 'b']
+    workers[1].stop()
+    engine.dispose()
+
+def test_expired_leases_are_taken_over(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'leases.db'}")
+    Base.metadata.create_all(engine)
+    clock = Clock()
+    crashed = JobScheduler(sessionmaker(bind=engine), worker_id='crashed', now=clock.now, clock=clock.time)
+    crashed.add_job('archive', lambda: None, 60, lease_seconds=600)
+    assert crashed._acquire_lease(crashed._jobs['archive'])  # and never released
+
+    other = JobScheduler(sessionmaker(bind=engine), worker_id='other', now=clock.now, clock=clock.time)
+    other.add_job('archive', lambda: None, 60, lease_seconds=600)
+    assert other.run_job('archive')['skipped'] == 1
+    clock.moment += timedelta(seconds=601)
+    assert other.run_job('archive')['runs'] == 1
+    engine.dispose()
+
+def test_default_jobs(memory_session):
+    services = seed_day(memory_session, employees=2, bookings_per_employee=2)
+    scheduler = JobScheduler()
+    names = register_default_jobs(scheduler, memory_session.get_bind())
+    assert {'archive_bookings', 'warm_availability_cache', 'checkpoint_sqlite'} <= set(names)
+    assert warm_availability_cache(memory_session, days=2, today=DAY) == 2 * len(services)
+    scheduler.stop()
+
+def test_cache_warming_is_leased_only_for_the_shared_cache(memory_session, monkeypatch, tmp_path):
+    monkeypatch.delenv('AVAILABILITY_CACHE_PATH', raising=False)
+    scheduler = JobScheduler()
+    register_default_jobs(scheduler, memory_session.get_bind())
+    # Each process warms the in-memory cache its requests read
+    assert not scheduler._jobs['warm_availability_cache'].exclusive
+    scheduler.stop()
+
+    monkeypatch.setenv('AVAILABILITY_CACHE_PATH', str(tmp_path / 'cache.db'))
+    scheduler = JobScheduler()
+    register_default_jobs(scheduler, memory_session.get_bind())
+    assert scheduler._jobs['warm_availability_cache'].exclusive
+    scheduler.stop()
@@ -0,0 +1,108 @@
+import os
+import pytest
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import IntegrityError
+
+from src.core.models import Booking
+from src.infrastructure import database
+from src.infrastructure.partitioning import (
+    DEFAULT_PARTITION, _month, ensure_partitions, list_partitions, partition_name,
+    partitioned_bookings_table, retire_partitions
+)
+from src.services.booking import BookingService
+from tests.helpers import DAY, seed_day
+
+def test_month_arithmetic_and_partition_names():
+    assert _month(date(2024, 12, 31), 1) == date(2025, 1, 1)
+    assert _month(date(2024, 1, 15), -13) == date(2022, 12, 1)
+    assert partition_name(date(2024, 6, 1)) == 'bookings_p2024_06'
+
+def test_partitioned_bookings_table_keeps_the_model_columns_and_keys():
+    table = partitioned_bookings_table()
+    ddl = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+    assert 'id SERIAL NOT NULL' in ddl
+    assert 'PRIMARY KEY (id, appointment_time)' in ddl
+    assert 'REFERENCES customers (id)' in ddl
+    assert ddl.rstrip().endswith('PARTITION BY RANGE (appointment_time)')
+    assert not any(index.unique for index in table.indexes)
+    assert list(Booking.__table__.primary_key.columns.keys()) == ['id']
+
+@pytest.fixture
+def partitioned_database(monkeypatch):
+    """A partitioned schema in the PostgreSQL database at TEST_POSTGRES_URL (e.g. a local container)"""
+    url = os.getenv('TEST_POSTGRES_URL')
+    if not url:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    pytest.importorskip('psycopg2')
+    monkeypatch.setenv('DATABASE_URL', url)
+    monkeypatch.setenv('BOOKINGS_PARTITION_MONTHS_AHEAD', '2')
+    database.dispose_engine()
+    with database.get_engine().begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    engine = database.init_db(partition_bookings=True)
+    with engine.begin() as conn:
+        ensure_partitions(conn, months_ahead=2, start=_month(DAY, -3))
+    session = database.get_session()
+    yield engine, session
+    session.close()
+    database.dispose_engine()
+
+def test_partitioned_bookings_prune_and_reject_overlaps(partitioned_database):
+    engine, session = partitioned_database
+    services = seed_day(session, employees=1, bookings_per_employee=2)
+    with engine.connect() as conn:
+        assert [month for _, month in list_partitions(conn)][:4] == [_month(DAY, offset) for offset in range(-3, 1)]
+        plan = '\n'.join(conn.execute(text(
+            "EXPLAIN SELECT * FROM bookings WHERE employee_id = 1 "
+            "AND appointment_time >= :start AND appointment_time < :end"
+        ), {'start': datetime.combine(DAY, time.min), 'end': datetime.combine(DAY + timedelta(days=1), time.min)}).scalars())
+    assert partition_name(_month(DAY)) in plan and partition_name(_month(DAY, -1)) not in plan
+
+    booking_service = BookingService(session)
+    customer_id = session.execute(text("SELECT id FROM customers")).scalar()
+    with pytest.raises(IntegrityError):
+        session.execute(text(
+            "INSERT INTO bookings (customer_id, employee_id, service_id, schedule_id, appointment_time, status) "
+            "VALUES (:customer, 1, :service, 1, :at, 'confirmed')"
+        ), {'customer': customer_id, 'service': services[0].id, 'at': datetime.combine(DAY, time(9, 15))})
+    session.rollback()
+
+    # Idempotency keys stay unique across partitions
+    first = booking_service.create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(14, 0)),
+                                           idempotency_key='msgid:partitioned@example.com')
+    again = booking_service.create_booking(customer_id, 1, services[0].id, datetime.combine(DAY, time(15, 0)),
+                                           idempotency_key='msgid:partitioned@example.com')
+    assert again['id'] == first['id']
+
+def test_retire_partitions_detaches_old_months(partitioned_database):
+    engine, session = partitioned_database
+    with engine.begin() as conn:
+        retired = retire_partitions(conn, keep_months=1, drop=True, today=DAY)
+        remaining = [month for _, month in list_partitions(conn)]
+    assert retired == [partition_name(_month(DAY, -3)), partition_name(_month(DAY, -2))]
+    assert remaining[0] == _month(DAY, -1)
+
+def test_bookings_beyond_the_partitions_wait_in_the_default_partition(partitioned_database):
+    engine, session = partitioned_database
+    services = seed_day(session, employees=1, bookings_per_employee=0)
+    customer_id = session.execute(text("SELECT id FROM customers")).scalar()
+    later = datetime.combine(_month(DAY, 6), time(10, 0))
+    # Beyond the seeded schedule, so inserted directly
+    booking_id = session.execute(text(
+        "INSERT INTO bookings (customer_id, employee_id, service_id, schedule_id, appointment_time, status, idempotency_key) "
+        "VALUES (:customer, 1, :service, 1, :at, 'confirmed', 'msgid:later@example.com') RETURNING id"
+    ), {'customer': customer_id, 'service': services[0].id, 'at': later}).scalar()
+    session.commit()
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar() == 1
+
+    with engine.begin() as conn:
+        created = ensure_partitions(conn, months_ahead=0, start=later.date())
+    assert created == [partition_name(_month(DAY, 6))]
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar() == 0
+        assert conn.execute(text(f"SELECT id FROM {created[0]}")).scalar() == booking_id
+        assert conn.execute(text("SELECT count(*) FROM booking_idempotency_keys")).scalar() == 1
@@ -0,0 +1,97 @@
+import sqlite3
+import pytest
+from datetime import datetime, time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.core.models import Base, Customer
+from src.infrastructure.db_handler import DBHandler
+from src.infrastructure.replicas import ReplicaRouter, RoutingSession
+from src.services.availability import AvailabilityService
+from src.services.booking import BookingService
+from tests.helpers import DAY, seed_day
+
+class Cluster:
+    """A primary and a replica SQLite file; replicate() copies the primary over the replica"""
+
+    def __init__(self, tmp_path):
+        self.now = 1000.0
+        self.primary_path, self.replica_path = tmp_path / 'primary.db', tmp_path / 'replica.db'
+        self.primary = create_engine(f'sqlite:///{self.primary_path}')
+        self.replica = create_engine(f'sqlite:///{self.replica_path}')
+        self.statements = {self.primary: [], self.replica: []}
+        for engine, statements in self.statements.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda conn, cursor, statement, *args, statements=statements: statements.append(statement))
+        Base.metadata.create_all(self.primary)
+        self.router = ReplicaRouter(self.primary, [self.replica], max_lag_seconds=5, check_interval=1,
+                                    clock=lambda: self.now)
+
+    def replicate(self):
+        self.replica.dispose()
+        source, target = sqlite3.connect(self.primary_path), sqlite3.connect(self.replica_path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+    def reads(self):
+        """Statements run on (primary, replica) since the last call"""
+        counts = len(self.statements[self.primary]), len(self.statements[self.replica])
+        for statements in self.statements.values():
+            statements.clear()
+        return counts
+
+@pytest.fixture
+def cluster(tmp_path):
+    cluster = Cluster(tmp_path)
+    session = sessionmaker(bind=cluster.primary)()
+    cluster.service_ids = [service.id for service in seed_day(session, employees=2, bookings_per_employee=4)]
+    session.close()
+    cluster.router.heartbeat()
+    cluster.replicate()
+    yield cluster
+    cluster.router.dispose()
+    cluster.primary.dispose()
+
+def test_reads_go_to_a_current_replica(cluster):
+    session = RoutingSession(cluster.router)
+    availability = AvailabilityService(session)
+    cluster.reads()
+    assert availability.compute_available_slots(DAY, cluster.service_ids[0])
+    assert DBHandler(sessionmaker(bind=cluster.primary)(), session).get_customer_info('seed0@example.com')
+    primary_reads, replica_reads = cluster.reads()
+    assert primary_reads == 0 and replica_reads > 0
+
+def test_reads_fall_back_to_the_primary_until_the_replica_has_a_write(cluster):
+    read_session, write_session = RoutingSession(cluster.router), sessionmaker(bind=cluster.primary)()
+    availability = AvailabilityService(read_session)
+    two_pm = datetime.combine(DAY, time(14, 0))
+    starts = lambda: [slot['start_time'] for slot in availability.compute_available_slots(DAY, cluster.service_ids[0], 1)]
+    assert two_pm in starts()
+
+    cluster.now += 1
+    customer_id = write_session.query(Customer).filter_by(email='seed0@example.com').one().id
+    BookingService(write_session).create_booking(customer_id, 1, cluster.service_ids[0], two_pm)
+    replica_reads = cluster.router.reads['replica']
+    # The replica copy predates the booking, so the primary answers and sees it
+    assert two_pm not in starts()
+    assert cluster.router.reads['replica'] == replica_reads
+
+    cluster.now += 1
+    cluster.router.heartbeat()
+    cluster.replicate()
+    cluster.now += 1
+    primary_reads = cluster.router.reads['primary']
+    assert two_pm not in starts()
+    assert cluster.router.reads['primary'] == primary_reads
+    assert cluster.router.reads['replica'] > replica_reads
+
+def test_lagging_or_unreachable_replicas_are_skipped(cluster, tmp_path):
+    cluster.now += 10  # no heartbeat for longer than max_lag_seconds
+    assert cluster.router.read_engine() is cluster.primary
+    assert cluster.router.lag(cluster.replica) == 10
+
+    missing = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = ReplicaRouter(cluster.primary, [missing], clock=lambda: cluster.now)
+    assert router.read_engine() is cluster.primary
+    router.dispose()